@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import sys
 from pathlib import Path
 
-from pyramid_audit.auto_annotate import AutoAnnotateConfig, auto_annotate_line
-from pyramid_audit.ingest import load_manifest
+from pyramid_audit.auto_annotate import AutoAnnotateConfig, auto_annotate_lines, recorded_direction
+from pyramid_audit.ingest import load_manifest, validation_state_path
 from pyramid_audit.observations import load_observations, save_observations
 
 
@@ -18,10 +19,19 @@ def main() -> None:
     parser.add_argument("--min-area", type=int, default=80)
     parser.add_argument("--dilation", type=int, default=3)
     parser.add_argument("--margin", type=int, default=4)
+    parser.add_argument("--labeling", choices=["rle", "reference"], default="rle", help="Connected-component backend")
+    parser.add_argument("--tile-rows", type=int, default=0, help="Segment in strips of this many scaled rows (0 = whole image)")
+    parser.add_argument("--preprocess", choices=["pil", "numpy"], default="pil", help="Grayscale/resize/dilation backend")
+    parser.add_argument("--threshold-mode", choices=["fixed", "otsu", "adaptive"], default="fixed", help="How the dark mask is thresholded")
+    parser.add_argument("--adaptive-window", type=int, default=31, help="Window for --threshold-mode adaptive")
+    parser.add_argument("--adaptive-offset", type=int, default=10, help="Offset below the local mean for adaptive thresholding")
+    parser.add_argument("--merge-gap", type=int, default=0, help="Merge clusters whose boxes lie within this many pixels (0 = off)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for segmentation")
 
     args = parser.parse_args()
 
-    manifest = load_manifest(Path(args.manifest))
+    manifest_path = Path(args.manifest)
+    manifest = load_manifest(manifest_path, validation_state_path(manifest_path))
     observations = load_observations(Path(args.ledger))
 
     obs_by_line = {rec["line_id"]: rec for rec in observations}
@@ -37,8 +47,16 @@ def main() -> None:
         min_area=args.min_area,
         dilation=args.dilation,
         margin=args.margin,
+        labeling=args.labeling,
+        tile_rows=args.tile_rows,
+        preprocess=args.preprocess,
+        threshold_mode=args.threshold_mode,
+        adaptive_window=args.adaptive_window,
+        adaptive_offset=args.adaptive_offset,
+        merge_gap=args.merge_gap,
     )
 
+    jobs = []
     for relief in manifest.get("corpus", []):
         for line in relief.get("lines", []):
             line_id = line["line_id"]
@@ -63,13 +81,21 @@ def main() -> None:
             image_paths = [Path(evidence_map[eid]) for eid in evidence_ids if eid in evidence_map]
             if not image_paths:
                 continue
-            image_path = image_paths[0]
-            signs = auto_annotate_line(image_path, line_id, cfg)
-            record["observed_signs"] = signs
-            record["notes"] = (
-                "Auto-segmented glyph clusters from evidence image; uninterpreted and requires review."
-            )
-            record["uncertainty"] = 0.9
+            jobs.append((line_id, image_paths[0]))
+
+    # recorded directionality decides the reading order of each line's clusters
+    directions = {line_id: recorded_direction(obs_by_line[line_id]) for line_id, _path in jobs}
+    results, errors = auto_annotate_lines(jobs, cfg, workers=args.workers, directions=directions)
+    for line_id, _image_path in jobs:
+        if line_id in errors:
+            print(f"auto-annotate failed for {line_id}: {errors[line_id]}", file=sys.stderr)
+            continue
+        record = obs_by_line[line_id]
+        record["observed_signs"] = results[line_id]
+        record["notes"] = (
+            "Auto-segmented glyph clusters from evidence image; uninterpreted and requires review."
+        )
+        record["uncertainty"] = 0.9
 
     save_observations(Path(args.ledger), observations)
 
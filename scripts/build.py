@@ -1,50 +1,38 @@
 #!/usr/bin/env python3
 import argparse
-import copy
 from pathlib import Path
 
-from pyramid_audit.analysis import build_discrepancies, build_reconstructions
-from pyramid_audit.evidence import build_evidence
-from pyramid_audit.index import build_corpus_index
-from pyramid_audit.ingest import load_manifest
-from pyramid_audit.ledger import build_observations, build_prior_readings
-from pyramid_audit.report import build_report
-
-
-def attach_image_paths(manifest: dict) -> dict:
-    manifest = copy.deepcopy(manifest)
-    evidence_map = {}
-    for source in manifest.get("sources", []):
-        for item in source.get("items", []):
-            for evidence in item.get("evidence", []):
-                evidence_map[evidence["evidence_id"]] = evidence["output_path"]
-    for relief in manifest.get("corpus", []):
-        for line in relief.get("lines", []):
-            line["image_paths"] = [evidence_map[eid] for eid in line.get("evidence_ids", []) if eid in evidence_map]
-            line["secondary_image_paths"] = [
-                evidence_map[eid] for eid in line.get("secondary_evidence_ids", []) if eid in evidence_map
-            ]
-    return manifest
+from pyramid_audit.download_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DownloadCache
+from pyramid_audit.evidence import DEFAULT_RASTER_BUDGET, PageRasterCache
+from pyramid_audit.pipeline import run_build
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Build forensic Egyptology audit artifacts.")
     parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
+    parser.add_argument("--force", action="store_true", help="Ignore the build state and rebuild everything")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Download cache for image/IIIF sources")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Download cache size bound")
+    parser.add_argument("--offline", action="store_true", help="Fail fast instead of downloading uncached sources")
+    parser.add_argument(
+        "--revalidate", action="store_true", help="Re-check cached sources with conditional (ETag/Last-Modified) requests"
+    )
+    parser.add_argument("--raster-budget-mb", type=int, default=DEFAULT_RASTER_BUDGET // (1024 * 1024), help="Memory budget for rendered PDF pages")
+    parser.add_argument("--render-workers", type=int, default=1, help="Worker processes for PDF page rendering")
     args = parser.parse_args()
 
-    root = Path.cwd()
-    manifest_path = root / args.manifest
-    manifest = load_manifest(manifest_path)
-
-    build_evidence(manifest, root)
-    manifest_with_images = attach_image_paths(manifest)
-
-    build_corpus_index(manifest_with_images, root / "corpus_index.csv")
-    build_observations(manifest_with_images, root / "ledger" / "observations.jsonl")
-    build_prior_readings(manifest_with_images, root / "ledger" / "prior_readings.jsonl")
-    build_reconstructions(manifest_with_images, root / "analysis" / "reconstructions.jsonl")
-    build_discrepancies(manifest_with_images, root / "analysis" / "discrepancies.jsonl")
-    build_report(manifest_with_images, root / "REPORT.md")
+    run_build(
+        Path.cwd() / args.manifest,
+        force=args.force,
+        downloads=DownloadCache(
+            Path(args.cache_dir),
+            max_bytes=args.cache_max_mb * 1024 * 1024,
+            offline=args.offline,
+            revalidate=args.revalidate,
+        ),
+        raster_cache=PageRasterCache(args.raster_budget_mb * 1024 * 1024),
+        render_workers=args.render_workers,
+    )
 
 
 if __name__ == "__main__":
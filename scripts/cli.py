@@ -1,58 +1,49 @@
 #!/usr/bin/env python3
 import argparse
-import copy
+import sys
 from pathlib import Path
+from typing import Any, Dict, Optional
 
-from pyramid_audit.analysis import build_discrepancies, build_reconstructions
-from pyramid_audit.auto_annotate import AutoAnnotateConfig, auto_annotate_line
+from pyramid_audit.auto_annotate import AutoAnnotateConfig, auto_annotate_lines, recorded_direction
 from pyramid_audit.cluster_crops import generate_cluster_crops
-from pyramid_audit.evidence import build_evidence
-from pyramid_audit.index import build_corpus_index
-from pyramid_audit.ingest import load_manifest
+from pyramid_audit.corpus import CorpusView
+from pyramid_audit.download_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DownloadCache
+from pyramid_audit.evidence import DEFAULT_RASTER_BUDGET, PageRasterCache
+from pyramid_audit.features import DEFAULT_FEATURE_INDEX, FeatureIndex, build_feature_index
+from pyramid_audit.html_report import DEFAULT_HTML_REPORT_DIR, DEFAULT_THUMB_SIZE, DEFAULT_TILE_SIZE, build_html_report
+from pyramid_audit.ingest import load_manifest, validation_state_path
 from pyramid_audit.journal import append_entry
-from pyramid_audit.ledger import build_observations, build_prior_readings
-from pyramid_audit.observations import add_sign_observation, load_observations, save_observations
-from pyramid_audit.report import build_report
+from pyramid_audit.observations import ObservationStore, add_sign_observation, load_observations, save_observations
+from pyramid_audit.pipeline import PipelineContext, run_build
+from pyramid_audit.report import (
+    DEFAULT_JOURNAL_PATH,
+    DEFAULT_OBSERVATIONS_PATH,
+    DEFAULT_PRIOR_READINGS_PATH,
+    DEFAULT_REPORT_DIR,
+    build_report,
+    build_report_shards,
+)
+from pyramid_audit.spatial_index import reconcile_record
+from pyramid_audit.sqlite_store import DEFAULT_DB_PATH, SqliteLedger
+from pyramid_audit.sweep import DEFAULT_SWEEP_PATH, manual_boxes, sweep_lines, write_sweep_csv
 
 
-def attach_image_paths(manifest: dict) -> dict:
-    manifest = copy.deepcopy(manifest)
-    evidence_map = {}
-    for source in manifest.get("sources", []):
-        for item in source.get("items", []):
-            for evidence in item.get("evidence", []):
-                evidence_map[evidence["evidence_id"]] = evidence["output_path"]
-    for relief in manifest.get("corpus", []):
-        for line in relief.get("lines", []):
-            line["image_paths"] = [evidence_map[eid] for eid in line.get("evidence_ids", []) if eid in evidence_map]
-            line["secondary_image_paths"] = [
-                evidence_map[eid] for eid in line.get("secondary_evidence_ids", []) if eid in evidence_map
-            ]
-    return manifest
-
-
-def run_build(manifest_path: Path) -> None:
-    root = Path.cwd()
-    manifest = load_manifest(manifest_path)
-    build_evidence(manifest, root)
-    manifest_with_images = attach_image_paths(manifest)
-    build_corpus_index(manifest_with_images, root / "corpus_index.csv")
-    build_observations(manifest_with_images, root / "ledger" / "observations.jsonl")
-    build_prior_readings(manifest_with_images, root / "ledger" / "prior_readings.jsonl")
-    build_reconstructions(manifest_with_images, root / "analysis" / "reconstructions.jsonl")
-    build_discrepancies(manifest_with_images, root / "analysis" / "discrepancies.jsonl")
-    build_report(manifest_with_images, root / "REPORT.md")
-
-
-def run_auto_annotate(manifest_path: Path, ledger_path: Path, args) -> None:
-    manifest = load_manifest(manifest_path)
-    observations = load_observations(ledger_path)
+def run_auto_annotate(
+    manifest_path: Path,
+    ledger_path: Path,
+    args,
+    store: Optional[SqliteLedger] = None,
+    context: Optional[PipelineContext] = None,
+) -> None:
+    if context is not None:
+        manifest = context.manifest
+        observations = context.observations
+        evidence_map = context.corpus.evidence_paths
+    else:
+        manifest = _load_manifest(manifest_path)
+        observations = load_observations(ledger_path)
+        evidence_map = CorpusView(manifest).evidence_paths
     obs_by_line = {rec["line_id"]: rec for rec in observations}
-    evidence_map = {}
-    for source in manifest.get("sources", []):
-        for item in source.get("items", []):
-            for evidence in item.get("evidence", []):
-                evidence_map[evidence["evidence_id"]] = evidence["output_path"]
 
     cfg = AutoAnnotateConfig(
         threshold=args.threshold,
@@ -60,8 +51,16 @@ def run_auto_annotate(manifest_path: Path, ledger_path: Path, args) -> None:
         min_area=args.min_area,
         dilation=args.dilation,
         margin=args.margin,
+        labeling=args.labeling,
+        tile_rows=args.tile_rows,
+        preprocess=args.preprocess,
+        threshold_mode=args.threshold_mode,
+        adaptive_window=args.adaptive_window,
+        adaptive_offset=args.adaptive_offset,
+        merge_gap=args.merge_gap,
     )
 
+    jobs = []
     for relief in manifest.get("corpus", []):
         for line in relief.get("lines", []):
             line_id = line["line_id"]
@@ -86,23 +85,210 @@ def run_auto_annotate(manifest_path: Path, ledger_path: Path, args) -> None:
             image_paths = [Path(evidence_map[eid]) for eid in evidence_ids if eid in evidence_map]
             if not image_paths:
                 continue
-            image_path = image_paths[0]
-            signs = auto_annotate_line(image_path, line_id, cfg)
-            record["observed_signs"] = signs
-            record["notes"] = "Auto-segmented glyph clusters from evidence image; uninterpreted and requires review."
-            record["uncertainty"] = 0.9
+            jobs.append((line_id, image_paths[0]))
 
+    # recorded directionality decides the reading order of each line's clusters
+    directions = {line_id: recorded_direction(obs_by_line[line_id]) for line_id, _path in jobs}
+    results, errors = auto_annotate_lines(jobs, cfg, workers=args.workers, directions=directions)
+    for line_id, _image_path in jobs:
+        if line_id in errors:
+            print(f"auto-annotate failed for {line_id}: {errors[line_id]}", file=sys.stderr)
+            continue
+        record = obs_by_line[line_id]
+        record["observed_signs"] = results[line_id]
+        record["notes"] = "Auto-segmented glyph clusters from evidence image; uninterpreted and requires review."
+        record["uncertainty"] = 0.9
+
+    if context is not None:
+        context.mark_changed()
+        return
+    # written through: the JSONL ledger stays authoritative, the store mirrors it
     save_observations(ledger_path, observations)
+    if store is not None:
+        for record in observations:
+            store.put_observation(record)
+
+
+def _grid(text: str, cast) -> list:
+    return [cast(part) for part in text.split(",") if part.strip()]
+
+
+def run_sweep(manifest_path: Path, ledger_path: Path, args) -> None:
+    manifest = _load_manifest(manifest_path)
+    evidence_map = {}
+    for source in manifest.get("sources", []):
+        for item in source.get("items", []):
+            for evidence in item.get("evidence", []):
+                evidence_map[evidence["evidence_id"]] = evidence["output_path"]
+    jobs = []
+    for relief in manifest.get("corpus", []):
+        for line in relief.get("lines", []):
+            image_paths = [Path(evidence_map[eid]) for eid in line.get("evidence_ids", []) if eid in evidence_map]
+            if image_paths:
+                jobs.append((line["line_id"], image_paths[0]))
+
+    base = AutoAnnotateConfig(
+        labeling=args.labeling,
+        preprocess=args.preprocess,
+        threshold_mode=args.threshold_mode,
+        adaptive_window=args.adaptive_window,
+        adaptive_offset=args.adaptive_offset,
+        merge_gap=args.merge_gap,
+    )
+    grid = {
+        "scale": _grid(args.scales, float),
+        "dilation": _grid(args.dilations, int),
+        "threshold": _grid(args.thresholds, int),
+        "min_area": _grid(args.min_areas, int),
+        "margin": _grid(args.margins, int),
+    }
+    # the ledger is only read, for manual bboxes to compare against
+    manual = manual_boxes(load_observations(ledger_path))
+    rows, errors = sweep_lines(jobs, base, grid, manual, workers=args.workers)
+    for line_id, error in errors.items():
+        print(f"sweep failed for {line_id}: {error}", file=sys.stderr)
+    write_sweep_csv(Path(args.output), rows)
+    print(f"{len(rows)} combinations over {len(jobs) - len(errors)} lines -> {args.output}")
+
+
+def run_reconcile(ledger_path: Path) -> None:
+    records = load_observations(ledger_path)
+    changed = sum(reconcile_record(record) for record in records)
+    if changed:
+        save_observations(ledger_path, records)
+    print(f"{changed} auto clusters newly marked superseded")
+
+
+def run_export_clusters(
+    manifest_path: Path,
+    ledger_path: Path,
+    output_root: Path,
+    workers: int = 4,
+    context: Optional[PipelineContext] = None,
+) -> None:
+    if context is None:
+        generate_cluster_crops(manifest_path, ledger_path, output_root, workers=workers)
+        return
+    generate_cluster_crops(
+        manifest_path, ledger_path, output_root, workers=workers, manifest=context.manifest, records=context.observations
+    )
+    context.mark_changed()
+
 
+def run_features(
+    manifest_path: Path,
+    ledger_path: Path,
+    output_root: Path,
+    index_path: Path,
+    workers: int = 1,
+    context: Optional[PipelineContext] = None,
+) -> None:
+    index, errors = build_feature_index(
+        manifest_path,
+        ledger_path,
+        output_root,
+        index_path,
+        workers=workers,
+        manifest=context.manifest if context is not None else None,
+        records=context.observations if context is not None else None,
+    )
+    for line_id, error in errors.items():
+        print(f"feature extraction failed for {line_id}: {error}", file=sys.stderr)
+    print(f"{len(index)} clusters indexed -> {index_path}")
+
+
+def run_similar(index_path: Path, sign_id: str, line_id: Optional[str], top_k: int, other_lines: bool) -> None:
+    if not index_path.exists():
+        raise SystemExit(f"{index_path} not found; run `features` first")
+    index = FeatureIndex.load(index_path)
+    if line_id is None:
+        rows = index.rows_for(sign_id)
+        if len(rows) != 1:
+            raise SystemExit(f"{sign_id} appears on {len(rows)} lines; pass --line-id")
+        line_id = index.keys[rows[0]][0]
+    for (match_line, match_sign), score in index.similar(line_id, sign_id, k=top_k, other_lines=other_lines):
+        bbox = ",".join(str(int(v)) for v in index.bboxes[index.row(match_line, match_sign)])
+        print(f"{score:.4f}\t{match_line}\t{match_sign}\t{bbox}")
 
-def run_export_clusters(manifest_path: Path, ledger_path: Path, output_root: Path) -> None:
-    generate_cluster_crops(manifest_path, ledger_path, output_root)
 
+def run_report(
+    manifest_path: Path,
+    store: Optional[SqliteLedger] = None,
+    sharded: bool = False,
+    report_dir: Path = DEFAULT_REPORT_DIR,
+    context: Optional[PipelineContext] = None,
+) -> None:
+    if context is not None:
+        corpus = context.corpus
+    else:
+        corpus = CorpusView(
+            _load_manifest(manifest_path),
+            journal_path=DEFAULT_JOURNAL_PATH,
+            observations_path=DEFAULT_OBSERVATIONS_PATH,
+            prior_readings_path=DEFAULT_PRIOR_READINGS_PATH,
+            store=store,
+        )
+    if sharded:
+        written = build_report_shards(corpus, report_dir)
+        print(f"report pages rewritten: {len(written)}")
+    else:
+        build_report(corpus, Path("REPORT.md"))
+
+
+def run_html_report(
+    manifest_path: Path,
+    output_dir: Path,
+    store: Optional[SqliteLedger] = None,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    thumb_size: int = DEFAULT_THUMB_SIZE,
+    workers: int = 1,
+) -> None:
+    corpus = CorpusView(
+        _load_manifest(manifest_path),
+        journal_path=DEFAULT_JOURNAL_PATH,
+        observations_path=DEFAULT_OBSERVATIONS_PATH,
+        prior_readings_path=DEFAULT_PRIOR_READINGS_PATH,
+        store=store,
+    )
+    tiled, errors = build_html_report(corpus, output_dir, tile_size=tile_size, thumb_size=thumb_size, workers=workers)
+    for source, error in errors.items():
+        print(f"tiling failed for {source}: {error}", file=sys.stderr)
+    print(f"images tiled: {len(tiled)} -> {output_dir / 'index.html'}")
 
-def run_report(manifest_path: Path) -> None:
-    manifest = load_manifest(manifest_path)
-    manifest_with_images = attach_image_paths(manifest)
-    build_report(manifest_with_images, Path("REPORT.md"))
+
+def run_db(action: str, db_path: Path, root: Path) -> None:
+    with SqliteLedger(db_path) as store:
+        if action == "import":
+            counts = store.import_jsonl(root)
+            for name, count in counts.items():
+                print(f"{name}: {count}")
+        elif action == "export":
+            store.export_jsonl(root)
+        elif action == "pending-review":
+            for line_id in store.lines_pending_review():
+                print(line_id)
+        else:
+            raise SystemExit(f"Unknown db action {action}")
+
+
+def _load_manifest(manifest_path: Path) -> Dict[str, Any]:
+    # command-line runs keep the validation cache next to the manifest
+    return load_manifest(manifest_path, validation_state_path(manifest_path))
+
+
+def _ledger_store(args) -> Optional[SqliteLedger]:
+    if getattr(args, "backend", "jsonl") != "sqlite":
+        return None
+    return SqliteLedger(Path(args.db))
+
+
+def _download_cache(args) -> DownloadCache:
+    return DownloadCache(
+        Path(args.cache_dir),
+        max_bytes=args.cache_max_mb * 1024 * 1024,
+        offline=args.offline,
+        revalidate=args.revalidate,
+    )
 
 
 def main() -> None:
@@ -111,6 +297,15 @@ def main() -> None:
 
     build_parser = subparsers.add_parser("build", help="Render evidence and build outputs.")
     build_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
+    build_parser.add_argument("--force", action="store_true", help="Ignore the build state and rebuild everything")
+    build_parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Download cache for image/IIIF sources")
+    build_parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Download cache size bound")
+    build_parser.add_argument("--offline", action="store_true", help="Fail fast instead of downloading uncached sources")
+    build_parser.add_argument(
+        "--revalidate", action="store_true", help="Re-check cached sources with conditional (ETag/Last-Modified) requests"
+    )
+    build_parser.add_argument("--raster-budget-mb", type=int, default=DEFAULT_RASTER_BUDGET // (1024 * 1024), help="Memory budget for rendered PDF pages")
+    build_parser.add_argument("--render-workers", type=int, default=1, help="Worker processes for PDF page rendering")
 
     auto_parser = subparsers.add_parser("auto-annotate", help="Auto-annotate glyph clusters.")
     auto_parser.add_argument("--manifest", default="source_manifest.json", help="Source manifest path")
@@ -121,14 +316,40 @@ def main() -> None:
     auto_parser.add_argument("--min-area", type=int, default=80)
     auto_parser.add_argument("--dilation", type=int, default=3)
     auto_parser.add_argument("--margin", type=int, default=4)
+    auto_parser.add_argument("--labeling", choices=["rle", "reference"], default="rle", help="Connected-component backend")
+    auto_parser.add_argument("--tile-rows", type=int, default=0, help="Segment in strips of this many scaled rows (0 = whole image)")
+    auto_parser.add_argument("--preprocess", choices=["pil", "numpy"], default="pil", help="Grayscale/resize/dilation backend")
+    auto_parser.add_argument("--threshold-mode", choices=["fixed", "otsu", "adaptive"], default="fixed", help="How the dark mask is thresholded")
+    auto_parser.add_argument("--adaptive-window", type=int, default=31, help="Window for --threshold-mode adaptive")
+    auto_parser.add_argument("--adaptive-offset", type=int, default=10, help="Offset below the local mean for adaptive thresholding")
+    auto_parser.add_argument("--merge-gap", type=int, default=0, help="Merge clusters whose boxes lie within this many pixels (0 = off)")
+    auto_parser.add_argument("--workers", type=int, default=1, help="Worker processes for segmentation")
+    auto_parser.add_argument("--backend", choices=["jsonl", "sqlite"], default="jsonl", help="Ledger backend")
+    auto_parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite ledger path for --backend sqlite")
 
     export_parser = subparsers.add_parser("export-clusters", help="Export per-cluster crops.")
     export_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON")
     export_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Path to observations ledger")
     export_parser.add_argument("--output-root", default=".", help="Repo root for evidence paths")
+    export_parser.add_argument("--export-workers", type=int, default=4, help="Threads for encoding crop PNGs")
 
     report_parser = subparsers.add_parser("report", help="Rebuild REPORT.md from the manifest + observations.")
     report_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
+    report_parser.add_argument("--backend", choices=["jsonl", "sqlite"], default="jsonl", help="Ledger backend")
+    report_parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite ledger path for --backend sqlite")
+    report_parser.add_argument(
+        "--sharded", action="store_true", help="Write one page per relief plus index.md instead of REPORT.md"
+    )
+    report_parser.add_argument("--report-dir", default=str(DEFAULT_REPORT_DIR), help="Directory for --sharded pages")
+
+    html_parser = subparsers.add_parser("html-report", help="Write a static HTML report with thumbnails and zoomable tiles.")
+    html_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
+    html_parser.add_argument("--backend", choices=["jsonl", "sqlite"], default="jsonl", help="Ledger backend")
+    html_parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite ledger path for --backend sqlite")
+    html_parser.add_argument("--output-dir", default=str(DEFAULT_HTML_REPORT_DIR), help="Directory for the static site")
+    html_parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="Deep-zoom tile edge in pixels")
+    html_parser.add_argument("--thumb-size", type=int, default=DEFAULT_THUMB_SIZE, help="Thumbnail bounding box in pixels")
+    html_parser.add_argument("--workers", type=int, default=1, help="Worker processes (one image per task)")
 
     observe_parser = subparsers.add_parser("observe", help="Add a manual sign observation.")
     observe_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Path to observations JSONL")
@@ -137,6 +358,9 @@ def main() -> None:
     observe_parser.add_argument("--description", required=True, help="Freeform description of observed sign")
     observe_parser.add_argument("--bbox", help="Bounding box x1,y1,x2,y2 in evidence image coordinates")
     observe_parser.add_argument("--confidence", type=float, help="Confidence 0-1 for the sign observation")
+    observe_parser.add_argument(
+        "--evidence-id", help="Secondary witness the sign was read from (default: the line's own evidence)"
+    )
     observe_parser.add_argument(
         "--direction",
         choices=["left_to_right", "right_to_left", "top_to_bottom", "bottom_to_top", "unknown"],
@@ -144,6 +368,8 @@ def main() -> None:
     )
     observe_parser.add_argument("--direction-basis", help="Basis for directionality (e.g., facing figures)")
     observe_parser.add_argument("--direction-confidence", type=float, help="Confidence for directionality")
+    observe_parser.add_argument("--backend", choices=["jsonl", "sqlite"], default="jsonl", help="Ledger backend")
+    observe_parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite ledger path for --backend sqlite")
 
     journal_parser = subparsers.add_parser("journal", help="Append an entry to the audit journal.")
     journal_parser.add_argument("--type", required=True, help="Entry type (hypothesis, decision, question, etc.)")
@@ -151,29 +377,126 @@ def main() -> None:
     journal_parser.add_argument("--line-id", help="Optional line identifier")
     journal_parser.add_argument("--confidence", type=float, help="Confidence 0-1 for the entry")
     journal_parser.add_argument("--tags", help="Comma-separated tags")
+    journal_parser.add_argument("--backend", choices=["jsonl", "sqlite"], default="jsonl", help="Ledger backend")
+    journal_parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite ledger path for --backend sqlite")
+
+    sweep_parser = subparsers.add_parser("sweep", help="Compare auto-annotate parameter grids without touching the ledger.")
+    sweep_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
+    sweep_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Observations ledger (read for manual bboxes)")
+    sweep_parser.add_argument("--output", default=str(DEFAULT_SWEEP_PATH), help="Comparison table (CSV)")
+    sweep_parser.add_argument("--thresholds", default="140", help="Comma-separated threshold values")
+    sweep_parser.add_argument("--scales", default="0.5", help="Comma-separated scale values")
+    sweep_parser.add_argument("--min-areas", default="80", help="Comma-separated min-area values")
+    sweep_parser.add_argument("--dilations", default="3", help="Comma-separated dilation values")
+    sweep_parser.add_argument("--margins", default="4", help="Comma-separated margin values")
+    sweep_parser.add_argument("--labeling", choices=["rle", "reference"], default="rle", help="Connected-component backend")
+    sweep_parser.add_argument("--preprocess", choices=["pil", "numpy"], default="pil", help="Grayscale/resize/dilation backend")
+    sweep_parser.add_argument("--threshold-mode", choices=["fixed", "otsu", "adaptive"], default="fixed", help="How the dark mask is thresholded")
+    sweep_parser.add_argument("--adaptive-window", type=int, default=31, help="Window for --threshold-mode adaptive")
+    sweep_parser.add_argument("--adaptive-offset", type=int, default=10, help="Offset below the local mean for adaptive thresholding")
+    sweep_parser.add_argument("--merge-gap", type=int, default=0, help="Merge clusters whose boxes lie within this many pixels (0 = off)")
+    sweep_parser.add_argument("--workers", type=int, default=1, help="Worker processes (one line per task)")
+
+    features_parser = subparsers.add_parser("features", help="Extract glyph-cluster feature vectors into a search index.")
+    features_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
+    features_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Observations ledger path")
+    features_parser.add_argument("--output-root", default=".", help="Repo root for evidence paths")
+    features_parser.add_argument("--index", default=str(DEFAULT_FEATURE_INDEX), help="Feature index path (.npz)")
+    features_parser.add_argument("--workers", type=int, default=1, help="Worker processes (one line per task)")
+
+    similar_parser = subparsers.add_parser("similar", help="List the clusters most visually similar to a sign.")
+    similar_parser.add_argument("--sign-id", required=True, help="Sign or auto cluster id to query")
+    similar_parser.add_argument("--line-id", help="Line of the query sign (needed when the sign id is not unique)")
+    similar_parser.add_argument("--top-k", type=int, default=10, help="Number of matches to list")
+    similar_parser.add_argument("--other-lines", action="store_true", help="Only list matches from other lines")
+    similar_parser.add_argument("--index", default=str(DEFAULT_FEATURE_INDEX), help="Feature index path (.npz)")
 
-    runall_parser = subparsers.add_parser("run-all", help="Build, auto-annotate, export clusters, rebuild report.")
+    reconcile_parser = subparsers.add_parser("reconcile", help="Mark auto clusters covered by manual bboxes as superseded.")
+    reconcile_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Observations ledger path")
+
+    compact_parser = subparsers.add_parser("compact-ledger", help="Fold the observe log (<ledger>.wal) into the observations ledger.")
+    compact_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Observations ledger path")
+
+    pack_parser = subparsers.add_parser("pack-ledger", help="Rewrite the observations ledger in the compact columnar encoding.")
+    pack_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Observations ledger path")
+    pack_parser.add_argument("--unpack", action="store_true", help="Rewrite in the plain schema encoding instead")
+
+    db_parser = subparsers.add_parser("db", help="Mirror the JSONL ledgers into SQLite and query them.")
+    db_parser.add_argument("action", choices=["import", "export", "pending-review"])
+    db_parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite ledger path")
+    db_parser.add_argument("--output-root", default=".", help="Repo root holding ledger/, journal/ and analysis/")
+
+    runall_parser = subparsers.add_parser("run-all", help="Build, auto-annotate, export clusters, index features, rebuild report.")
     runall_parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON.")
     runall_parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Observations ledger path")
     runall_parser.add_argument("--output-root", default=".", help="Repo root for evidence paths")
     runall_parser.add_argument("--overwrite", action="store_true", help="Overwrite existing observations")
+    runall_parser.add_argument("--force", action="store_true", help="Ignore the build state and rebuild everything")
+    runall_parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Download cache for image/IIIF sources")
+    runall_parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Download cache size bound")
+    runall_parser.add_argument("--offline", action="store_true", help="Fail fast instead of downloading uncached sources")
+    runall_parser.add_argument(
+        "--revalidate", action="store_true", help="Re-check cached sources with conditional (ETag/Last-Modified) requests"
+    )
+    runall_parser.add_argument("--raster-budget-mb", type=int, default=DEFAULT_RASTER_BUDGET // (1024 * 1024), help="Memory budget for rendered PDF pages")
+    runall_parser.add_argument("--render-workers", type=int, default=1, help="Worker processes for PDF page rendering")
     runall_parser.add_argument("--threshold", type=int, default=140)
     runall_parser.add_argument("--scale", type=float, default=0.5)
     runall_parser.add_argument("--min-area", type=int, default=80)
     runall_parser.add_argument("--dilation", type=int, default=3)
     runall_parser.add_argument("--margin", type=int, default=4)
+    runall_parser.add_argument("--labeling", choices=["rle", "reference"], default="rle", help="Connected-component backend")
+    runall_parser.add_argument("--tile-rows", type=int, default=0, help="Segment in strips of this many scaled rows (0 = whole image)")
+    runall_parser.add_argument("--preprocess", choices=["pil", "numpy"], default="pil", help="Grayscale/resize/dilation backend")
+    runall_parser.add_argument("--threshold-mode", choices=["fixed", "otsu", "adaptive"], default="fixed", help="How the dark mask is thresholded")
+    runall_parser.add_argument("--adaptive-window", type=int, default=31, help="Window for --threshold-mode adaptive")
+    runall_parser.add_argument("--adaptive-offset", type=int, default=10, help="Offset below the local mean for adaptive thresholding")
+    runall_parser.add_argument("--merge-gap", type=int, default=0, help="Merge clusters whose boxes lie within this many pixels (0 = off)")
+    runall_parser.add_argument("--workers", type=int, default=1, help="Worker processes for segmentation")
+    runall_parser.add_argument("--export-workers", type=int, default=4, help="Threads for encoding crop PNGs")
+    runall_parser.add_argument("--feature-workers", type=int, default=1, help="Worker processes for feature extraction")
 
     args = parser.parse_args()
     manifest_path = Path(getattr(args, "manifest", "source_manifest.json"))
 
     if args.command == "build":
-        run_build(manifest_path)
+        run_build(
+            manifest_path,
+            force=args.force,
+            downloads=_download_cache(args),
+            raster_cache=PageRasterCache(args.raster_budget_mb * 1024 * 1024),
+            render_workers=args.render_workers,
+        )
     elif args.command == "auto-annotate":
-        run_auto_annotate(manifest_path, Path(args.ledger), args)
+        store = _ledger_store(args)
+        try:
+            run_auto_annotate(manifest_path, Path(args.ledger), args, store=store)
+        finally:
+            if store is not None:
+                store.close()
     elif args.command == "export-clusters":
-        run_export_clusters(manifest_path, Path(args.ledger), Path(args.output_root))
+        run_export_clusters(manifest_path, Path(args.ledger), Path(args.output_root), workers=args.export_workers)
     elif args.command == "report":
-        run_report(manifest_path)
+        store = _ledger_store(args)
+        try:
+            run_report(manifest_path, store=store, sharded=args.sharded, report_dir=Path(args.report_dir))
+        finally:
+            if store is not None:
+                store.close()
+    elif args.command == "html-report":
+        store = _ledger_store(args)
+        try:
+            run_html_report(
+                manifest_path,
+                Path(args.output_dir),
+                store=store,
+                tile_size=args.tile_size,
+                thumb_size=args.thumb_size,
+                workers=args.workers,
+            )
+        finally:
+            if store is not None:
+                store.close()
     elif args.command == "observe":
         bbox = None
         if args.bbox:
@@ -181,31 +504,73 @@ def main() -> None:
             if len(parts) != 4:
                 raise SystemExit("bbox must be x1,y1,x2,y2")
             bbox = [float(p) for p in parts]
-        add_sign_observation(
-            Path(args.ledger),
-            line_id=args.line_id,
-            sign_id=args.sign_id,
-            description=args.description,
-            bbox=bbox,
-            confidence=args.confidence,
-            direction=args.direction,
-            direction_basis=args.direction_basis,
-            direction_confidence=args.direction_confidence,
-        )
+        store = _ledger_store(args)
+        try:
+            add_sign_observation(
+                Path(args.ledger),
+                line_id=args.line_id,
+                sign_id=args.sign_id,
+                description=args.description,
+                bbox=bbox,
+                confidence=args.confidence,
+                direction=args.direction,
+                direction_basis=args.direction_basis,
+                direction_confidence=args.direction_confidence,
+                store=store,
+                evidence_id=args.evidence_id,
+            )
+        finally:
+            if store is not None:
+                store.close()
     elif args.command == "journal":
         tags = [t.strip() for t in (args.tags or "").split(",") if t.strip()]
-        append_entry(
-            entry_type=args.type,
-            text=args.text,
-            line_id=args.line_id,
-            confidence=args.confidence,
-            tags=tags,
-        )
+        store = _ledger_store(args)
+        try:
+            append_entry(
+                entry_type=args.type,
+                text=args.text,
+                line_id=args.line_id,
+                confidence=args.confidence,
+                tags=tags,
+                store=store,
+            )
+        finally:
+            if store is not None:
+                store.close()
+    elif args.command == "sweep":
+        run_sweep(manifest_path, Path(args.ledger), args)
+    elif args.command == "features":
+        run_features(manifest_path, Path(args.ledger), Path(args.output_root), Path(args.index), workers=args.workers)
+    elif args.command == "similar":
+        run_similar(Path(args.index), args.sign_id, args.line_id, args.top_k, args.other_lines)
+    elif args.command == "reconcile":
+        run_reconcile(Path(args.ledger))
+    elif args.command == "compact-ledger":
+        ObservationStore(Path(args.ledger)).compact()
+    elif args.command == "pack-ledger":
+        ledger_path = Path(args.ledger)
+        save_observations(ledger_path, load_observations(ledger_path), packed=not args.unpack)
+    elif args.command == "db":
+        run_db(args.action, Path(args.db), Path(args.output_root))
     elif args.command == "run-all":
-        run_build(manifest_path)
-        run_auto_annotate(manifest_path, Path(args.ledger), args)
-        run_export_clusters(manifest_path, Path(args.ledger), Path(args.output_root))
-        run_report(manifest_path)
+        # one manifest load and one ledger write for the whole run
+        ledger_path = Path(args.ledger)
+        output_root = Path(args.output_root)
+        with PipelineContext(manifest_path, ledger_path, output_root) as context:
+            run_build(
+                manifest_path,
+                force=args.force,
+                downloads=_download_cache(args),
+                raster_cache=PageRasterCache(args.raster_budget_mb * 1024 * 1024),
+                render_workers=args.render_workers,
+                context=context,
+            )
+            run_auto_annotate(manifest_path, ledger_path, args, context=context)
+            run_export_clusters(manifest_path, ledger_path, output_root, workers=args.export_workers, context=context)
+            run_features(
+                manifest_path, ledger_path, output_root, DEFAULT_FEATURE_INDEX, workers=args.feature_workers, context=context
+            )
+            run_report(manifest_path, context=context)
     else:
         raise SystemExit(f"Unknown command {args.command}")
 
@@ -10,9 +10,10 @@ def main() -> None:
     parser.add_argument("--manifest", default="source_manifest.json", help="Path to source manifest JSON")
     parser.add_argument("--ledger", default="ledger/observations.jsonl", help="Path to observations ledger")
     parser.add_argument("--output-root", default=".", help="Repo root for evidence paths")
+    parser.add_argument("--workers", type=int, default=4, help="Threads for encoding crop PNGs")
     args = parser.parse_args()
 
-    generate_cluster_crops(Path(args.manifest), Path(args.ledger), Path(args.output_root))
+    generate_cluster_crops(Path(args.manifest), Path(args.ledger), Path(args.output_root), workers=args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pyramid_audit.vocabulary import Vocabulary
+
+# cells of the (pairs, observed + 1, prior + 1) DP table held per batch
+ALIGN_BATCH_CELLS = 1 << 22
+# diagonals searched either side of the length difference by banded_distances
+BAND_SLACK = 8
+_FAR = 1 << 29
+
+Alignment = List[List[Optional[str]]]
+
+
+def _pad(sequences: Sequence[np.ndarray], width: int, fill: int) -> np.ndarray:
+    padded = np.full((len(sequences), width), fill, dtype=np.int32)
+    for row, seq in enumerate(sequences):
+        padded[row, : len(seq)] = seq
+    return padded
+
+
+def _distance_tables(
+    observed: Sequence[np.ndarray],
+    prior: Sequence[np.ndarray],
+    infix: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Levenshtein DP for a batch of pairs, one observed token (row) at a time.
+    # Each row takes the above/diagonal moves elementwise; the left moves form a
+    # running minimum: D[i, j] = j + min_{k<=j}(T[k] - k). With infix=True the
+    # observed sequence may start and end anywhere in the prior one (row 0 is
+    # free and the best cell of the last row wins). Returns the distances, the
+    # prior column each alignment ends at, and the full (rows, pairs, cols)
+    # table for traceback.
+    count = len(observed)
+    obs_len = np.array([len(seq) for seq in observed], dtype=np.int64)
+    prior_len = np.array([len(seq) for seq in prior], dtype=np.int64)
+    n, m = int(obs_len.max(initial=0)), int(prior_len.max(initial=0))
+    # distinct pad values never match each other
+    obs = _pad(observed, n, -1)
+    pri = _pad(prior, m, -2)
+    cols = np.arange(m + 1, dtype=np.int32)
+    table = np.empty((n + 1, count, m + 1), dtype=np.int32)
+    table[0] = 0 if infix else cols
+    for i in range(1, n + 1):
+        above = table[i - 1]
+        cost = (obs[:, i - 1 : i] != pri).astype(np.int32)
+        step = np.empty((count, m + 1), dtype=np.int32)
+        step[:, 0] = i
+        np.minimum(above[:, 1:] + 1, above[:, :-1] + cost, out=step[:, 1:])
+        table[i] = np.minimum.accumulate(step - cols, axis=1) + cols
+    batch = np.arange(count)
+    if not infix:
+        return table[obs_len, batch, prior_len], prior_len, table
+    last = table[obs_len, batch].astype(np.int64)
+    last[cols[None, :] > prior_len[:, None]] = np.iinfo(np.int64).max
+    # the latest of equally good ends, so a trailing changed sign reads as a
+    # substitution rather than an addition
+    ends = m - last[:, ::-1].argmin(axis=1)
+    return last[batch, ends], ends, table
+
+
+def _banded_pass(observed: Sequence[np.ndarray], prior: Sequence[np.ndarray], slack: int) -> np.ndarray:
+    # Edit distance restricted to the diagonals j - i in [lo, lo + width) for
+    # a batch of pairs; row i is stored in band coordinates, k = j - i - lo,
+    # so only (pairs, width) cells are ever held. Prior tokens and column
+    # bounds are laid out once by t = i + k, making each row's inputs a slice.
+    count = len(observed)
+    obs_len = np.array([len(seq) for seq in observed], dtype=np.int64)
+    prior_len = np.array([len(seq) for seq in prior], dtype=np.int64)
+    n = int(obs_len.max(initial=0))
+    obs = _pad(observed, max(n, 1), -1)
+    pri = _pad(prior, max(int(prior_len.max(initial=0)), 1), -2)
+    lo = np.minimum(0, prior_len - obs_len) - slack
+    width = int(np.abs(prior_len - obs_len).max(initial=0)) + 2 * slack + 1
+    band = np.arange(width, dtype=np.int32)
+    batch = np.arange(count)
+    # column j = t + lo of every band cell; its prior token is pri[j - 1]
+    cols = lo[:, None] + np.arange(n + width, dtype=np.int64)
+    valid = (cols >= 0) & (cols <= prior_len[:, None])
+    shifted = np.where(
+        (cols >= 1) & valid, np.take_along_axis(pri, np.clip(cols - 1, 0, pri.shape[1] - 1), axis=1), -2
+    )
+    row = np.where(valid[:, :width], cols[:, :width], _FAR).astype(np.int32)
+    # the j == 0 cells, whose distance is simply the row number
+    first = cols == 0
+    # where the last row's (n, m) cell sits in band coordinates
+    finish = prior_len - obs_len - lo
+    distances = np.where(obs_len == 0, row[batch, finish], _FAR)
+    for i in range(1, n + 1):
+        inside = valid[:, i : i + width]
+        step = row + (obs[:, i - 1 : i] != shifted[:, i : i + width])
+        np.minimum(step[:, :-1], row[:, 1:] + 1, out=step[:, :-1])
+        np.putmask(step, first[:, i : i + width], i)
+        step = np.where(inside, step - band, _FAR)
+        row = np.where(inside, np.minimum.accumulate(step, axis=1) + band, _FAR)
+        done = obs_len == i
+        distances[done] = row[batch[done], finish[done]]
+    return distances
+
+
+def banded_distances(
+    observed: Sequence[np.ndarray],
+    prior: Sequence[np.ndarray],
+    slack: int = BAND_SLACK,
+) -> np.ndarray:
+    # Exact edit distances in O(length * band) time and memory per pair. A
+    # path leaving the band costs more than `slack`, so any banded result
+    # within it is optimal; the rest are retried with the band doubled.
+    distances = np.zeros(len(observed), dtype=np.int64)
+    pending = np.arange(len(observed))
+    while len(pending):
+        found = _banded_pass([observed[idx] for idx in pending], [prior[idx] for idx in pending], slack)
+        exact = found <= slack
+        distances[pending[exact]] = found[exact]
+        pending = pending[~exact]
+        slack *= 2
+    return distances
+
+
+def _traceback(table: np.ndarray, pair: int, observed: List[int], prior: List[int], end: int, infix: bool = False) -> List[List[Any]]:
+    # [op, observed_id, prior_id] from the start of the line; diagonal
+    # moves are preferred so a changed sign reads as a substitution
+    i, j = len(observed), end
+    # plain lists: the walk touches O(n + m) cells and numpy scalar access dominates otherwise
+    dist = table[: i + 1, pair, : j + 1].tolist()
+    ops: List[List[Any]] = []
+    while i > 0 or (j > 0 and not infix):
+        here = dist[i][j]
+        if i > 0 and j > 0 and here == dist[i - 1][j - 1] + (observed[i - 1] != prior[j - 1]):
+            ops.append(["match" if observed[i - 1] == prior[j - 1] else "substitution", observed[i - 1], prior[j - 1]])
+            i, j = i - 1, j - 1
+        elif j > 0 and here == dist[i][j - 1] + 1:
+            ops.append(["omission", None, prior[j - 1]])
+            j -= 1
+        else:
+            ops.append(["addition", observed[i - 1], None])
+            i -= 1
+    ops.reverse()
+    return ops
+
+
+def align_ids(
+    observed: Sequence[np.ndarray],
+    prior: Sequence[np.ndarray],
+    with_alignment: bool = True,
+    infix: bool = False,
+) -> List[Tuple[int, Optional[List[List[Any]]]]]:
+    # (edit distance, alignment of token ids) per pair of vocabulary-encoded
+    # sequences; infix=True aligns against the best-matching span of prior.
+    # Pairs are grouped by length so each batch's padded DP table stays under
+    # ALIGN_BATCH_CELLS.
+    order = sorted(range(len(observed)), key=lambda idx: (len(observed[idx]), len(prior[idx])))
+    results: List[Tuple[int, Optional[List[List[Any]]]]] = [(0, None)] * len(observed)
+    start = 0
+    while start < len(order):
+        # observed lengths grow along `order`; the widest prior sets the table width
+        stop, width = start + 1, len(prior[order[start]])
+        while stop < len(order):
+            idx = order[stop]
+            grown = max(width, len(prior[idx]))
+            if (stop - start + 1) * (len(observed[idx]) + 1) * (grown + 1) > ALIGN_BATCH_CELLS:
+                break
+            stop, width = stop + 1, grown
+        batch = order[start:stop]
+        distances, ends, table = _distance_tables([observed[idx] for idx in batch], [prior[idx] for idx in batch], infix)
+        for pair, idx in enumerate(batch):
+            alignment = None
+            if with_alignment:
+                alignment = _traceback(
+                    table, pair, observed[idx].tolist(), prior[idx].tolist(), int(ends[pair]), infix
+                )
+            results[idx] = (int(distances[pair]), alignment)
+        start = stop
+    return results
+
+
+def align_tokens(
+    pairs: Sequence[Tuple[List[str], List[str]]],
+    with_alignment: bool = True,
+    vocabulary: Optional[Vocabulary] = None,
+) -> List[Tuple[int, Optional[Alignment]]]:
+    # string front end to align_ids; tokens missing from the vocabulary are interned
+    vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+    observed = [vocabulary.encode(obs) for obs, _prior in pairs]
+    prior = [vocabulary.encode(pri) for _obs, pri in pairs]
+    tokens = vocabulary.tokens
+    results: List[Tuple[int, Optional[Alignment]]] = []
+    for distance, alignment in align_ids(observed, prior, with_alignment):
+        if alignment is not None:
+            alignment = [
+                [op, None if obs is None else tokens[obs], None if pri is None else tokens[pri]]
+                for op, obs, pri in alignment
+            ]
+        results.append((distance, alignment))
+    return results
@@ -1,42 +1,89 @@
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
+from pyramid_audit.alignment import Alignment, align_tokens
+from pyramid_audit.corpus import CorpusView
+from pyramid_audit.reconstruction import generate_candidates, prior_reading_pool
+from pyramid_audit.vocabulary import Vocabulary
 
-def score_discrepancy(
-    observed_tokens: List[str],
-    prior_tokens: List[str],
-    directionality_mismatch: bool = False,
-) -> Dict[str, Any]:
-    if not observed_tokens and not prior_tokens:
-        return {"severity": "none", "diff_ratio": 0.0, "likely_cause": "no_data"}
-    if directionality_mismatch:
-        return {"severity": "major", "diff_ratio": 1.0, "likely_cause": "directionality_mismatch"}
-    total = max(len(observed_tokens), len(prior_tokens))
-    diffs = sum(1 for a, b in zip(observed_tokens, prior_tokens) if a != b)
-    diffs += abs(len(observed_tokens) - len(prior_tokens))
-    ratio = diffs / total if total else 0.0
+
+def _classify(distance: int, total: int, alignment: Optional[Alignment]) -> Dict[str, Any]:
+    ratio = distance / total if total else 0.0
     if ratio == 0:
         severity = "none"
         cause = "no_discrepancy"
     elif ratio <= 0.5:
         severity = "minor"
-        cause = "sign_confusion"
     elif ratio <= 0.8:
         severity = "major"
-        cause = "omission_or_addition"
     else:
         severity = "critical"
+    if ratio > 0.8:
         cause = "substantial_divergence"
+    elif ratio > 0:
+        substitutions = sum(1 for op in alignment or [] if op[0] == "substitution")
+        # mostly substituted signs suggest confusion; mostly gaps suggest omissions/additions
+        cause = "sign_confusion" if substitutions * 2 >= distance else "omission_or_addition"
     return {"severity": severity, "diff_ratio": ratio, "likely_cause": cause}
 
 
-def build_reconstructions(manifest: Dict[str, Any], output_path: Path) -> None:
+def score_discrepancies(
+    pairs: Sequence[Tuple[List[str], List[str]]],
+    directionality_mismatch: Optional[Sequence[bool]] = None,
+    vocabulary: Optional[Vocabulary] = None,
+) -> List[Dict[str, Any]]:
+    mismatch = directionality_mismatch or [False] * len(pairs)
+    aligned = align_tokens(pairs, vocabulary=vocabulary)
+    scores: List[Dict[str, Any]] = []
+    for (observed, prior), (distance, alignment), flipped in zip(pairs, aligned, mismatch):
+        if not observed and not prior:
+            scores.append({"severity": "none", "diff_ratio": 0.0, "likely_cause": "no_data"})
+            continue
+        if flipped:
+            scores.append({"severity": "major", "diff_ratio": 1.0, "likely_cause": "directionality_mismatch"})
+            continue
+        score = _classify(distance, max(len(observed), len(prior)), alignment)
+        score["edit_distance"] = distance
+        score["alignment"] = alignment
+        scores.append(score)
+    return scores
+
+
+def score_discrepancy(
+    observed_tokens: List[str],
+    prior_tokens: List[str],
+    directionality_mismatch: bool = False,
+) -> Dict[str, Any]:
+    return score_discrepancies([(observed_tokens, prior_tokens)], [directionality_mismatch])[0]
+
+
+def _observed_tokens(corpus: CorpusView) -> Dict[str, List[str]]:
+    # manual sign ids per line with an observation record
+    return {view.line_id: view.observed_tokens for view in corpus.lines() if view.observation is not None}
+
+
+def build_reconstructions(
+    corpus: Union[Dict[str, Any], CorpusView],
+    output_path: Path,
+    observations_path: Optional[Path] = None,
+    vocabulary: Optional[Vocabulary] = None,
+) -> None:
+    # Lines with manual sign observations get candidates retrieved from every
+    # prior reading in the corpus through the n-gram index (reconstruction.py);
+    # the rest keep the empty record.
+    corpus = CorpusView.wrap(corpus, observations_path=observations_path)
+    tokens_by_line: Dict[str, List[str]] = {}
+    if vocabulary is not None:
+        tokens_by_line = _observed_tokens(corpus)
+    generated: Dict[str, Dict[str, Any]] = {}
+    if vocabulary is not None and any(tokens_by_line.values()):
+        generated = generate_candidates(list(tokens_by_line.items()), prior_reading_pool(corpus.manifest), vocabulary)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with output_path.open("w", encoding="utf-8") as handle:
-        for relief in manifest.get("corpus", []):
+        for relief in corpus.reliefs():
             for line in relief.get("lines", []):
-                record = {
+                record: Dict[str, Any] = {
                     "line_id": line["line_id"],
                     "candidates": [],
                     "transliteration_candidates": [],
@@ -45,27 +92,67 @@ def build_reconstructions(manifest: Dict[str, Any], output_path: Path) -> None:
                     "confidence": 0.0,
                     "notes": "No reconstruction without manual observation input.",
                 }
+                tokens = tokens_by_line.get(line["line_id"])
+                if tokens and vocabulary is not None:
+                    record.update(generated.get(line["line_id"], {}))
+                    record["observed_token_ids"] = vocabulary.encode(tokens).tolist()
+                    if record["candidates"]:
+                        record["notes"] = (
+                            "Candidates are prior readings sharing n-grams with the observed signs, "
+                            "ranked by alignment distance; not an independent reading."
+                        )
+                    else:
+                        record["notes"] = "No prior reading shares a sign n-gram with the observed signs."
                 handle.write(json.dumps(record, ensure_ascii=True) + "\n")
 
 
-def build_discrepancies(manifest: Dict[str, Any], output_path: Path) -> None:
+def build_discrepancies(
+    corpus: Union[Dict[str, Any], CorpusView],
+    output_path: Path,
+    observations_path: Optional[Path] = None,
+    vocabulary: Optional[Vocabulary] = None,
+) -> None:
+    # Every (line, prior reading) pair with tokens on both sides is aligned in
+    # one batched pass; the rest keep the deferred note.
+    corpus = CorpusView.wrap(corpus, observations_path=observations_path)
+    tokens_by_line = _observed_tokens(corpus)
+    pending: List[Tuple[str, Dict[str, Any], List[str], List[str]]] = []
+    for relief in corpus.reliefs():
+        for line in relief.get("lines", []):
+            for reading in line.get("prior_readings", []):
+                observed = tokens_by_line.get(line["line_id"], [])
+                pending.append((line["line_id"], reading, observed, reading.get("tokens") or []))
+    scorable = [idx for idx, (_line_id, _reading, observed, prior) in enumerate(pending) if observed and prior]
+    pairs = [(pending[idx][2], pending[idx][3]) for idx in scorable]
+    scores = dict(zip(scorable, score_discrepancies(pairs, vocabulary=vocabulary)))
+
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with output_path.open("w", encoding="utf-8") as handle:
-        for relief in manifest.get("corpus", []):
-            for line in relief.get("lines", []):
-                prior_readings = line.get("prior_readings", [])
-                if not prior_readings:
-                    continue
-                for reading in prior_readings:
-                    observed_tokens = []
-                    prior_tokens = reading.get("tokens", [])
-                    score = score_discrepancy(observed_tokens, prior_tokens)
-                    record = {
-                        "line_id": line["line_id"],
-                        "reading_id": reading.get("reading_id"),
-                        "severity": score["severity"],
-                        "diff_ratio": score["diff_ratio"],
-                        "likely_cause": score["likely_cause"],
-                        "notes": "No observed tokens to compare; discrepancy scoring deferred.",
-                    }
-                    handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+        for idx, (line_id, reading, observed, prior) in enumerate(pending):
+            if idx in scores:
+                score = scores[idx]
+                notes = f"Aligned {len(observed)} observed sign tokens against {len(prior)} prior reading tokens."
+            else:
+                # deferred pairs keep their pre-alignment classification: the
+                # prior tokens scored against nothing (critical when it has any)
+                score = {
+                    key: value
+                    for key, value in score_discrepancy([], prior).items()
+                    if key not in ("edit_distance", "alignment")
+                }
+                if observed:
+                    notes = "Prior reading has no tokens to compare; discrepancy scoring deferred."
+                else:
+                    notes = "No observed tokens to compare; discrepancy scoring deferred."
+            record = {
+                "line_id": line_id,
+                "reading_id": reading.get("reading_id"),
+                "severity": score["severity"],
+                "diff_ratio": score["diff_ratio"],
+                "likely_cause": score["likely_cause"],
+            }
+            if "alignment" in score:
+                record["edit_distance"] = score["edit_distance"]
+                record["alignment"] = score["alignment"]
+            record["notes"] = notes
+            handle.write(json.dumps(record, ensure_ascii=True) + "\n")
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import bisect
+import heapq
+import math
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 from PIL import Image, ImageFilter
 
+from pyramid_audit.sign_table import SignTable
+
 
 @dataclass
 class AutoAnnotateConfig:
@@ -15,19 +22,172 @@ class AutoAnnotateConfig:
     min_area: int = 80
     dilation: int = 3
     margin: int = 4
+    labeling: str = "rle"
+    # >0 segments the scaled image in strips of this many rows; output matches the whole-image path
+    tile_rows: int = 0
+    preprocess: str = "pil"
+    threshold_mode: str = "fixed"
+    adaptive_window: int = 31
+    adaptive_offset: int = 10
+    # >0 merges clusters whose boxes lie within this many pixels of each other
+    merge_gap: int = 0
 
 
-def _mask_from_image(img: Image.Image, cfg: AutoAnnotateConfig) -> np.ndarray:
+def _gray_array(img: Image.Image) -> np.ndarray:
+    if img.mode == "L":
+        return np.asarray(img)
+    if img.mode not in ("RGB", "RGBA"):
+        return np.asarray(img.convert("L"))
+    rgb = np.asarray(img)
+    # Pillow's ITU-R 601-2 luma in 16-bit fixed point, so both paths agree exactly
+    luma = rgb[..., 0] * np.uint32(19595)
+    luma += rgb[..., 1] * np.uint32(38470)
+    luma += rgb[..., 2] * np.uint32(7471)
+    luma += np.uint32(0x8000)
+    luma >>= 16
+    return luma.astype(np.uint8)
+
+
+def _downsample(gray: np.ndarray, scale: float) -> np.ndarray:
+    if scale == 1.0:
+        return gray
+    factor = round(1.0 / scale)
+    if factor < 2 or abs(1.0 / scale - factor) > 1e-9:
+        # non-integer factors (and upscaling) fall back to Pillow's bilinear resize
+        height, width = gray.shape
+        return np.asarray(Image.fromarray(gray).resize((int(width * scale), int(height * scale)), Image.BILINEAR))
+    # integer factors: mean over factor x factor blocks, rounded to nearest
+    height, width = gray.shape[0] // factor, gray.shape[1] // factor
+    blocks = gray[: height * factor, : width * factor].reshape(height, factor, width, factor)
+    sums = blocks.sum(axis=(1, 3), dtype=np.uint32)
+    sums += np.uint32(factor * factor // 2)
+    sums //= np.uint32(factor * factor)
+    return sums.astype(np.uint8)
+
+
+def _max_filter_1d(arr: np.ndarray, size: int, axis: int) -> np.ndarray:
+    # Sliding-window max with edge replication (as Pillow's MaxFilter). Windows
+    # grow by doubling, so the cost is O(log size) passes instead of O(size).
+    before = size // 2
+    pad = [(0, 0)] * arr.ndim
+    pad[axis] = (before, size - 1 - before)
+    result = np.pad(arr, pad, mode="edge")
+    length = arr.shape[axis]
+    span = 1
+    while span * 2 <= size:
+        head = result.take(np.arange(result.shape[axis] - span), axis=axis)
+        tail = result.take(np.arange(span, result.shape[axis]), axis=axis)
+        result = np.maximum(head, tail)
+        span *= 2
+    if span == size:
+        return result.take(np.arange(length), axis=axis)
+    head = result.take(np.arange(length), axis=axis)
+    tail = result.take(np.arange(size - span, size - span + length), axis=axis)
+    return np.maximum(head, tail)
+
+
+def _max_filter(gray: np.ndarray, size: int) -> np.ndarray:
+    return _max_filter_1d(_max_filter_1d(gray, size, axis=0), size, axis=1)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    # Returns t such that `gray < t` selects Otsu's dark class.
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_dark = np.cumsum(hist)
+    weight_light = weight_dark[-1] - weight_dark
+    mass_dark = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dark = mass_dark / weight_dark
+        mean_light = (mass_dark[-1] - mass_dark) / weight_light
+        between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    between = np.nan_to_num(between, nan=0.0, posinf=0.0)
+    return int(np.argmax(between)) + 1
+
+
+def _adaptive_mask(gray: np.ndarray, window: int, offset: int) -> np.ndarray:
+    # dark where a pixel is `offset` below the mean of its window (summed-area table)
+    half = window // 2
+    padded = np.pad(gray, half + 1, mode="edge").astype(np.int64)
+    table = padded.cumsum(axis=0).cumsum(axis=1)
+    height, width = gray.shape
+    y0, x0 = np.arange(height), np.arange(width)
+    y1, x1 = y0 + 2 * half + 1, x0 + 2 * half + 1
+    sums = table[np.ix_(y1, x1)] - table[np.ix_(y0, x1)] - table[np.ix_(y1, x0)] + table[np.ix_(y0, x0)]
+    area = (2 * half + 1) ** 2
+    return gray.astype(np.int64) * area < sums - offset * area
+
+
+def _threshold(gray: np.ndarray, cfg: AutoAnnotateConfig) -> np.ndarray:
+    if cfg.threshold_mode == "fixed":
+        return np.less(gray, cfg.threshold)
+    if cfg.threshold_mode == "otsu":
+        return np.less(gray, otsu_threshold(gray))
+    if cfg.threshold_mode == "adaptive":
+        return _adaptive_mask(gray, cfg.adaptive_window, cfg.adaptive_offset)
+    raise ValueError(f"unsupported threshold mode: {cfg.threshold_mode}")
+
+
+def _scale_gray_pil(img: Image.Image, cfg: AutoAnnotateConfig) -> np.ndarray:
     gray = img.convert("L")
     if cfg.scale != 1.0:
         gray = gray.resize((int(gray.width * cfg.scale), int(gray.height * cfg.scale)), Image.BILINEAR)
-    if cfg.dilation > 1:
-        gray = gray.filter(ImageFilter.MaxFilter(cfg.dilation))
-    arr = np.array(gray)
-    return arr < cfg.threshold
+    return np.array(gray)
+
+
+def _dilate_pil(gray: np.ndarray, cfg: AutoAnnotateConfig) -> np.ndarray:
+    if cfg.dilation <= 1:
+        return gray
+    return np.array(Image.fromarray(gray).filter(ImageFilter.MaxFilter(cfg.dilation)))
+
+
+def _scale_gray_numpy(img: Image.Image, cfg: AutoAnnotateConfig) -> np.ndarray:
+    return _downsample(_gray_array(img), cfg.scale)
+
+
+def _dilate_numpy(gray: np.ndarray, cfg: AutoAnnotateConfig) -> np.ndarray:
+    if cfg.dilation <= 1:
+        return gray
+    return _max_filter(gray, cfg.dilation)
+
+
+# backend -> (scale stage, dilation stage); split so sweeps can cache each stage
+_PREPROCESSORS = {
+    "pil": (_scale_gray_pil, _dilate_pil),
+    "numpy": (_scale_gray_numpy, _dilate_numpy),
+}
+
+
+def _preprocess_stages(cfg: AutoAnnotateConfig):
+    stages = _PREPROCESSORS.get(cfg.preprocess)
+    if stages is None:
+        raise ValueError(f"unsupported preprocess backend: {cfg.preprocess}")
+    return stages
+
+
+def scale_gray(img: Image.Image, cfg: AutoAnnotateConfig) -> np.ndarray:
+    return _preprocess_stages(cfg)[0](img, cfg)
 
 
-def _components(mask: np.ndarray, cfg: AutoAnnotateConfig) -> List[Tuple[int, int, int, int, int]]:
+def dilate_gray(gray: np.ndarray, cfg: AutoAnnotateConfig) -> np.ndarray:
+    return _preprocess_stages(cfg)[1](gray, cfg)
+
+
+def preprocess_gray(img: Image.Image, cfg: AutoAnnotateConfig) -> np.ndarray:
+    # Scaled + dilated grayscale, before thresholding.
+    return dilate_gray(scale_gray(img, cfg), cfg)
+
+
+def threshold_mask(gray: np.ndarray, cfg: AutoAnnotateConfig) -> np.ndarray:
+    return _threshold(gray, cfg)
+
+
+def _mask_from_image(img: Image.Image, cfg: AutoAnnotateConfig) -> np.ndarray:
+    return threshold_mask(preprocess_gray(img, cfg), cfg)
+
+
+def _components_reference(mask: np.ndarray, cfg: AutoAnnotateConfig) -> List[Tuple[int, int, int, int, int]]:
+    # Pixel-by-pixel flood fill; kept as the parity reference for the RLE labeler.
     height, width = mask.shape
     visited = np.zeros_like(mask, dtype=bool)
     comps: List[Tuple[int, int, int, int, int]] = []
@@ -63,11 +223,284 @@ def _components(mask: np.ndarray, cfg: AutoAnnotateConfig) -> List[Tuple[int, in
     return comps
 
 
-def segment_glyph_clusters(img: Image.Image, cfg: AutoAnnotateConfig) -> List[Tuple[int, int, int, int]]:
-    mask = _mask_from_image(img, cfg)
-    comps = _components(mask, cfg)
+def _row_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _end_rows, ends = np.nonzero(edges == -1)
+    # ends are exclusive in diff space; make them inclusive pixel columns
+    return rows, starts, ends - 1
+
+
+def _link_runs(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Runs are in raster order, so (row, column) keys are globally sorted. A run in
+    # row r touches (8-connectivity) every run in row r-1 whose span meets [start-1, end+1].
+    stride = width + 2
+    start_keys = rows * stride + starts + 1
+    end_keys = rows * stride + ends + 1
+    lo = np.searchsorted(end_keys, (rows - 1) * stride + starts, side="left")
+    hi = np.searchsorted(start_keys, (rows - 1) * stride + ends + 2, side="right")
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    current = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    previous = np.repeat(lo, counts) + offsets
+    return current, previous
+
+
+def _resolve_labels(count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Vectorised union-find: hook the larger root onto the smaller one, then
+    # compress fully. Each component ends up rooted at its first run in raster order.
+    parent = np.arange(count)
+    while True:
+        ra = parent[a]
+        rb = parent[b]
+        differ = ra != rb
+        if not differ.any():
+            return parent
+        high = np.maximum(ra[differ], rb[differ])
+        low = np.minimum(ra[differ], rb[differ])
+        np.minimum.at(parent, high, low)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+
+def _components_rle(mask: np.ndarray, cfg: AutoAnnotateConfig) -> List[Tuple[int, int, int, int, int]]:
+    height, width = mask.shape
+    rows, starts, ends = _row_runs(mask)
+    if len(rows) == 0:
+        return []
+    current, previous = _link_runs(rows, starts, ends, width)
+    roots = _resolve_labels(len(rows), current, previous)
+    labels, inverse = np.unique(roots, return_inverse=True)
+    count = len(labels)
+    area = np.bincount(inverse, weights=ends - starts + 1, minlength=count).astype(np.int64)
+    minx = np.full(count, width, dtype=np.int64)
+    maxx = np.full(count, -1, dtype=np.int64)
+    maxy = np.full(count, -1, dtype=np.int64)
+    np.minimum.at(minx, inverse, starts)
+    np.maximum.at(maxx, inverse, ends)
+    np.maximum.at(maxy, inverse, rows)
+    miny = rows[labels]
+    keep = area >= cfg.min_area
+    return [
+        (int(x1), int(y1), int(x2), int(y2), int(a))
+        for x1, y1, x2, y2, a in zip(minx[keep], miny[keep], maxx[keep], maxy[keep], area[keep])
+    ]
+
+
+_LABELERS = {
+    "reference": _components_reference,
+    "rle": _components_rle,
+}
+
+
+def label_components(mask: np.ndarray, cfg: AutoAnnotateConfig) -> List[Tuple[int, int, int, int, int]]:
+    labeler = _LABELERS.get(cfg.labeling)
+    if labeler is None:
+        raise ValueError(f"unsupported labeling backend: {cfg.labeling}")
+    return labeler(mask, cfg)
+
+
+# Pillow's fixed-point resampling precision for 8-bit images (PRECISION_BITS in Resample.c)
+_RESAMPLE_BITS = 22
+
+
+def _bilinear_coeffs(in_size: int, out_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Mirrors Pillow's precompute_coeffs + normalize_coeffs_8bpc for the bilinear
+    # filter, so the vertical pass can be applied strip by strip and still match
+    # Image.resize bit for bit (a box= resize per strip drifts by rounding).
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = filterscale
+    inv_scale = 1.0 / filterscale
+    ksize = int(math.ceil(support)) * 2 + 1
+    starts = np.zeros(out_size, dtype=np.int64)
+    counts = np.zeros(out_size, dtype=np.int64)
+    coeffs = np.zeros((out_size, ksize), dtype=np.int64)
+    for yy in range(out_size):
+        center = (yy + 0.5) * scale
+        lo = max(int(center - support + 0.5), 0)
+        hi = min(int(center + support + 0.5), in_size)
+        weights = [max(0.0, 1.0 - abs((y + lo - center + 0.5) * inv_scale)) for y in range(hi - lo)]
+        total = 0.0
+        for w in weights:
+            total += w
+        for y, w in enumerate(weights):
+            if total != 0.0:
+                w /= total
+            coeffs[yy, y] = int(-0.5 + w * (1 << _RESAMPLE_BITS)) if w < 0 else int(0.5 + w * (1 << _RESAMPLE_BITS))
+        starts[yy] = lo
+        counts[yy] = hi - lo
+    return starts, counts, coeffs
+
+
+def _scaled_gray_rows(
+    img: Image.Image,
+    y0: int,
+    y1: int,
+    out_width: int,
+    coeffs: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+) -> np.ndarray:
+    # Rows [y0, y1) of img.convert("L").resize(..., BILINEAR) without materialising the full image.
+    if coeffs is None:
+        return np.array(img.crop((0, y0, img.width, y1)).convert("L"))
+    starts, counts, kernel = coeffs
+    src_lo = int(starts[y0])
+    src_hi = int((starts[y0:y1] + counts[y0:y1]).max())
+    # horizontal pass via Pillow (row-independent), vertical pass in fixed point
+    band = img.crop((0, src_lo, img.width, src_hi)).convert("L")
+    if band.width != out_width:
+        band = band.resize((out_width, band.height), Image.BILINEAR)
+    rows = np.array(band, dtype=np.int64)
+    acc = np.full((y1 - y0, out_width), 1 << (_RESAMPLE_BITS - 1), dtype=np.int64)
+    for k in range(kernel.shape[1]):
+        weight = kernel[y0:y1, k]
+        if not weight.any():
+            continue
+        index = np.minimum(starts[y0:y1] + k - src_lo, len(rows) - 1)
+        acc += rows[index] * weight[:, None]
+    return np.clip(acc >> _RESAMPLE_BITS, 0, 255).astype(np.uint8)
+
+
+def _iter_mask_strips(img: Image.Image, cfg: AutoAnnotateConfig) -> Iterator[Tuple[int, np.ndarray]]:
+    # Yields (first row, mask rows) of the scaled, dilated, thresholded image.
+    # Each strip is computed with a halo of dilation//2 rows so MaxFilter sees
+    # the same neighbourhood as it would on the whole image.
+    if cfg.scale != 1.0:
+        out_width, out_height = int(img.width * cfg.scale), int(img.height * cfg.scale)
+        coeffs = _bilinear_coeffs(img.height, out_height)
+    else:
+        out_width, out_height = img.width, img.height
+        coeffs = None
+    halo = cfg.dilation // 2 if cfg.dilation > 1 else 0
+    for y0 in range(0, out_height, cfg.tile_rows):
+        y1 = min(out_height, y0 + cfg.tile_rows)
+        lo, hi = max(0, y0 - halo), min(out_height, y1 + halo)
+        gray = _scaled_gray_rows(img, lo, hi, out_width, coeffs)
+        if cfg.dilation > 1:
+            gray = np.array(Image.fromarray(gray).filter(ImageFilter.MaxFilter(cfg.dilation)))
+        yield y0, gray[y0 - lo : y1 - lo] < cfg.threshold
+
+
+def _mask_memmap(img: Image.Image, cfg: AutoAnnotateConfig, path: Path) -> np.ndarray:
+    # Raw on-disk mask for labelers that need random access to the whole plate.
+    height = int(img.height * cfg.scale) if cfg.scale != 1.0 else img.height
+    width = int(img.width * cfg.scale) if cfg.scale != 1.0 else img.width
+    mask = np.memmap(path, dtype=np.bool_, mode="w+", shape=(height, width))
+    for y0, strip in _iter_mask_strips(img, cfg):
+        mask[y0 : y0 + len(strip)] = strip
+    mask.flush()
+    return mask
+
+
+def _merge_stats(a: List[int], b: List[int]) -> List[int]:
+    # [first_key, minx, miny, maxx, maxy, area]
+    return [min(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3]), max(a[4], b[4]), a[5] + b[5]]
+
+
+def _components_tiled(img: Image.Image, cfg: AutoAnnotateConfig) -> List[Tuple[int, int, int, int, int]]:
+    # Streaming RLE labeling: each strip is labelled together with the previous
+    # strip's last row, whose runs carry global component ids. Components that
+    # no longer reach the newest row are complete and leave the working set, so
+    # memory is bounded by the strip size plus the components crossing a seam.
+    stats: Dict[int, List[int]] = {}  # open component id -> _merge_stats layout
+    alias: Dict[int, int] = {}
+    done: List[List[int]] = []
+    carry_gids = np.zeros(0, dtype=np.int64)
+    prev_row: Optional[np.ndarray] = None
+    next_gid = 0
+
+    def find(gid: int) -> int:
+        while gid in alias:
+            gid = alias[gid]
+        return gid
+
+    for y0, strip in _iter_mask_strips(img, cfg):
+        width = strip.shape[1]
+        stride = width + 2
+        offset = 0 if prev_row is None else 1
+        block = strip if prev_row is None else np.vstack([prev_row[None, :], strip])
+        rows, starts, ends = _row_runs(block)
+        if len(rows):
+            current, previous = _link_runs(rows, starts, ends, width)
+            roots = _resolve_labels(len(rows), current, previous)
+            labels, inverse = np.unique(roots, return_inverse=True)
+            carried = rows < offset
+            label_gid: Dict[int, int] = {}
+            for label, gid in zip(inverse[carried].tolist(), carry_gids.tolist()):
+                gid = find(gid)
+                target = label_gid.get(label)
+                if target is None:
+                    label_gid[label] = gid
+                    continue
+                target = find(target)
+                if gid == target:
+                    continue
+                keep, drop = min(gid, target), max(gid, target)
+                stats[keep] = _merge_stats(stats[keep], stats.pop(drop))
+                alias[drop] = keep
+                label_gid[label] = keep
+
+            new = ~carried
+            new_inverse = inverse[new]
+            global_rows = rows[new] - offset + y0
+            count = len(labels)
+            area = np.bincount(new_inverse, weights=(ends - starts + 1)[new], minlength=count).astype(np.int64)
+            first = np.full(count, np.iinfo(np.int64).max, dtype=np.int64)
+            minx = np.full(count, width, dtype=np.int64)
+            miny = np.full(count, np.iinfo(np.int64).max, dtype=np.int64)
+            maxx = np.full(count, -1, dtype=np.int64)
+            maxy = np.full(count, -1, dtype=np.int64)
+            np.minimum.at(first, new_inverse, global_rows * stride + starts[new])
+            np.minimum.at(minx, new_inverse, starts[new])
+            np.minimum.at(miny, new_inverse, global_rows)
+            np.maximum.at(maxx, new_inverse, ends[new])
+            np.maximum.at(maxy, new_inverse, global_rows)
+            for label in np.flatnonzero(area).tolist():
+                gid = label_gid.get(label)
+                fresh = [int(first[label]), int(minx[label]), int(miny[label]), int(maxx[label]), int(maxy[label]), int(area[label])]
+                if gid is None:
+                    gid = next_gid
+                    next_gid += 1
+                    label_gid[label] = gid
+                    stats[gid] = fresh
+                    continue
+                gid = find(gid)
+                stats[gid] = _merge_stats(stats[gid], fresh)
+            last = rows == len(block) - 1
+            carry_gids = np.array([find(label_gid[label]) for label in inverse[last].tolist()], dtype=np.int64)
+        else:
+            carry_gids = np.zeros(0, dtype=np.int64)
+        open_after = set(carry_gids.tolist())
+        for gid in list(stats):
+            if gid not in open_after:
+                done.append(stats.pop(gid))
+        prev_row = strip[-1]
+
+    done.extend(stats.values())
+    done.sort(key=lambda comp: comp[0])
+    return [(minx, miny, maxx, maxy, area) for _first, minx, miny, maxx, maxy, area in done if area >= cfg.min_area]
+
+
+def components_to_boxes(
+    comps: List[Tuple[int, int, int, int, int]],
+    width: int,
+    height: int,
+    cfg: AutoAnnotateConfig,
+) -> List[Tuple[int, int, int, int]]:
     boxes: List[Tuple[int, int, int, int]] = []
-    for minx, miny, maxx, maxy, _area in comps:
+    for minx, miny, maxx, maxy, area in comps:
+        if area < cfg.min_area:
+            continue
         # scale back to original coordinates
         x1 = int(minx / cfg.scale)
         y1 = int(miny / cfg.scale)
@@ -76,29 +509,227 @@ def segment_glyph_clusters(img: Image.Image, cfg: AutoAnnotateConfig) -> List[Tu
         # add margin
         x1 = max(0, x1 - cfg.margin)
         y1 = max(0, y1 - cfg.margin)
-        x2 = min(img.width - 1, x2 + cfg.margin)
-        y2 = min(img.height - 1, y2 + cfg.margin)
+        x2 = min(width - 1, x2 + cfg.margin)
+        y2 = min(height - 1, y2 + cfg.margin)
         boxes.append((x1, y1, x2, y2))
     # sort left-to-right
     boxes.sort(key=lambda b: (b[0], b[1]))
     return boxes
 
 
+Box = Tuple[int, int, int, int]
+
+
+def _area(box: List[int]) -> int:
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+# closed groups spanning more grid cells than this are checked on every lookup
+_MERGE_MAX_CELLS = 64
+
+
+def merge_fragments(boxes: List[Box], gap: int) -> List[Box]:
+    # One sweep over x1. Open groups (right edge + gap still reaches the sweep)
+    # are kept sorted by top edge, so a box only scans the groups within its
+    # vertical reach; a group the sweep has passed by more than gap is closed
+    # into a grid, which is only consulted once a merge grows a group back to
+    # the left of the sweep. Each new box absorbs every group within gap of
+    # its (growing) extent until none is left, so no two groups are ever within
+    # gap of each other and the result is the fixed point of pairwise merging.
+    if not boxes:
+        return []
+    extent = [list(box) for box in boxes]
+    alive = [True] * len(boxes)
+    is_open = [False] * len(boxes)
+    tops: List[Tuple[int, int]] = []
+    reach = 0
+    expiry: List[Tuple[int, int]] = []
+    cell = max(16, 2 * int(np.median([max(b[2] - b[0], b[3] - b[1]) for b in boxes])) + gap)
+    closed: Dict[Tuple[int, int], List[int]] = {}
+    wide: List[int] = []
+
+    def near(a: List[int], b: List[int]) -> bool:
+        return a[0] <= b[2] + gap and b[0] <= a[2] + gap and a[1] <= b[3] + gap and b[1] <= a[3] + gap
+
+    def close(group: int) -> None:
+        del tops[bisect.bisect_left(tops, (extent[group][1], group))]
+        is_open[group] = False
+        x1, y1, x2, y2 = (v // cell for v in extent[group])
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > _MERGE_MAX_CELLS:
+            wide.append(group)
+            return
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                closed.setdefault((cx, cy), []).append(group)
+
+    def closed_near(box: List[int], checked: List[int]) -> List[int]:
+        # closed groups near box; none is near checked (already looked up), so
+        # only the cells under the strips box added around it need a visit
+        found = {group for group in wide if alive[group]}
+        nx1, ny1, nx2, ny2 = box[0] - gap, box[1] - gap, box[2] + gap, box[3] + gap
+        ox1, oy1, ox2, oy2 = checked[0] - gap, checked[1] - gap, checked[2] + gap, checked[3] + gap
+        strips = [
+            (nx1, ny1, ox1 - 1, ny2),
+            (ox2 + 1, ny1, nx2, ny2),
+            (max(nx1, ox1), ny1, min(nx2, ox2), oy1 - 1),
+            (max(nx1, ox1), oy2 + 1, min(nx2, ox2), ny2),
+        ]
+        for sx1, sy1, sx2, sy2 in strips:
+            if sx1 > sx2 or sy1 > sy2:
+                continue
+            for cx in range(sx1 // cell, sx2 // cell + 1):
+                for cy in range(sy1 // cell, sy2 // cell + 1):
+                    found.update(group for group in closed.get((cx, cy), ()) if alive[group])
+        return [group for group in found if near(extent[group], box)]
+
+    for cur in sorted(range(len(boxes)), key=lambda idx: boxes[idx][0]):
+        sweep = boxes[cur][0]
+        while expiry and expiry[0][0] + gap < sweep:
+            x2, group = heapq.heappop(expiry)
+            if alive[group] and is_open[group] and extent[group][2] == x2:
+                close(group)
+        box = extent[cur]
+        # the box alone cannot reach closed groups: they end more than gap before it
+        checked = list(box)
+        while True:
+            lo = bisect.bisect_left(tops, (box[1] - gap - reach, -1))
+            hi = bisect.bisect_right(tops, (box[3] + gap, len(boxes)))
+            found = [group for _top, group in tops[lo:hi] if near(extent[group], box)]
+            if box != checked:
+                # only a grown group can reach back to closed ones
+                found.extend(closed_near(box, checked))
+                checked = list(box)
+            if not found:
+                break
+            for group in found:
+                if is_open[group]:
+                    del tops[bisect.bisect_left(tops, (extent[group][1], group))]
+                    is_open[group] = False
+                alive[group] = False
+                other = extent[group]
+                # no closed group is near an existing group either: the largest
+                # known-clear extent keeps the next lookup to the added strips
+                if _area(other) > _area(checked):
+                    checked = list(other)
+                box[:] = [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])]
+        bisect.insort(tops, (box[1], cur))
+        is_open[cur] = True
+        reach = max(reach, box[3] - box[1])
+        heapq.heappush(expiry, (box[2], cur))
+    return [tuple(box) for box, keep in zip(extent, alive) if keep]  # type: ignore[misc]
+
+
+def _group_bands(boxes: List[Box], axis: int) -> List[List[Box]]:
+    # Rows (axis=1) or columns (axis=0): boxes sorted by their start on the axis
+    # join the current band while they overlap its extent.
+    bands: List[List[Box]] = []
+    end = None
+    for box in sorted(boxes, key=lambda b: (b[axis], b[axis + 2])):
+        if end is None or box[axis] > end:
+            bands.append([box])
+            end = box[axis + 2]
+        else:
+            bands[-1].append(box)
+            end = max(end, box[axis + 2])
+    return bands
+
+
+# direction -> (band axis, sort key within a band); bands are read top-to-bottom / left-to-right
+_READING_ORDER = {
+    "left_to_right": (1, lambda b: (b[0], b[1])),
+    "right_to_left": (1, lambda b: (-b[2], b[1])),
+    "top_to_bottom": (0, lambda b: (b[1], b[0])),
+    "bottom_to_top": (0, lambda b: (-b[3], b[0])),
+}
+
+
+def order_boxes(boxes: List[Box], direction: Optional[str] = None) -> List[Box]:
+    reading = _READING_ORDER.get(direction or "")
+    if reading is None:
+        # no recorded directionality: plain left-to-right by corner
+        return sorted(boxes, key=lambda b: (b[0], b[1]))
+    axis, key = reading
+    return [box for band in _group_bands(boxes, axis) for box in sorted(band, key=key)]
+
+
+def postprocess_boxes(boxes: List[Box], cfg: AutoAnnotateConfig, direction: Optional[str] = None) -> List[Box]:
+    if cfg.merge_gap > 0:
+        boxes = merge_fragments(boxes, cfg.merge_gap)
+    return order_boxes(boxes, direction)
+
+
+def segment_glyph_clusters(
+    img: Image.Image,
+    cfg: AutoAnnotateConfig,
+    direction: Optional[str] = None,
+) -> List[Tuple[int, int, int, int]]:
+    if cfg.tile_rows > 0 and (cfg.preprocess != "pil" or cfg.threshold_mode != "fixed"):
+        raise ValueError("tiled segmentation supports only preprocess='pil' with a fixed threshold")
+    if cfg.tile_rows > 0 and cfg.labeling == "rle":
+        comps = _components_tiled(img, cfg)
+    elif cfg.tile_rows > 0:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            comps = label_components(_mask_memmap(img, cfg, Path(tmp_dir) / "mask.bin"), cfg)
+    else:
+        comps = label_components(_mask_from_image(img, cfg), cfg)
+    return postprocess_boxes(components_to_boxes(comps, img.width, img.height, cfg), cfg, direction)
+
+
+def auto_annotate_table(
+    image_path: Path,
+    line_id: str,
+    cfg: AutoAnnotateConfig,
+    direction: Optional[str] = None,
+) -> SignTable:
+    img = Image.open(image_path)
+    return SignTable.from_boxes(line_id, segment_glyph_clusters(img, cfg, direction))
+
+
 def auto_annotate_line(
     image_path: Path,
     line_id: str,
     cfg: AutoAnnotateConfig,
+    direction: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
-    img = Image.open(image_path)
-    boxes = segment_glyph_clusters(img, cfg)
-    signs: List[Dict[str, Any]] = []
-    for idx, (x1, y1, x2, y2) in enumerate(boxes, start=1):
-        signs.append(
-            {
-                "sign_id": f"auto-{line_id}-{idx}",
-                "description": "auto-segmented glyph cluster (uninterpreted)",
-                "bbox": [x1, y1, x2, y2],
-                "confidence": 0.2,
-            }
-        )
-    return signs
+    return auto_annotate_table(image_path, line_id, cfg, direction).to_signs()
+
+
+def _annotate_job(
+    job: Tuple[str, str, AutoAnnotateConfig, Optional[str]]
+) -> Tuple[str, Optional[SignTable], Optional[str]]:
+    # workers hand back SignTables: a few arrays pickle far cheaper than a dict per cluster
+    line_id, image_path, cfg, direction = job
+    try:
+        return line_id, auto_annotate_table(Path(image_path), line_id, cfg, direction), None
+    except Exception as exc:  # reported per line so one bad image doesn't sink the batch
+        return line_id, None, f"{type(exc).__name__}: {exc}"
+
+
+def recorded_direction(record: Dict[str, Any]) -> Optional[str]:
+    # ledgers may carry "directionality": null for lines never evaluated
+    return (record.get("directionality") or {}).get("value")
+
+
+def auto_annotate_lines(
+    jobs: List[Tuple[str, Path]],
+    cfg: AutoAnnotateConfig,
+    workers: int = 1,
+    directions: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    # Results and errors are keyed by line_id; callers merge them in manifest order.
+    # directions maps line_id -> recorded directionality value for reading order.
+    directions = directions or {}
+    payload = [(line_id, str(image_path), cfg, directions.get(line_id)) for line_id, image_path in jobs]
+    if workers > 1 and len(payload) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_annotate_job, payload))
+    else:
+        outcomes = [_annotate_job(job) for job in payload]
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    errors: Dict[str, str] = {}
+    for line_id, table, error in outcomes:
+        if error is not None:
+            errors[line_id] = error
+        else:
+            results[line_id] = table.to_signs() if table is not None else []
+    return results, errors
@@ -0,0 +1,86 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+BUILD_STATE_NAME = ".build_state.json"
+STATE_VERSION = 1
+
+
+def digest(*parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: Path) -> Optional[str]:
+    if not path.exists():
+        return None
+    sha = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_fingerprint(path: Path) -> Optional[List[int]]:
+    # size + mtime is enough to notice edits without hashing large ledgers/PDFs
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class BuildState:
+    def __init__(self, path: Path, data: Optional[Dict[str, Any]] = None) -> None:
+        data = data or {}
+        self.path = path
+        self.evidence: Dict[str, str] = dict(data.get("evidence", {}))
+        self.stages: Dict[str, str] = dict(data.get("stages", {}))
+
+    @classmethod
+    def load(cls, path: Path) -> "BuildState":
+        if not path.exists():
+            return cls(path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            return cls(path)
+        if data.get("version") != STATE_VERSION:
+            return cls(path)
+        return cls(path, data)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": STATE_VERSION, "evidence": self.evidence, "stages": self.stages}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def evidence_fresh(self, evidence_id: str, key: str, out_path: Path, trust_existing: bool = False) -> bool:
+        if not out_path.exists():
+            return False
+        recorded = self.evidence.get(evidence_id)
+        if recorded is None:
+            return trust_existing
+        return recorded == key
+
+    def record_evidence(self, evidence_id: str, key: str) -> None:
+        self.evidence[evidence_id] = key
+
+    def run_stage(
+        self,
+        name: str,
+        inputs: Callable[[], str],
+        build: Callable[[], None],
+        outputs: Iterable[Path],
+    ) -> bool:
+        # inputs() is re-evaluated after building so stages that rewrite one of
+        # their own inputs (e.g. the observations ledger) settle on the new state.
+        outputs = list(outputs)
+        if self.stages.get(name) == inputs() and all(path.exists() for path in outputs):
+            return False
+        build()
+        self.stages[name] = inputs()
+        self.save()
+        return True
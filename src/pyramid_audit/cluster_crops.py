@@ -1,37 +1,23 @@
 from __future__ import annotations
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from PIL import Image
 
-
-def _load_manifest(manifest_path: Path) -> Dict[str, Any]:
-    return json.loads(manifest_path.read_text(encoding="utf-8"))
-
-
-def _load_observations(path: Path) -> List[Dict[str, Any]]:
-    if not path.exists():
-        return []
-    records = []
-    with path.open("r", encoding="utf-8") as handle:
-        for line in handle:
-            line = line.strip()
-            if not line:
-                continue
-            records.append(json.loads(line))
-    return records
+from pyramid_audit.build_state import file_digest
+from pyramid_audit.observations import load_observations, save_observations
+from pyramid_audit.sign_table import SignTable
 
 
-def _save_observations(path: Path, records: List[Dict[str, Any]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
-        for record in records:
-            handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+def read_manifest(manifest_path: Path) -> Dict[str, Any]:
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
 
 
-def _evidence_map(manifest: Dict[str, Any]) -> Dict[str, str]:
+def evidence_map(manifest: Dict[str, Any]) -> Dict[str, str]:
     mapping: Dict[str, str] = {}
     for source in manifest.get("sources", []):
         for item in source.get("items", []):
@@ -40,61 +26,146 @@ def _evidence_map(manifest: Dict[str, Any]) -> Dict[str, str]:
     return mapping
 
 
-def _make_contact_sheet(crop_paths: List[Path], out_path: Path, tile_size: int = 96, columns: int = 10) -> None:
-    if not crop_paths:
+CLUSTER_EXPORT_STATE = Path(".cache") / "cluster_export.json"
+
+
+def _load_export_state(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+
+def _save_export_state(path: Path, state: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _thumbnail(img: Image.Image, tile_size: int) -> Image.Image:
+    thumb = img.convert("RGB")
+    thumb.thumbnail((tile_size, tile_size))
+    return thumb
+
+
+def _make_contact_sheet(thumbnails: List[Image.Image], out_path: Path, tile_size: int = 96, columns: int = 10) -> None:
+    if not thumbnails:
         return
-    rows = (len(crop_paths) + columns - 1) // columns
+    rows = (len(thumbnails) + columns - 1) // columns
     sheet = Image.new("RGB", (tile_size * columns, tile_size * rows), color="white")
-    for idx, crop_path in enumerate(crop_paths):
-        img = Image.open(crop_path).convert("RGB")
-        img.thumbnail((tile_size, tile_size))
+    for idx, thumb in enumerate(thumbnails):
         x = (idx % columns) * tile_size
         y = (idx // columns) * tile_size
-        sheet.paste(img, (x, y))
+        sheet.paste(thumb, (x, y))
     out_path.parent.mkdir(parents=True, exist_ok=True)
     sheet.save(out_path)
 
 
+def _export_line(
+    img_path: Path,
+    source_hash: Optional[str],
+    table: SignTable,
+    out_dir: Path,
+    output_root: Path,
+    previous: Dict[str, Any],
+    pool: ThreadPoolExecutor,
+    tile_size: int = 96,
+) -> Tuple[Dict[str, Any], Optional[Path]]:
+    # Decodes the evidence image at most once: each crop and its contact-sheet
+    # thumbnail come from the in-memory image, and only crops whose bbox or
+    # source changed since the last export are re-encoded (on the pool).
+    rows = np.flatnonzero(table.has_bbox() & table.on_primary()).tolist()
+    boxes = {table.sign_ids[row]: [int(v) for v in table.bboxes[row]] for row in rows}
+    out_paths = {sign_id: out_dir / f"{sign_id}.png" for sign_id in boxes}
+    contact_path = out_dir / "contact_sheet.png"
+    for row in rows:
+        table.crop_paths[row] = str(out_paths[table.sign_ids[row]].relative_to(output_root))
+
+    same_source = previous.get("source") == source_hash and previous.get("tile_size") == tile_size
+    stale = [
+        sign_id
+        for sign_id, bbox in boxes.items()
+        if not (same_source and previous.get("crops", {}).get(sign_id) == bbox and out_paths[sign_id].exists())
+    ]
+    state = {"source": source_hash, "tile_size": tile_size, "crops": boxes}
+    if not boxes:
+        return state, None
+    if not stale and previous.get("crops") == boxes and contact_path.exists():
+        return state, contact_path
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    img = Image.open(img_path)
+    img.load()
+    stale_set = set(stale)
+    thumbnails: List[Image.Image] = []
+    writes = []
+    for sign_id, (x1, y1, x2, y2) in boxes.items():
+        crop = img.crop((x1, y1, x2, y2))
+        if sign_id in stale_set:
+            writes.append(pool.submit(crop.save, out_paths[sign_id]))
+        thumbnails.append(_thumbnail(crop, tile_size))
+    _make_contact_sheet(thumbnails, contact_path, tile_size=tile_size)
+    for write in writes:
+        write.result()
+
+    # crops this exporter wrote earlier for signs that no longer exist
+    for sign_id in set(previous.get("crops", {})) - set(boxes):
+        (out_dir / f"{sign_id}.png").unlink(missing_ok=True)
+    return state, contact_path
+
+
 def generate_cluster_crops(
     manifest_path: Path,
     observations_path: Path,
     output_root: Path,
+    workers: int = 4,
+    manifest: Optional[Dict[str, Any]] = None,
+    records: Optional[List[Dict[str, Any]]] = None,
 ) -> List[Dict[str, Any]]:
-    manifest = _load_manifest(manifest_path)
-    evidence_lookup = _evidence_map(manifest)
-    records = _load_observations(observations_path)
-
-    for record in records:
-        line_id = record.get("line_id")
-        evidence_ids = record.get("evidence_ids", [])
-        if not evidence_ids:
-            continue
-        image_path = evidence_lookup.get(evidence_ids[0])
-        if not image_path:
-            continue
-        img_path = output_root / image_path
-        if not img_path.exists():
-            continue
-        img = Image.open(img_path)
-        clusters = record.get("observed_signs", [])
-        out_dir = output_root / "evidence" / "clusters" / line_id
-        out_dir.mkdir(parents=True, exist_ok=True)
-        crop_paths: List[Path] = []
-        for idx, cluster in enumerate(clusters, start=1):
-            bbox = cluster.get("bbox")
-            if not bbox or len(bbox) != 4:
+    # Given in-memory records, they are updated in place and the caller saves
+    # them; otherwise the ledger is loaded and rewritten here.
+    evidence_lookup = evidence_map(manifest if manifest is not None else read_manifest(manifest_path))
+    in_memory = records is not None
+    if records is None:
+        records = load_observations(observations_path)
+    state_path = output_root / CLUSTER_EXPORT_STATE
+    export_state = _load_export_state(state_path)
+    source_hashes: Dict[Path, Optional[str]] = {}
+
+    # PNG encoding releases the GIL, so crop writes overlap on threads
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for record in records:
+            line_id = record.get("line_id")
+            evidence_ids = record.get("evidence_ids", [])
+            if not evidence_ids:
+                continue
+            image_path = evidence_lookup.get(evidence_ids[0])
+            if not image_path:
+                continue
+            img_path = output_root / image_path
+            if not img_path.exists():
                 continue
-            x1, y1, x2, y2 = bbox
-            crop = img.crop((int(x1), int(y1), int(x2), int(y2)))
-            out_path = out_dir / f"{cluster.get('sign_id', f'cluster-{idx}')}.png"
-            crop.save(out_path)
-            cluster["crop_path"] = str(out_path.relative_to(output_root))
-            crop_paths.append(out_path)
-
-        if crop_paths:
-            contact_path = out_dir / "contact_sheet.png"
-            _make_contact_sheet(crop_paths, contact_path)
-            record["cluster_contact_sheet"] = str(contact_path.relative_to(output_root))
-
-    _save_observations(observations_path, records)
+            if img_path not in source_hashes:
+                source_hashes[img_path] = file_digest(img_path)
+            table = SignTable.from_signs(record.get("observed_signs", []))
+            out_dir = output_root / "evidence" / "clusters" / line_id
+            export_state[line_id], contact_path = _export_line(
+                img_path,
+                source_hashes[img_path],
+                table,
+                out_dir,
+                output_root,
+                export_state.get(line_id, {}),
+                pool,
+            )
+            record["observed_signs"] = table.to_signs()
+            if contact_path is not None:
+                record["cluster_contact_sheet"] = str(contact_path.relative_to(output_root))
+
+    if not in_memory:
+        save_observations(observations_path, records)
+    _save_export_state(state_path, export_state)
     return records
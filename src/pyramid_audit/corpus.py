@@ -0,0 +1,177 @@
+import json
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from pyramid_audit.journal import group_entries_by_line, load_entries
+from pyramid_audit.observations import iter_observation_tables, ledger_fingerprint
+from pyramid_audit.sign_table import SignTable
+from pyramid_audit.vocabulary import table_witness_tokens
+
+if TYPE_CHECKING:
+    from pyramid_audit.sqlite_store import SqliteLedger
+
+Observation = Tuple[Dict[str, Any], SignTable]
+
+
+def load_prior_readings(path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    readings: Dict[str, List[Dict[str, Any]]] = {}
+    if not path.exists():
+        return readings
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            readings.setdefault(record.get("line_id", ""), []).append(record)
+    return readings
+
+
+def _observations_by_line(path: Path) -> Dict[str, Observation]:
+    return {record["line_id"]: (record, table) for record, table in iter_observation_tables(path)}
+
+
+# One manifest line joined with everything recorded about it; each part is
+# looked up on first access only.
+class LineView:
+    def __init__(self, corpus: "CorpusView", relief: Dict[str, Any], line: Dict[str, Any]) -> None:
+        self.corpus = corpus
+        self.relief = relief
+        self.line = line
+        self.line_id: str = line["line_id"]
+
+    @cached_property
+    def image_paths(self) -> List[str]:
+        return self.corpus.image_paths(self.line)
+
+    @cached_property
+    def secondary_image_paths(self) -> List[str]:
+        return self.corpus.image_paths(self.line, secondary=True)
+
+    @cached_property
+    def journal(self) -> List[Dict[str, Any]]:
+        return self.corpus.journal(self.line_id)
+
+    @cached_property
+    def observation(self) -> Optional[Observation]:
+        return self.corpus.observation(self.line_id)
+
+    @cached_property
+    def prior_readings(self) -> List[Dict[str, Any]]:
+        return self.corpus.prior_readings(self.line_id)
+
+    @cached_property
+    def witness_tokens(self) -> Dict[Optional[str], List[str]]:
+        return table_witness_tokens(self.observation[1]) if self.observation is not None else {}
+
+    @property
+    def observed_tokens(self) -> List[str]:
+        return self.witness_tokens.get(None, [])
+
+    @cached_property
+    def observation_status(self) -> Dict[str, Any]:
+        # "manual" once any sign was read by hand, "auto" for clusters only, else "none"
+        if self.observation is None or not len(self.observation[1]):
+            return {"status": "none", "manual": 0, "auto": 0, "superseded": 0, "contact_sheet": None, "crop_paths": []}
+        record, table = self.observation
+        auto = table.auto_count()
+        return {
+            "status": "manual" if len(table) > auto else "auto",
+            "manual": len(table) - auto,
+            "auto": auto,
+            "superseded": sum(1 for extra in table.extras if extra and extra.get("superseded_by")),
+            "contact_sheet": record.get("cluster_contact_sheet"),
+            "crop_paths": [path for path in table.crop_paths if path],
+        }
+
+
+# Read-only view over the manifest and the ledgers, shared by the index,
+# report and analysis stages. Evidence paths come from a map built once
+# instead of a deep copy of the manifest, and each ledger is read at most once
+# per state of its file: a stage that rewrites a ledger mid-build (observations,
+# prior readings) is picked up by the next lookup. With a SQLite store the
+# journal, observations and prior readings come from the database instead, and
+# with an observation_lookup (a pipeline's in-memory ledger) observations come
+# from that callable.
+class CorpusView:
+    def __init__(
+        self,
+        manifest: Dict[str, Any],
+        journal_path: Optional[Path] = None,
+        observations_path: Optional[Path] = None,
+        prior_readings_path: Optional[Path] = None,
+        store: Optional["SqliteLedger"] = None,
+        observation_lookup: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        self.manifest = manifest
+        self.journal_path = journal_path
+        self.observations_path = observations_path
+        self.prior_readings_path = prior_readings_path
+        self.store = store
+        self.observation_lookup = observation_lookup
+        self._ledgers: Dict[Path, Tuple[Any, Any]] = {}
+
+    @classmethod
+    def wrap(cls, corpus: Union[Dict[str, Any], "CorpusView"], **sources: Any) -> "CorpusView":
+        # entry points accept a bare manifest (plus ledger sources) or a shared
+        # view, which already carries its sources; both at once is an error
+        # rather than sources silently ignored
+        if not isinstance(corpus, CorpusView):
+            return cls(corpus, **sources)
+        given = sorted(name for name, value in sources.items() if value is not None)
+        if given:
+            raise ValueError(f"{', '.join(given)} given with a CorpusView; set them on the view instead")
+        return corpus
+
+    @cached_property
+    def evidence_paths(self) -> Dict[str, str]:
+        return {
+            evidence["evidence_id"]: evidence["output_path"]
+            for source in self.manifest.get("sources", [])
+            for item in source.get("items", [])
+            for evidence in item.get("evidence", [])
+        }
+
+    def image_paths(self, line: Dict[str, Any], secondary: bool = False) -> List[str]:
+        # lines that already carry resolved paths keep them
+        key = "secondary_image_paths" if secondary else "image_paths"
+        if key in line:
+            return line[key]
+        evidence_ids = line.get("secondary_evidence_ids" if secondary else "evidence_ids", [])
+        return [self.evidence_paths[eid] for eid in evidence_ids if eid in self.evidence_paths]
+
+    def reliefs(self) -> List[Dict[str, Any]]:
+        return self.manifest.get("corpus", [])
+
+    def lines(self, relief: Optional[Dict[str, Any]] = None) -> Iterator[LineView]:
+        for current in [relief] if relief is not None else self.reliefs():
+            for line in current.get("lines", []):
+                yield LineView(self, current, line)
+
+    def _ledger(self, path: Optional[Path], loader: Callable[[Path], Any]) -> Any:
+        if path is None:
+            return {}
+        # an observations write-ahead log counts as part of the file
+        fingerprint = ledger_fingerprint(path)
+        cached = self._ledgers.get(path)
+        if cached is None or cached[0] != fingerprint:
+            cached = self._ledgers[path] = (fingerprint, loader(path))
+        return cached[1]
+
+    def journal(self, line_id: str) -> List[Dict[str, Any]]:
+        if self.store is not None:
+            return self.store.journal_entries(line_id=line_id)
+        return self._ledger(self.journal_path, lambda path: group_entries_by_line(load_entries(path))).get(line_id, [])
+
+    def observation(self, line_id: str) -> Optional[Observation]:
+        if self.store is not None or self.observation_lookup is not None:
+            lookup = self.observation_lookup or self.store.observation
+            record = lookup(line_id)
+            return None if record is None else (record, SignTable.from_signs(record.get("observed_signs", [])))
+        return self._ledger(self.observations_path, _observations_by_line).get(line_id)
+
+    def prior_readings(self, line_id: str) -> List[Dict[str, Any]]:
+        if self.store is not None:
+            return self.store.prior_readings(line_id)
+        return self._ledger(self.prior_readings_path, load_prior_readings).get(line_id, [])
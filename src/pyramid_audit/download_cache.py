@@ -0,0 +1,145 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+DEFAULT_CACHE_DIR = Path(".cache") / "downloads"
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+# URL metadata (ETag, Last-Modified, last use) lives under urls/ and points at
+# blobs under objects/ named by the SHA-256 of their bytes. The store is trimmed
+# least-recently-used first whenever it grows past max_bytes.
+class DownloadCache:
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        offline: bool = False,
+        revalidate: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.revalidate = revalidate
+
+    def _meta_path(self, url: str) -> Path:
+        return self.root / "urls" / f"{_url_key(url)}.json"
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.root / "objects" / sha256[:2] / sha256
+
+    def _read_meta(self, url: str) -> Optional[Dict[str, Any]]:
+        path = self._meta_path(url)
+        if not path.exists():
+            return None
+        try:
+            meta = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            return None
+        if not self._object_path(meta.get("sha256", "")).exists():
+            return None
+        return meta
+
+    def _write_meta(self, url: str, meta: Dict[str, Any]) -> None:
+        path = self._meta_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(meta, sort_keys=True), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def _touch(self, url: str, meta: Dict[str, Any]) -> bytes:
+        meta["last_used"] = time.time()
+        self._write_meta(url, meta)
+        return self._object_path(meta["sha256"]).read_bytes()
+
+    def contains(self, url: str) -> bool:
+        return self._read_meta(url) is not None
+
+    def fetch(self, url: str) -> bytes:
+        meta = self._read_meta(url)
+        if meta is not None and (self.offline or not self.revalidate):
+            return self._touch(url, meta)
+        if self.offline:
+            raise RuntimeError(f"offline mode: {url} is not in the download cache at {self.root}")
+
+        request = Request(url)
+        if meta is not None:
+            if meta.get("etag"):
+                request.add_header("If-None-Match", meta["etag"])
+            if meta.get("last_modified"):
+                request.add_header("If-Modified-Since", meta["last_modified"])
+        try:
+            with urlopen(request) as resp:
+                data = resp.read()
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+        except HTTPError as err:
+            if err.code == 304 and meta is not None:
+                return self._touch(url, meta)
+            raise
+        self.store(url, data, etag=etag, last_modified=last_modified)
+        return data
+
+    def store(self, url: str, data: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        sha256 = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(sha256)
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = object_path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(object_path)
+        now = time.time()
+        self._write_meta(
+            url,
+            {
+                "url": url,
+                "sha256": sha256,
+                "size": len(data),
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": now,
+                "last_used": now,
+            },
+        )
+        self.evict(keep=sha256)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        entries: List[Dict[str, Any]] = []
+        for meta_path in (self.root / "urls").glob("*.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except ValueError:
+                meta_path.unlink()
+                continue
+            meta["_path"] = meta_path
+            entries.append(meta)
+
+        # several URLs can share one blob; a blob's recency is that of its freshest URL
+        last_used: Dict[str, float] = {}
+        sizes: Dict[str, int] = {}
+        for meta in entries:
+            sha256 = meta["sha256"]
+            last_used[sha256] = max(last_used.get(sha256, 0.0), meta.get("last_used", 0.0))
+            sizes[sha256] = meta.get("size", 0)
+        total = sum(sizes.values())
+        evicted: List[str] = []
+        for sha256 in sorted(last_used, key=last_used.get):
+            if total <= self.max_bytes:
+                break
+            if sha256 == keep:
+                continue
+            for meta in entries:
+                if meta["sha256"] == sha256:
+                    meta["_path"].unlink(missing_ok=True)
+                    evicted.append(meta["url"])
+            self._object_path(sha256).unlink(missing_ok=True)
+            total -= sizes[sha256]
+        return evicted
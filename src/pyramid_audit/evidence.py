@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.request import urlopen
 
 import fitz
 from PIL import Image
 
+from pyramid_audit.build_state import BuildState, digest, file_fingerprint
+from pyramid_audit.download_cache import DownloadCache
+
 
 def _ensure_parent(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -21,44 +26,231 @@ def render_pdf_page(doc: fitz.Document, page_number: int, scale: float) -> Image
     mode = "RGB"
     return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
 
+
+def render_pdf_clip(doc: fitz.Document, page_number: int, scale: float, bbox: List[float]) -> Image.Image:
+    # Rasterise only bbox (given in pixels of the page rendered at `scale`); the
+    # result matches render_pdf_page(...).crop(bbox), including black fill outside the page.
+    if page_number < 1 or page_number > doc.page_count:
+        raise ValueError(f"page_number {page_number} out of range")
+    page = doc.load_page(page_number - 1)
+    x1, y1, x2, y2 = (int(round(v)) for v in bbox)
+    clip = fitz.Rect(x1 / scale, y1 / scale, x2 / scale, y2 / scale) & page.rect
+    if clip.is_empty:
+        return Image.new("RGB", (max(x2 - x1, 0), max(y2 - y1, 0)))
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, alpha=False)
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return img.crop((x1 - pix.x, y1 - pix.y, x2 - pix.x, y2 - pix.y))
+
+
+PageKey = Tuple[str, int, float]
+
+DEFAULT_RASTER_BUDGET = 512 * 1024 * 1024
+
+
+class PageRasterCache:
+    # LRU of rendered pages keyed by (pdf_path, page, scale), bounded by decoded size.
+    def __init__(self, max_bytes: int = DEFAULT_RASTER_BUDGET) -> None:
+        self.max_bytes = max_bytes
+        self._pages: "OrderedDict[PageKey, Image.Image]" = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def _size(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def __contains__(self, key: PageKey) -> bool:
+        return key in self._pages
+
+    def get(self, key: PageKey) -> Optional[Image.Image]:
+        img = self._pages.get(key)
+        if img is not None:
+            self._pages.move_to_end(key)
+        return img
+
+    def put(self, key: PageKey, img: Image.Image) -> None:
+        if key in self._pages:
+            self._bytes -= self._size(self._pages.pop(key))
+        size = self._size(img)
+        if size > self.max_bytes:
+            return
+        self._pages[key] = img
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _key, evicted = self._pages.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+    def page(self, doc: fitz.Document, pdf_path: Path, page_number: int, scale: float) -> Image.Image:
+        key = (str(pdf_path), page_number, scale)
+        img = self.get(key)
+        if img is None:
+            img = render_pdf_page(doc, page_number, scale)
+            self.put(key, img)
+        return img
+
+
 def _image_from_bytes(data: bytes) -> Image.Image:
     from io import BytesIO
 
     return Image.open(BytesIO(data)).convert("RGB")
 
 
-def build_evidence(manifest: Dict[str, Any], output_root: Path) -> None:
-    pdf_cache: Dict[Path, fitz.Document] = {}
+def evidence_key(source: Dict[str, Any], item: Dict[str, Any], evidence: Dict[str, Any], source_fingerprint: Any = None) -> str:
+    render_cfg = evidence.get("render", {})
+    return digest(
+        source.get("type"),
+        source.get("local_path"),
+        source_fingerprint,
+        evidence.get("source_url"),
+        item.get("page"),
+        float(render_cfg.get("scale", 2.0)),
+        evidence["kind"],
+        evidence.get("bbox"),
+        evidence["output_path"],
+    )
+
+
+def _write_evidence(img: Image.Image, evidence: Dict[str, Any], out_path: Path) -> None:
+    _ensure_parent(out_path)
+    kind = evidence["kind"]
+    if kind == "page_image":
+        img.save(out_path)
+    elif kind == "crop":
+        bbox = evidence.get("bbox")
+        if not bbox or len(bbox) != 4:
+            raise ValueError(f"crop evidence missing bbox: {evidence['evidence_id']}")
+        crop = img.crop(tuple(bbox))
+        crop.save(out_path)
+    else:
+        raise ValueError(f"unsupported evidence kind: {kind}")
+
+
+def _download(source_url: str, downloads: Optional[DownloadCache]) -> bytes:
+    if downloads is not None:
+        return downloads.fetch(source_url)
+    with urlopen(source_url) as resp:
+        return resp.read()
+
+
+def _plan_pdf_pages(
+    manifest: Dict[str, Any],
+    output_root: Path,
+    state: Optional[BuildState],
+) -> "OrderedDict[Tuple[Path, int, float], List[Tuple[Dict[str, Any], Optional[str]]]]":
+    # Group every stale PDF evidence entry of the build by (pdf, page, scale) so
+    # a page is rasterised at most once no matter how many items reference it.
+    groups: "OrderedDict[Tuple[Path, int, float], List[Tuple[Dict[str, Any], Optional[str]]]]" = OrderedDict()
     for source in manifest.get("sources", []):
-        source_type = source.get("type")
-        if source_type == "pdf":
-            pdf_path = output_root / source["local_path"]
+        if source.get("type") != "pdf":
+            continue
+        pdf_path = output_root / source["local_path"]
+        fingerprint = file_fingerprint(pdf_path) if state is not None else None
+        for item in source.get("items", []):
+            for evidence in item.get("evidence", []):
+                key = None
+                if state is not None:
+                    key = evidence_key(source, item, evidence, fingerprint)
+                    if state.evidence_fresh(evidence["evidence_id"], key, output_root / evidence["output_path"]):
+                        continue
+                scale = float(evidence.get("render", {}).get("scale", 2.0))
+                groups.setdefault((pdf_path, item["page"], scale), []).append((evidence, key))
+    return groups
+
+
+def _render_page_group(
+    doc: fitz.Document,
+    pdf_path: Path,
+    page_number: int,
+    scale: float,
+    entries: List[Dict[str, Any]],
+    output_root: Path,
+    raster_cache: PageRasterCache,
+    clip_crops: bool = True,
+) -> List[str]:
+    needs_page = any(evidence["kind"] != "crop" for evidence in entries)
+    use_clip = clip_crops and not needs_page and (str(pdf_path), page_number, scale) not in raster_cache
+    written: List[str] = []
+    for evidence in entries:
+        out_path = output_root / evidence["output_path"]
+        if use_clip:
+            bbox = evidence.get("bbox")
+            if not bbox or len(bbox) != 4:
+                raise ValueError(f"crop evidence missing bbox: {evidence['evidence_id']}")
+            _ensure_parent(out_path)
+            render_pdf_clip(doc, page_number, scale, bbox).save(out_path)
+        else:
+            _write_evidence(raster_cache.page(doc, pdf_path, page_number, scale), evidence, out_path)
+        written.append(evidence["output_path"])
+    return written
+
+
+# Per-process state for parallel rendering: fitz documents cannot cross process
+# boundaries, so each worker opens its own handles and keeps its own page cache.
+_WORKER_DOCS: Dict[str, fitz.Document] = {}
+_WORKER_RASTERS: Optional[PageRasterCache] = None
+
+
+def _render_page_job(job: Tuple[str, int, float, List[Dict[str, Any]], str, int, bool]) -> List[str]:
+    global _WORKER_RASTERS
+    pdf_path, page_number, scale, entries, output_root, raster_budget, clip_crops = job
+    if _WORKER_RASTERS is None:
+        _WORKER_RASTERS = PageRasterCache(raster_budget)
+    if pdf_path not in _WORKER_DOCS:
+        _WORKER_DOCS[pdf_path] = fitz.open(pdf_path)
+    return _render_page_group(
+        _WORKER_DOCS[pdf_path], Path(pdf_path), page_number, scale, entries, Path(output_root), _WORKER_RASTERS, clip_crops
+    )
+
+
+def build_evidence(
+    manifest: Dict[str, Any],
+    output_root: Path,
+    state: Optional[BuildState] = None,
+    downloads: Optional[DownloadCache] = None,
+    raster_cache: Optional[PageRasterCache] = None,
+    clip_crops: bool = True,
+    workers: int = 1,
+) -> List[str]:
+    raster_cache = raster_cache if raster_cache is not None else PageRasterCache()
+    groups = _plan_pdf_pages(manifest, output_root, state)
+    produced: List[str] = []
+    if workers > 1 and len(groups) > 1:
+        # each worker gets an equal share of the raster budget
+        jobs = [
+            (
+                str(pdf_path),
+                page_number,
+                scale,
+                [evidence for evidence, _key in entries],
+                str(output_root),
+                raster_cache.max_bytes // workers,
+                clip_crops,
+            )
+            for (pdf_path, page_number, scale), entries in groups.items()
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for written in pool.map(_render_page_job, jobs):
+                produced.extend(written)
+    else:
+        pdf_cache: Dict[Path, fitz.Document] = {}
+        for (pdf_path, page_number, scale), entries in groups.items():
             if pdf_path not in pdf_cache:
                 pdf_cache[pdf_path] = fitz.open(pdf_path)
-            doc = pdf_cache[pdf_path]
-            for item in source.get("items", []):
-                page_number = item["page"]
-                rendered_by_scale: Dict[float, Image.Image] = {}
-                for evidence in item.get("evidence", []):
-                    render_cfg = evidence.get("render", {})
-                    scale = float(render_cfg.get("scale", 2.0))
-                    if scale not in rendered_by_scale:
-                        rendered_by_scale[scale] = render_pdf_page(doc, page_number, scale)
-                    img = rendered_by_scale[scale]
-                    out_path = output_root / evidence["output_path"]
-                    _ensure_parent(out_path)
-                    kind = evidence["kind"]
-                    if kind == "page_image":
-                        img.save(out_path)
-                    elif kind == "crop":
-                        bbox = evidence.get("bbox")
-                        if not bbox or len(bbox) != 4:
-                            raise ValueError(f"crop evidence missing bbox: {evidence['evidence_id']}")
-                        crop = img.crop(tuple(bbox))
-                        crop.save(out_path)
-                    else:
-                        raise ValueError(f"unsupported evidence kind: {kind}")
-        elif source_type in {"image", "iiif"}:
+            evidence_entries = [evidence for evidence, _key in entries]
+            produced.extend(
+                _render_page_group(
+                    pdf_cache[pdf_path], pdf_path, page_number, scale, evidence_entries, output_root, raster_cache, clip_crops
+                )
+            )
+        for doc in pdf_cache.values():
+            doc.close()
+    if state is not None:
+        for entries in groups.values():
+            for evidence, key in entries:
+                state.record_evidence(evidence["evidence_id"], key)
+
+    for source in manifest.get("sources", []):
+        source_type = source.get("type")
+        if source_type in {"image", "iiif"}:
             image_cache: Dict[str, Image.Image] = {}
             for item in source.get("items", []):
                 for evidence in item.get("evidence", []):
@@ -66,27 +258,18 @@ def build_evidence(manifest: Dict[str, Any], output_root: Path) -> None:
                     if not source_url:
                         raise ValueError(f"image evidence missing source_url: {evidence['evidence_id']}")
                     out_path = output_root / evidence["output_path"]
-                    if out_path.exists():
+                    key = evidence_key(source, item, evidence)
+                    if state is None:
+                        if out_path.exists():
+                            continue
+                    elif state.evidence_fresh(evidence["evidence_id"], key, out_path, trust_existing=True):
+                        # outputs predating the build state are trusted rather than re-downloaded
+                        state.record_evidence(evidence["evidence_id"], key)
                         continue
                     if source_url not in image_cache:
-                        with urlopen(source_url) as resp:
-                            data = resp.read()
-                        image_cache[source_url] = _image_from_bytes(data)
-                    img = image_cache[source_url]
-                    _ensure_parent(out_path)
-                    kind = evidence["kind"]
-                    if kind == "page_image":
-                        img.save(out_path)
-                    elif kind == "crop":
-                        bbox = evidence.get("bbox")
-                        if not bbox or len(bbox) != 4:
-                            raise ValueError(f"crop evidence missing bbox: {evidence['evidence_id']}")
-                        crop = img.crop(tuple(bbox))
-                        crop.save(out_path)
-                    else:
-                        raise ValueError(f"unsupported evidence kind: {kind}")
-        else:
-            continue
-
-    for doc in pdf_cache.values():
-        doc.close()
+                        image_cache[source_url] = _image_from_bytes(_download(source_url, downloads))
+                    _write_evidence(image_cache[source_url], evidence, out_path)
+                    produced.append(evidence["output_path"])
+                    if state is not None:
+                        state.record_evidence(evidence["evidence_id"], key)
+    return produced
@@ -0,0 +1,301 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from pyramid_audit.auto_annotate import otsu_threshold
+from pyramid_audit.build_state import digest, file_fingerprint
+from pyramid_audit.cluster_crops import evidence_map, read_manifest
+from pyramid_audit.observations import iter_observation_tables
+from pyramid_audit.sign_table import SignTable
+
+DEFAULT_FEATURE_INDEX = Path("analysis") / "cluster_features.npz"
+FEATURE_VERSION = 1
+BITMAP_SIZE = 12
+PROFILE_BINS = 12
+# relative weight of each block before the final L2 normalisation
+FEATURE_WEIGHTS = {"bitmap": 1.0, "profiles": 0.5, "hu": 0.35, "shape": 0.25}
+FEATURE_DIM = BITMAP_SIZE * BITMAP_SIZE + 2 * PROFILE_BINS + 7 + 2
+# index rows scored per matrix multiply, bounding the temporary score buffer
+_SEARCH_CHUNK = 65536
+
+Key = Tuple[str, str]
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def _square_bitmap(ink: np.ndarray) -> np.ndarray:
+    # pad to a centred square first so the bitmap keeps the cluster's aspect ratio
+    height, width = ink.shape
+    side = max(height, width)
+    square = np.zeros((side, side), dtype=np.uint8)
+    top, left = (side - height) // 2, (side - width) // 2
+    square[top : top + height, left : left + width] = ink * 255
+    small = Image.fromarray(square).resize((BITMAP_SIZE, BITMAP_SIZE), Image.Resampling.BOX)
+    return np.asarray(small, dtype=np.float64).ravel() / 255.0
+
+
+@lru_cache(maxsize=1024)
+def _bin_matrix(length: int) -> np.ndarray:
+    # (length, PROFILE_BINS) share of each row/column falling in each equal span
+    edges = np.linspace(0, length, PROFILE_BINS + 1)
+    starts = np.arange(length)[:, None]
+    return np.clip(np.minimum(edges[1:], starts + 1) - np.maximum(edges[:-1], starts), 0, None)
+
+
+def _profile(sums: np.ndarray) -> np.ndarray:
+    binned = sums @ _bin_matrix(len(sums))
+    total = binned.sum()
+    return binned / total if total > 0 else binned
+
+
+def _hu_moments(ink: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    # rows/cols are the ink projections; every central moment up to order 3 comes
+    # from one (4, h) @ (h, w) @ (w, 4) product instead of per-pixel coordinates
+    m00 = float(rows.sum())
+    if m00 == 0:
+        return np.zeros(7)
+    height, width = ink.shape
+    dy = np.arange(height) - float(rows @ np.arange(height)) / m00
+    dx = np.arange(width) - float(cols @ np.arange(width)) / m00
+    mu = np.vander(dy, 4, increasing=True).T @ ink @ np.vander(dx, 4, increasing=True)
+    # eta[q, p] normalises mu_pq by m00 ** (1 + (p + q) / 2)
+    order = np.add.outer(np.arange(4), np.arange(4))
+    eta = mu / m00 ** (1 + order / 2)
+    n20, n02, n11 = eta[0, 2], eta[2, 0], eta[1, 1]
+    n30, n03, n21, n12 = eta[0, 3], eta[3, 0], eta[1, 2], eta[2, 1]
+    a, b = n30 + n12, n21 + n03
+    hu = np.array(
+        [
+            n20 + n02,
+            (n20 - n02) ** 2 + 4 * n11**2,
+            (n30 - 3 * n12) ** 2 + (3 * n21 - n03) ** 2,
+            a**2 + b**2,
+            (n30 - 3 * n12) * a * (a**2 - 3 * b**2) + (3 * n21 - n03) * b * (3 * a**2 - b**2),
+            (n20 - n02) * (a**2 - b**2) + 4 * n11 * a * b,
+            (3 * n21 - n03) * a * (a**2 - 3 * b**2) - (n30 - 3 * n12) * b * (3 * a**2 - b**2),
+        ]
+    )
+    # log scale: the raw invariants span many orders of magnitude
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = -np.sign(hu) * np.log10(np.abs(hu))
+    return np.where(hu != 0, logs, 0.0)
+
+
+def cluster_features(gray: np.ndarray) -> np.ndarray:
+    # Unit-length descriptor of one crop, so cosine similarity is a dot product.
+    gray = np.asarray(gray, dtype=np.uint8)
+    if gray.size == 0:
+        return np.zeros(FEATURE_DIM, dtype=np.float32)
+    ink = (gray < otsu_threshold(gray)).astype(np.uint8)
+    height, width = ink.shape
+    weights = ink.astype(np.float64)
+    rows, cols = weights.sum(axis=1), weights.sum(axis=0)
+    blocks = {
+        "bitmap": _square_bitmap(ink),
+        "profiles": np.concatenate([_profile(rows), _profile(cols)]),
+        "hu": _hu_moments(weights, rows, cols),
+        "shape": np.array([np.log(width / height), rows.sum() / ink.size]),
+    }
+    vector = np.concatenate([_unit(blocks[name]) * weight for name, weight in FEATURE_WEIGHTS.items()])
+    return _unit(vector).astype(np.float32)
+
+
+def line_features(img: Image.Image, boxes: np.ndarray) -> np.ndarray:
+    # the image is converted to grayscale once and every crop is a view into it
+    gray = np.asarray(img.convert("L"))
+    height, width = gray.shape
+    vectors = np.zeros((len(boxes), FEATURE_DIM), dtype=np.float32)
+    for row, (x1, y1, x2, y2) in enumerate(np.asarray(boxes, dtype=np.int64).tolist()):
+        crop = gray[max(y1, 0) : min(y2, height), max(x1, 0) : min(x2, width)]
+        vectors[row] = cluster_features(crop)
+    return vectors
+
+
+def _features_job(job: Tuple[str, str, np.ndarray]) -> Tuple[str, Optional[np.ndarray], Optional[str]]:
+    line_id, image_path, boxes = job
+    try:
+        return line_id, line_features(Image.open(image_path), boxes), None
+    except Exception as exc:  # reported per line, as in auto_annotate_lines
+        return line_id, None, f"{type(exc).__name__}: {exc}"
+
+
+class FeatureIndex:
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        keys: List[Key],
+        bboxes: np.ndarray,
+        line_keys: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        self.keys = keys
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        # line_id -> digest of (evidence fingerprint, bboxes) the line's rows were built from
+        self.line_keys = line_keys or {}
+        self._rows: Optional[Dict[Key, int]] = None
+        self._sign_rows: Optional[Dict[str, List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureIndex":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != FEATURE_VERSION:
+                raise ValueError(f"feature index {path} has version {meta.get('version')}, expected {FEATURE_VERSION}")
+            keys = list(zip(data["line_ids"].tolist(), data["sign_ids"].tolist()))
+            return cls(data["vectors"], keys, data["bboxes"], meta.get("line_keys", {}))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"version": FEATURE_VERSION, "line_keys": self.line_keys}
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            vectors=self.vectors,
+            line_ids=np.array([key[0] for key in self.keys], dtype=str),
+            sign_ids=np.array([key[1] for key in self.keys], dtype=str),
+            bboxes=self.bboxes,
+            meta=np.array(json.dumps(meta)),
+        )
+        tmp_path.replace(path)
+
+    def row(self, line_id: str, sign_id: str) -> int:
+        if self._rows is None:
+            self._rows = {key: row for row, key in enumerate(self.keys)}
+        row = self._rows.get((line_id, sign_id))
+        if row is None:
+            raise ValueError(f"sign not in feature index: {line_id} / {sign_id}")
+        return row
+
+    def rows_for(self, sign_id: str) -> List[int]:
+        if self._sign_rows is None:
+            self._sign_rows = {}
+            for row, key in enumerate(self.keys):
+                self._sign_rows.setdefault(key[1], []).append(row)
+        return list(self._sign_rows.get(sign_id, []))
+
+    def search(self, queries: np.ndarray, k: int = 10, exclude: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Brute-force cosine search: one matrix multiply per chunk of the index,
+        # keeping a running top-k per query. Returns (rows, scores), best first.
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        k = min(k, len(self))
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), _SEARCH_CHUNK):
+            scores = queries @ self.vectors[start : start + _SEARCH_CHUNK].T
+            if exclude is not None:
+                for qi, row in enumerate(exclude):
+                    if start <= row < start + scores.shape[1]:
+                        scores[qi, row - start] = -np.inf
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            if best_rows.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        # ties break on row so results are stable
+        order = np.lexsort((best_rows, -best_scores)) if best_rows.size else best_rows
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def similar(self, line_id: str, sign_id: str, k: int = 10, other_lines: bool = False) -> List[Tuple[Key, float]]:
+        query = self.row(line_id, sign_id)
+        # over-fetch when same-line matches will be filtered out afterwards
+        fetch = len(self) if other_lines else k + 1
+        rows, scores = self.search(self.vectors[query], fetch, exclude=[query])
+        results: List[Tuple[Key, float]] = []
+        for row, score in zip(rows[0].tolist(), scores[0].tolist()):
+            if score == -np.inf or (other_lines and self.keys[row][0] == line_id):
+                continue
+            results.append((self.keys[row], score))
+            if len(results) == k:
+                break
+        return results
+
+
+def build_feature_index(
+    manifest_path: Path,
+    observations_path: Path,
+    output_root: Path,
+    index_path: Path,
+    workers: int = 1,
+    manifest: Optional[Dict[str, Any]] = None,
+    records: Optional[List[Dict[str, Any]]] = None,
+) -> Tuple[FeatureIndex, Dict[str, str]]:
+    # Lines whose evidence image and bboxes are unchanged since the last build
+    # keep their stored vectors; only the rest are decoded and extracted. An
+    # already loaded manifest and observation records skip the file reads.
+    evidence_lookup = evidence_map(manifest if manifest is not None else read_manifest(manifest_path))
+    previous: Optional[FeatureIndex] = None
+    if index_path.exists():
+        try:
+            previous = FeatureIndex.load(index_path)
+        except ValueError:
+            previous = None
+    previous_rows: Dict[str, List[int]] = {}
+    if previous is not None:
+        for row, (line_id, _sign_id) in enumerate(previous.keys):
+            previous_rows.setdefault(line_id, []).append(row)
+
+    lines: List[Tuple[str, List[str], np.ndarray, str]] = []
+    jobs = []
+    if records is not None:
+        tables = ((record, SignTable.from_signs(record.get("observed_signs", []))) for record in records)
+    else:
+        tables = iter_observation_tables(observations_path)
+    for record, table in tables:
+        evidence_ids = record.get("evidence_ids") or []
+        image_path = evidence_lookup.get(evidence_ids[0]) if evidence_ids else None
+        rows = np.flatnonzero(table.has_bbox() & table.on_primary())
+        if not image_path or not len(rows):
+            continue
+        img_path = output_root / image_path
+        boxes = table.bboxes[rows]
+        line_id = record["line_id"]
+        sign_ids = [table.sign_ids[row] for row in rows.tolist()]
+        key = digest(file_fingerprint(img_path), sign_ids, boxes.tolist())
+        lines.append((line_id, sign_ids, boxes, key))
+        if previous is None or previous.line_keys.get(line_id) != key:
+            jobs.append((line_id, str(img_path), boxes))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_features_job, jobs))
+    else:
+        outcomes = [_features_job(job) for job in jobs]
+    fresh = {line_id: vectors for line_id, vectors, error in outcomes if error is None}
+    errors = {line_id: error for line_id, _vectors, error in outcomes if error is not None}
+
+    vectors: List[np.ndarray] = []
+    keys: List[Key] = []
+    bboxes: List[np.ndarray] = []
+    line_keys: Dict[str, str] = {}
+    for line_id, sign_ids, boxes, key in lines:
+        if line_id in fresh:
+            vectors.append(fresh[line_id])
+        elif line_id not in errors and previous is not None:
+            vectors.append(previous.vectors[previous_rows[line_id]])
+        else:
+            continue
+        keys.extend((line_id, sign_id) for sign_id in sign_ids)
+        bboxes.append(boxes)
+        line_keys[line_id] = key
+    index = FeatureIndex(
+        np.concatenate(vectors) if vectors else np.zeros((0, FEATURE_DIM)),
+        keys,
+        np.concatenate(bboxes) if bboxes else np.zeros((0, 4)),
+        line_keys,
+    )
+    index.save(index_path)
+    return index, errors
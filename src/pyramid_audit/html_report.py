@@ -0,0 +1,386 @@
+import json
+import math
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from pyramid_audit.build_state import digest, file_fingerprint
+from pyramid_audit.corpus import CorpusView, LineView
+from pyramid_audit.report import report_corpus
+
+if TYPE_CHECKING:
+    from pyramid_audit.sqlite_store import SqliteLedger
+
+DEFAULT_HTML_REPORT_DIR = Path("report_html")
+DEFAULT_TILE_SIZE = 256
+DEFAULT_THUMB_SIZE = 320
+# per-image source fingerprints and pyramid sizes, kept next to the tiles
+TILE_STATE_NAME = ".tiles.json"
+TILE_STATE_VERSION = 1
+# cluster crops shown per line when it has no contact sheet (as in REPORT.md)
+CROP_SAMPLE = 6
+
+TileJob = Tuple[str, str, str, int, int]
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Evidence viewer</title>
+<style>
+body { margin: 0; font-family: sans-serif; }
+#bar { padding: 6px; background: #eee; }
+#view { position: absolute; top: 40px; bottom: 0; left: 0; right: 0; overflow: auto; background: #444; }
+#plane { position: relative; }
+#plane img { position: absolute; display: block; }
+</style>
+<script src="index.js"></script>
+</head>
+<body>
+<div id="bar"><a href="index.html">Index</a> <button id="out">-</button> <button id="in">+</button> <span id="label"></span></div>
+<div id="view"><div id="plane"></div></div>
+<script>
+const key = new URLSearchParams(location.hash.slice(1)).get("key");
+const info = IMAGES[key];
+const view = document.getElementById("view");
+const plane = document.getElementById("plane");
+let level = 0;
+let loaded = new Set();
+
+function size(lvl) {
+  const scale = Math.pow(2, info.levels - lvl);
+  return [Math.ceil(info.width / scale), Math.ceil(info.height / scale)];
+}
+
+// only the tiles intersecting the viewport are requested
+function showTiles() {
+  const [w, h] = size(level);
+  const t = info.tile_size;
+  const c0 = Math.floor(view.scrollLeft / t), r0 = Math.floor(view.scrollTop / t);
+  const c1 = Math.min(Math.ceil(w / t), Math.ceil((view.scrollLeft + view.clientWidth) / t));
+  const r1 = Math.min(Math.ceil(h / t), Math.ceil((view.scrollTop + view.clientHeight) / t));
+  for (let c = c0; c < c1; c++) {
+    for (let r = r0; r < r1; r++) {
+      if (loaded.has(c + "_" + r)) continue;
+      loaded.add(c + "_" + r);
+      const img = document.createElement("img");
+      img.src = "images/" + key + "/image_files/" + level + "/" + c + "_" + r + ".jpg";
+      img.style.left = c * t + "px";
+      img.style.top = r * t + "px";
+      plane.appendChild(img);
+    }
+  }
+}
+
+function setLevel(lvl) {
+  lvl = Math.max(0, Math.min(info.levels, lvl));
+  const cx = (view.scrollLeft + view.clientWidth / 2) / plane.offsetWidth || 0.5;
+  const cy = (view.scrollTop + view.clientHeight / 2) / plane.offsetHeight || 0.5;
+  level = lvl;
+  loaded = new Set();
+  plane.replaceChildren();
+  const [w, h] = size(level);
+  plane.style.width = w + "px";
+  plane.style.height = h + "px";
+  view.scrollLeft = cx * w - view.clientWidth / 2;
+  view.scrollTop = cy * h - view.clientHeight / 2;
+  showTiles();
+}
+
+if (info) {
+  document.getElementById("label").textContent = info.source;
+  let fit = info.levels;
+  while (fit > 0 && size(fit - 1)[0] >= view.clientWidth) fit--;
+  setLevel(fit);
+  view.addEventListener("scroll", showTiles);
+  window.addEventListener("resize", showTiles);
+  document.getElementById("in").onclick = () => setLevel(level + 1);
+  document.getElementById("out").onclick = () => setLevel(level - 1);
+} else {
+  document.getElementById("label").textContent = "unknown image " + key;
+}
+</script>
+</body>
+</html>
+"""
+
+INDEX_SCRIPT = """<script>
+const statusSelect = document.getElementById("status");
+const textInput = document.getElementById("text");
+function applyFilter() {
+  const status = statusSelect.value;
+  const text = textInput.value.toLowerCase();
+  let shown = 0;
+  REPORT_INDEX.lines.forEach((line, idx) => {
+    const match = (!status || line.status === status) &&
+      (!text || (line.label + " " + line.line_id + " " + line.relief).toLowerCase().includes(text));
+    document.getElementById("line-" + idx).hidden = !match;
+    shown += match ? 1 : 0;
+  });
+  document.getElementById("count").textContent = shown + " / " + REPORT_INDEX.lines.length + " lines";
+}
+statusSelect.addEventListener("change", applyFilter);
+textInput.addEventListener("input", applyFilter);
+applyFilter();
+</script>"""
+
+
+def image_key(path: str) -> str:
+    return digest(path)[:16]
+
+
+def _levels(width: int, height: int) -> int:
+    # deep-zoom levels run from 1x1 (level 0) to full size
+    return max(0, math.ceil(math.log2(max(width, height, 1))))
+
+
+def _dzi(width: int, height: int, tile_size: int) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile_size}" Overlap="0" Format="jpg">'
+        f'<Size Width="{width}" Height="{height}"/></Image>\n'
+    )
+
+
+def _tile_job(job: TileJob) -> Tuple[str, Optional[Dict[str, int]], Optional[str]]:
+    # thumb.jpg plus an image.dzi pyramid; each level is the previous one
+    # halved, so the full-size image is decoded once
+    key, source, out_dir, tile_size, thumb_size = job
+    try:
+        img = Image.open(source).convert("RGB")
+        width, height = img.size
+        target = Path(out_dir)
+        if target.exists():
+            shutil.rmtree(target)
+        (target / "image_files").mkdir(parents=True)
+        thumb = img.copy()
+        thumb.thumbnail((thumb_size, thumb_size))
+        thumb.save(target / "thumb.jpg", quality=85)
+        levels = _levels(width, height)
+        for level in range(levels, -1, -1):
+            level_dir = target / "image_files" / str(level)
+            level_dir.mkdir()
+            for col in range(math.ceil(img.width / tile_size)):
+                for row in range(math.ceil(img.height / tile_size)):
+                    box = (col * tile_size, row * tile_size, min(img.width, (col + 1) * tile_size), min(img.height, (row + 1) * tile_size))
+                    img.crop(box).save(level_dir / f"{col}_{row}.jpg", quality=85)
+            if level:
+                img = img.resize((max(1, math.ceil(img.width / 2)), max(1, math.ceil(img.height / 2))), Image.LANCZOS)
+        (target / "image.dzi").write_text(_dzi(width, height, tile_size), encoding="utf-8")
+        return key, {"width": width, "height": height, "levels": levels}, None
+    except Exception as exc:  # reported per image, as in build_feature_index
+        return key, None, f"{type(exc).__name__}: {exc}"
+
+
+def _load_tile_state(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    return dict(data.get("images", {})) if data.get("version") == TILE_STATE_VERSION else {}
+
+
+def _write_text(path: Path, text: str) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _line_images(view: LineView) -> List[Tuple[str, str]]:
+    # (role, repo-relative path) for every image a line's section shows
+    status = view.observation_status
+    images = [("evidence", path) for path in view.image_paths]
+    images.extend(("secondary", path) for path in view.secondary_image_paths)
+    if status["contact_sheet"]:
+        images.append(("contact_sheet", status["contact_sheet"]))
+    else:
+        images.extend(("cluster", path) for path in status["crop_paths"][:CROP_SAMPLE])
+    return images
+
+
+def _status_text(status: Dict[str, Any]) -> str:
+    if status["status"] == "manual":
+        superseded = f" ({status['superseded']} superseded by manual bboxes)" if status["superseded"] else ""
+        return f"Manual observations {status['manual']}; auto clusters {status['auto']}{superseded}."
+    if status["status"] == "auto":
+        return f"Auto-annotated clusters {status['auto']} (manual review required)."
+    return "No sign annotations recorded."
+
+
+def _figure(role: str, path: str, images: Dict[str, Dict[str, Any]]) -> str:
+    key = image_key(path)
+    if key not in images:
+        return f'<figure class="missing">{escape(path)} (not rendered)</figure>'
+    info = images[key]
+    return (
+        f'<figure><a href="viewer.html#key={key}"><img src="images/{key}/thumb.jpg" loading="lazy" '
+        f'alt="{escape(role)}" data-width="{info["width"]}" data-height="{info["height"]}"></a>'
+        f"<figcaption>{escape(path)}</figcaption></figure>"
+    )
+
+
+def _section_lines(idx: int, view: LineView, images: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    line = view.line
+    yield f'<section id="line-{idx}">'
+    yield f"<h3>{escape(line['label'])}</h3>"
+    if line.get("notes"):
+        yield f"<p>{escape(line['notes'])}</p>"
+    line_images = _line_images(view)
+    yield "".join(_figure(role, path, images) for role, path in line_images if role == "evidence")
+    secondary = [_figure(role, path, images) for role, path in line_images if role == "secondary"]
+    if secondary:
+        # uncertain bands stay collapsed, so their thumbnails load on demand
+        yield f"<details><summary>Secondary evidence (uncertain mapping): {len(secondary)}</summary>{''.join(secondary)}</details>"
+    if view.journal:
+        yield "<h4>Journal entries</h4><ul>"
+        for entry in view.journal:
+            meta = []
+            if entry.get("confidence") is not None:
+                meta.append(f"confidence {entry['confidence']}")
+            if entry.get("tags"):
+                meta.append("tags: " + ", ".join(entry["tags"]))
+            meta_text = f" ({'; '.join(meta)})" if meta else ""
+            yield f"<li>{escape(entry.get('type', 'entry'))}: {escape(entry.get('text', ''))}{escape(meta_text)}</li>"
+        yield "</ul>"
+    yield f"<p><strong>Observation status:</strong> {escape(_status_text(view.observation_status))}</p>"
+    clusters = [_figure(role, path, images) for role, path in line_images if role in ("contact_sheet", "cluster")]
+    if clusters:
+        yield f"<details><summary>Clusters</summary>{''.join(clusters)}</details>"
+    if view.prior_readings:
+        yield "<h4>Prior readings</h4><ul>"
+        for reading in view.prior_readings:
+            provenance = f"{reading.get('source_id') or 'unknown_source'}/{reading.get('source_item_id') or 'unknown_item'}"
+            if reading.get("page") is not None:
+                provenance += f" p.{reading['page']}"
+            details = "".join(f"<br>{name}: {escape(reading[name])}" for name in ("text", "notes") if reading.get(name))
+            yield f"<li>{escape(reading.get('reading_type', 'reading'))}: {escape(provenance)}{details}</li>"
+        yield "</ul>"
+    yield "</section>"
+
+
+def _index_html(views: List[LineView], images: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    yield '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n<title>Forensic Egyptology Audit Report</title>'
+    yield "<style>figure { display: inline-block; margin: 4px; } figure img { max-width: 320px; } figcaption { font-size: 75%; }</style>"
+    yield '<script src="index.js"></script>\n</head>\n<body>'
+    yield "<h1>Forensic Egyptology Audit Report</h1>"
+    yield (
+        '<p><label>Observation status <select id="status"><option value="">all</option>'
+        '<option value="manual">manual</option><option value="auto">auto only</option>'
+        '<option value="none">none</option></select></label> '
+        '<label>Filter <input id="text" type="search"></label> <span id="count"></span></p>'
+    )
+    relief = None
+    for idx, view in enumerate(views):
+        if view.relief is not relief:
+            relief = view.relief
+            yield f"<h2>{escape(relief['label'])}</h2>"
+            if relief.get("notes"):
+                yield f"<p>{escape(relief['notes'])}</p>"
+        yield from _section_lines(idx, view, images)
+    yield INDEX_SCRIPT
+    yield "</body>\n</html>\n"
+
+
+def build_html_report(
+    corpus: Union[Dict[str, Any], CorpusView],
+    output_dir: Path = DEFAULT_HTML_REPORT_DIR,
+    store: Optional["SqliteLedger"] = None,
+    journal_path: Optional[Path] = None,
+    observations_path: Optional[Path] = None,
+    prior_readings_path: Optional[Path] = None,
+    output_root: Path = Path("."),
+    tile_size: int = DEFAULT_TILE_SIZE,
+    thumb_size: int = DEFAULT_THUMB_SIZE,
+    workers: int = 1,
+) -> Tuple[List[str], Dict[str, str]]:
+    # Self-contained static site: index.html, viewer.html, the line index as
+    # index.json (and index.js, which also loads from file://), and a thumbnail
+    # plus deep-zoom tile pyramid per image under images/<key>/. An image is
+    # re-tiled only when its source fingerprint or the tile sizes change, and
+    # images no longer referenced are removed. Returns the images tiled and
+    # the tiling errors by source path.
+    if tile_size < 1 or thumb_size < 1:
+        raise ValueError("tile_size and thumb_size must be positive")
+    corpus = report_corpus(corpus, store, journal_path, observations_path, prior_readings_path)
+    views = list(corpus.lines())
+    state_path = output_dir / TILE_STATE_NAME
+    previous = _load_tile_state(state_path)
+    images_dir = output_dir / "images"
+
+    sources: Dict[str, str] = {}
+    for view in views:
+        for _role, path in _line_images(view):
+            sources.setdefault(image_key(path), path)
+    state: Dict[str, Dict[str, Any]] = {}
+    jobs: List[TileJob] = []
+    for key, path in sources.items():
+        fingerprint = file_fingerprint(output_root / path)
+        if fingerprint is None:
+            continue
+        entry = previous.get(key, {})
+        if (
+            entry.get("fingerprint") == fingerprint
+            and entry.get("tile_size") == tile_size
+            and entry.get("thumb_size") == thumb_size
+            and (images_dir / key / "image.dzi").exists()
+        ):
+            state[key] = entry
+            continue
+        state[key] = {"source": path, "fingerprint": fingerprint, "tile_size": tile_size, "thumb_size": thumb_size}
+        jobs.append((key, str(output_root / path), str(images_dir / key), tile_size, thumb_size))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_tile_job, jobs))
+    else:
+        outcomes = [_tile_job(job) for job in jobs]
+    errors: Dict[str, str] = {}
+    for key, info, error in outcomes:
+        if error is not None:
+            errors[sources[key]] = error
+            del state[key]
+        else:
+            state[key].update(info)
+    for key in previous:
+        if key not in state:
+            shutil.rmtree(images_dir / key, ignore_errors=True)
+
+    images = {
+        key: {"source": entry["source"], "width": entry["width"], "height": entry["height"], "levels": entry["levels"], "tile_size": entry["tile_size"]}
+        for key, entry in state.items()
+    }
+    index = {
+        "lines": [
+            {
+                "line_id": view.line_id,
+                "label": view.line["label"],
+                "relief_id": view.relief.get("relief_id"),
+                "relief": view.relief["label"],
+                "status": view.observation_status["status"],
+                "manual": view.observation_status["manual"],
+                "auto": view.observation_status["auto"],
+                "journal_entries": len(view.journal),
+                "prior_readings": len(view.prior_readings),
+                "images": [{"role": role, "key": image_key(path)} for role, path in _line_images(view)],
+            }
+            for view in views
+        ],
+        "images": images,
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    payload = json.dumps(index, ensure_ascii=True, sort_keys=True)
+    _write_text(output_dir / "index.json", payload + "\n")
+    _write_text(
+        output_dir / "index.js",
+        f"const REPORT_INDEX = {payload};\nconst IMAGES = REPORT_INDEX.images;\n",
+    )
+    _write_text(output_dir / "viewer.html", VIEWER_HTML)
+    _write_text(output_dir / "index.html", "\n".join(_index_html(views, images)))
+    _write_text(state_path, json.dumps({"version": TILE_STATE_VERSION, "images": state}, indent=2, sort_keys=True) + "\n")
+    return [sources[key] for key, _info, error in outcomes if error is None], errors
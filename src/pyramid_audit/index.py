@@ -1,6 +1,8 @@
 import csv
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Union
+
+from pyramid_audit.corpus import CorpusView
 
 
 def _item_page_map(manifest: Dict[str, Any]) -> Dict[str, int]:
@@ -11,9 +13,10 @@ def _item_page_map(manifest: Dict[str, Any]) -> Dict[str, int]:
     return mapping
 
 
-def build_corpus_index(manifest: Dict[str, Any], output_path: Path) -> None:
+def build_corpus_index(corpus: Union[Dict[str, Any], CorpusView], output_path: Path) -> None:
+    corpus = CorpusView.wrap(corpus)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    item_pages = _item_page_map(manifest)
+    item_pages = _item_page_map(corpus.manifest)
     with output_path.open("w", newline="", encoding="utf-8") as handle:
         writer = csv.DictWriter(
             handle,
@@ -31,14 +34,15 @@ def build_corpus_index(manifest: Dict[str, Any], output_path: Path) -> None:
             ],
         )
         writer.writeheader()
-        for relief in manifest.get("corpus", []):
+        for relief in corpus.reliefs():
             source_item_id = relief["source_item_id"]
             page = item_pages.get(source_item_id)
-            for line in relief.get("lines", []):
+            for view in corpus.lines(relief):
+                line = view.line
                 evidence_ids = line.get("evidence_ids", [])
-                image_paths = line.get("image_paths", [])
+                image_paths = view.image_paths
                 secondary_ids = line.get("secondary_evidence_ids", [])
-                secondary_paths = line.get("secondary_image_paths", [])
+                secondary_paths = view.secondary_image_paths
                 prior_refs = [ref.get("source_id") for ref in line.get("prior_readings", [])]
                 writer.writerow(
                     {
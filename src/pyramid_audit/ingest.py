@@ -1,10 +1,22 @@
+import copy
+import hashlib
 import json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from jsonschema import Draft202012Validator
 
+from pyramid_audit.build_state import digest, file_digest, file_fingerprint
+
 SCHEMA_NAME = "source_manifest.schema.json"
+# digests of the last validated manifest and of each valid section, kept next
+# to the manifest (see validation_state_path) so unchanged manifests are not
+# revalidated across runs
+MANIFEST_VALIDATION_STATE = Path(".cache") / "manifest_validation.json"
+VALIDATION_STATE_VERSION = 1
+
+# schema name -> (schema file fingerprint, schema digest, compiled validators)
+_VALIDATORS: Dict[str, Tuple[Any, str, "SectionValidators"]] = {}
 
 
 def repo_root() -> Path:
@@ -17,20 +29,117 @@ def load_schema(name: str) -> Dict[str, Any]:
         return json.load(handle)
 
 
-def load_manifest(path: Path) -> Dict[str, Any]:
-    with Path(path).open("r", encoding="utf-8") as handle:
-        manifest = json.load(handle)
-    validate_manifest(manifest)
-    return manifest
+# The manifest schema split into sections: the top level with each
+# array-of-$ref property (sources, corpus) left open, plus one validator for
+# the items of each such property. Validating the skeleton and every item
+# reports the same errors as validating the whole document.
+class SectionValidators:
+    def __init__(self, schema: Dict[str, Any]) -> None:
+        skeleton = copy.deepcopy(schema)
+        self.items: Dict[str, Draft202012Validator] = {}
+        for name, prop in schema.get("properties", {}).items():
+            items = prop.get("items") if prop.get("type") == "array" else None
+            if isinstance(items, dict) and "$ref" in items:
+                item_schema = {key: value for key, value in schema.items() if key in ("$schema", "definitions", "$defs")}
+                item_schema["$ref"] = items["$ref"]
+                self.items[name] = Draft202012Validator(item_schema)
+                skeleton["properties"][name] = {key: value for key, value in prop.items() if key != "items"}
+        self.skeleton = Draft202012Validator(skeleton)
 
+    def sections(self, manifest: Dict[str, Any]) -> List[Tuple[str, List[Any], Any]]:
+        # (digest, path prefix, item) for every item of a split property
+        found = []
+        for name in self.items:
+            values = manifest.get(name) if isinstance(manifest, dict) else None
+            if isinstance(values, list):
+                found.extend((digest(name, value), [name, idx], value) for idx, value in enumerate(values))
+        return found
 
-def validate_manifest(manifest: Dict[str, Any]) -> None:
-    schema = load_schema(SCHEMA_NAME)
-    validator = Draft202012Validator(schema)
-    errors = sorted(validator.iter_errors(manifest), key=lambda e: e.path)
+    def errors(self, manifest: Dict[str, Any], known: Set[str]) -> Tuple[List[Tuple[List[Any], str]], Set[str]]:
+        # errors with absolute paths, plus the digests of the sections found
+        # valid; sections whose digest is in known are not revalidated
+        errors = [(list(err.path), err.message) for err in self.skeleton.iter_errors(manifest)]
+        valid: Set[str] = set()
+        for section_digest, prefix, value in self.sections(manifest):
+            if section_digest in known:
+                valid.add(section_digest)
+                continue
+            found = [(prefix + list(err.path), err.message) for err in self.items[prefix[0]].iter_errors(value)]
+            if found:
+                errors.extend(found)
+            else:
+                valid.add(section_digest)
+        return errors, valid
+
+
+def schema_validators(name: str = SCHEMA_NAME) -> Tuple[str, SectionValidators]:
+    # compiled once per process, and again only when the schema file changes
+    schema_path = repo_root() / "schemas" / name
+    fingerprint = file_fingerprint(schema_path)
+    cached = _VALIDATORS.get(name)
+    if cached is None or cached[0] != fingerprint:
+        cached = _VALIDATORS[name] = (fingerprint, file_digest(schema_path) or "", SectionValidators(load_schema(name)))
+    return cached[1], cached[2]
+
+
+def _raise_errors(errors: List[Tuple[List[Any], str]]) -> None:
     if errors:
         message_lines = ["source_manifest.json failed validation:"]
-        for err in errors:
-            path = "/".join(str(p) for p in err.path)
-            message_lines.append(f"- {path}: {err.message}")
+        for path, message in sorted(errors, key=lambda error: error[0]):
+            message_lines.append(f"- {'/'.join(str(p) for p in path)}: {message}")
         raise ValueError("\n".join(message_lines))
+
+
+def _load_validation_state(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    return data if data.get("version") == VALIDATION_STATE_VERSION else {}
+
+
+def validation_state_path(manifest_path: Path) -> Path:
+    return Path(manifest_path).parent / MANIFEST_VALIDATION_STATE
+
+
+def load_manifest(path: Path, state_path: Optional[Path] = None) -> Dict[str, Any]:
+    # Without state_path the manifest is validated in full and nothing is
+    # written. With one, an unchanged manifest (same bytes, same schema) is not
+    # revalidated, and after an edit only the sources/reliefs whose content
+    # changed are.
+    path = Path(path)
+    raw = path.read_bytes()
+    manifest = json.loads(raw)
+    schema_digest, validators = schema_validators()
+    if state_path is None:
+        _raise_errors(validators.errors(manifest, set())[0])
+        return manifest
+    manifest_digest = hashlib.sha256(raw).hexdigest()
+    state = _load_validation_state(state_path)
+    if state.get("schema") != schema_digest:
+        state = {}
+    if state.get("manifest") == manifest_digest:
+        return manifest
+    errors, valid = validators.errors(manifest, set(state.get("sections", [])))
+    _raise_errors(errors)
+    try:
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = state_path.with_name(state_path.name + ".tmp")
+        payload = {
+            "version": VALIDATION_STATE_VERSION,
+            "schema": schema_digest,
+            "manifest": manifest_digest,
+            "sections": sorted(valid),
+        }
+        tmp_path.write_text(json.dumps(payload, indent=0) + "\n", encoding="utf-8")
+        tmp_path.replace(state_path)
+    except OSError:
+        pass  # a read-only checkout just validates every time
+    return manifest
+
+
+def validate_manifest(manifest: Dict[str, Any]) -> None:
+    _schema_digest, validators = schema_validators()
+    _raise_errors(validators.errors(manifest, set())[0])
@@ -1,7 +1,10 @@
 import json
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List
+
+if TYPE_CHECKING:
+    from pyramid_audit.sqlite_store import SqliteLedger
 
 
 def load_entries(path: Path) -> List[Dict[str, Any]]:
@@ -35,9 +38,8 @@ def append_entry(
     confidence: float | None = None,
     tags: List[str] | None = None,
     journal_path: Path | None = None,
+    store: "SqliteLedger | None" = None,
 ) -> None:
-    path = journal_path or Path("journal/entries.jsonl")
-    path.parent.mkdir(parents=True, exist_ok=True)
     entry = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "type": entry_type,
@@ -47,5 +49,10 @@ def append_entry(
         "confidence": confidence,
         "tags": tags or [],
     }
+    path = journal_path or Path("journal/entries.jsonl")
+    path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("a", encoding="utf-8") as handle:
         handle.write(json.dumps(entry, ensure_ascii=True) + "\n")
+    if store is not None:
+        # mirrored, not moved: the JSONL journal stays authoritative
+        store.append_journal(entry)
@@ -1,21 +1,23 @@
 import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
+
+from pyramid_audit.observations import iter_observations, save_observations
+from pyramid_audit.vocabulary import Vocabulary
 
 
 def build_observations(manifest: Dict[str, Any], output_path: Path) -> None:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    save_observations(output_path, merge_observations(manifest, iter_observations(output_path)))
+
+
+def merge_observations(manifest: Dict[str, Any], records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # one record per manifest line in manifest order: existing records are kept
+    # (with the line's current evidence ids), missing lines get an empty one
     existing: Dict[str, Dict[str, Any]] = {}
-    if output_path.exists():
-        with output_path.open("r", encoding="utf-8") as handle:
-            for line in handle:
-                line = line.strip()
-                if not line:
-                    continue
-                record = json.loads(line)
-                existing[record.get("line_id")] = record
+    for record in records:
+        existing[record.get("line_id")] = record
 
-    records: List[Dict[str, Any]] = []
+    merged: List[Dict[str, Any]] = []
     for relief in manifest.get("corpus", []):
         for line in relief.get("lines", []):
             line_id = line["line_id"]
@@ -36,14 +38,11 @@ def build_observations(manifest: Dict[str, Any], output_path: Path) -> None:
                     "observed_only": True,
                     "notes": "No manual sign annotation yet; observations intentionally empty.",
                 }
-            records.append(record)
-
-    with output_path.open("w", encoding="utf-8") as handle:
-        for record in records:
-            handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+            merged.append(record)
+    return merged
 
 
-def build_prior_readings(manifest: Dict[str, Any], output_path: Path) -> None:
+def build_prior_readings(manifest: Dict[str, Any], output_path: Path, vocabulary: Optional[Vocabulary] = None) -> None:
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with output_path.open("w", encoding="utf-8") as handle:
         for relief in manifest.get("corpus", []):
@@ -61,6 +60,11 @@ def build_prior_readings(manifest: Dict[str, Any], output_path: Path) -> None:
                             "text": reading.get("text", ""),
                             "notes": reading.get("notes", ""),
                         }
+                        tokens = reading.get("tokens")
+                        if tokens:
+                            record["tokens"] = tokens
+                            if vocabulary is not None:
+                                record["token_ids"] = vocabulary.encode(tokens).tolist()
                         handle.write(json.dumps(record, ensure_ascii=True) + "\n")
                 else:
                     record = {
@@ -1,33 +1,326 @@
+import hashlib
 import json
+import os
+import uuid
+import warnings
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from pyramid_audit.build_state import file_fingerprint
+from pyramid_audit.sign_table import AUTO_PREFIX, SignTable
+from pyramid_audit.spatial_index import apply_supersessions, pending_supersessions
 
-def load_observations(path: Path) -> List[Dict[str, Any]]:
+if TYPE_CHECKING:
+    from pyramid_audit.sqlite_store import SqliteLedger
+
+# Single-sign edits are appended to <ledger>.wal instead of rewriting the ledger;
+# readers replay the log, and it is folded back in once it grows past this size.
+WAL_COMPACT_BYTES = 1024 * 1024
+
+# Each log op carries the log's id and its position in it; a record stores the
+# last (log id, seq) folded into it under this key, so replaying a log that
+# outlived a rewrite of the ledger (a crash before the log was removed) skips
+# the ops the ledger already contains.
+APPLIED_KEY = "wal_applied"
+
+# ledger path -> (ledger_fingerprint, records_digest) of its last digest
+_DIGESTS: Dict[Path, Tuple[List[Any], str]] = {}
+
+# Compact ledgers store each line's observed_signs as a columnar SignTable
+# encoding under this key; readers expand it back to the schema form.
+PACKED_SIGNS_KEY = "observed_signs_packed"
+
+
+def wal_path(path: Path) -> Path:
+    return path.with_name(path.name + ".wal")
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx")
+
+
+def ledger_fingerprint(path: Path) -> List[Any]:
+    return [file_fingerprint(path), file_fingerprint(wal_path(path))]
+
+
+def _fsync_dir(path: Path) -> None:
+    # makes a rename or unlink in this directory durable (not possible on Windows)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_wal(path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    ops: Dict[str, List[Dict[str, Any]]] = {}
+    log_path = wal_path(path)
+    if not log_path.exists():
+        return ops
+    with log_path.open("r", encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                op = json.loads(line)
+            except ValueError:
+                # a torn write from an interrupted append; the ops around it are intact
+                warnings.warn(f"{log_path}:{number}: skipping unreadable log line")
+                continue
+            ops.setdefault(op["line_id"], []).append(op)
+    return ops
+
+
+def _wal_position(log_path: Path) -> Tuple[str, int]:
+    # (log id, last seq) for the next append. A torn tail left by an
+    # interrupted append is cut back to the last complete line first.
+    if not log_path.exists():
+        return uuid.uuid4().hex, 0
+    with log_path.open("r+b") as handle:
+        data = handle.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            handle.truncate(end)
+            handle.flush()
+            os.fsync(handle.fileno())
+    for raw in reversed(data[:end].splitlines()):
+        try:
+            op = json.loads(raw)
+        except ValueError:
+            continue
+        if "wal" in op:
+            return op["wal"], op["seq"]
+    return uuid.uuid4().hex, 0
+
+
+def _decode_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    if PACKED_SIGNS_KEY not in record:
+        return record
+    return {
+        ("observed_signs" if key == PACKED_SIGNS_KEY else key): (
+            SignTable.decode(value).to_signs() if key == PACKED_SIGNS_KEY else value
+        )
+        for key, value in record.items()
+    }
+
+
+def _encode_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    if "observed_signs" not in record:
+        return record
+    return {
+        (PACKED_SIGNS_KEY if key == "observed_signs" else key): (
+            SignTable.from_signs(value).encode() if key == "observed_signs" else value
+        )
+        for key, value in record.items()
+    }
+
+
+def is_packed(path: Path) -> bool:
     if not path.exists():
-        return []
-    records: List[Dict[str, Any]] = []
+        return False
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                return PACKED_SIGNS_KEY in json.loads(line)
+    return False
+
+
+def _apply_ops(record: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    applied = record.get(APPLIED_KEY)
+    for op in ops:
+        if "wal" in op:
+            if applied and applied[0] == op["wal"] and op["seq"] <= applied[1]:
+                continue
+            applied = record[APPLIED_KEY] = [op["wal"], op["seq"]]
+        if op["op"] == "add_sign":
+            record.setdefault("observed_signs", []).append(op["sign"])
+            if op.get("directionality"):
+                record["directionality"] = op["directionality"]
+        elif op["op"] == "supersede":
+            apply_supersessions(record, op["superseded"])
+        else:
+            raise ValueError(f"unsupported observations log op: {op['op']}")
+    return record
+
+
+def iter_observations(path: Path) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    pending = _read_wal(path)
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            record = _decode_record(json.loads(line))
+            ops = pending.get(record.get("line_id"))
+            yield _apply_ops(record, ops) if ops else record
+
+
+def iter_observation_tables(path: Path) -> Iterator[Tuple[Dict[str, Any], SignTable]]:
+    # (record without observed_signs, SignTable) pairs; packed ledgers decode
+    # straight into arrays without materialising a dict per sign
+    if not path.exists():
+        return
+    pending = _read_wal(path)
     with path.open("r", encoding="utf-8") as handle:
         for line in handle:
             line = line.strip()
             if not line:
                 continue
-            records.append(json.loads(line))
-    return records
+            record = json.loads(line)
+            ops = pending.get(record.get("line_id"))
+            if ops or PACKED_SIGNS_KEY not in record:
+                record = _apply_ops(_decode_record(record), ops or [])
+                table = SignTable.from_signs(record.pop("observed_signs", []))
+            else:
+                table = SignTable.decode(record.pop(PACKED_SIGNS_KEY))
+            yield record, table
+
 
+def load_observations(path: Path) -> List[Dict[str, Any]]:
+    return list(iter_observations(path))
+
+
+def records_digest(records: Iterable[Dict[str, Any]]) -> str:
+    # content digest of a ledger's records, whichever encoding they were
+    # stored in and whether or not they are still in memory
+    sha = hashlib.sha256()
+    for record in records:
+        sha.update(json.dumps(record, sort_keys=True, ensure_ascii=True).encode("utf-8"))
+        sha.update(b"\n")
+    return sha.hexdigest()
 
-def save_observations(path: Path, records: List[Dict[str, Any]]) -> None:
+
+def ledger_digest(path: Path) -> str:
+    # records_digest of the ledger on disk, log included; re-read only when
+    # the ledger or its log changed
+    fingerprint = ledger_fingerprint(path)
+    cached = _DIGESTS.get(path)
+    if cached is None or cached[0] != fingerprint:
+        cached = _DIGESTS[path] = (fingerprint, records_digest(iter_observations(path)))
+    return cached[1]
+
+
+def _write_records(path: Path, records, packed: bool = False) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
         for record in records:
+            if packed:
+                record = _encode_record(record)
             handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+    # a crash before the log is gone is harmless: the rewritten records carry
+    # the log position they include, and replay skips those ops
+    wal_path(path).unlink(missing_ok=True)
+    index_path(path).unlink(missing_ok=True)
+    _fsync_dir(path.parent)
 
 
-def _ensure_line_record(records: List[Dict[str, Any]], line_id: str) -> Dict[str, Any]:
-    for record in records:
-        if record.get("line_id") == line_id:
-            return record
-    raise ValueError(f"line_id not found in observations: {line_id}")
+def save_observations(path: Path, records: List[Dict[str, Any]], packed: Optional[bool] = None) -> None:
+    # packed=None keeps whichever encoding the ledger already uses
+    if packed is None:
+        packed = is_packed(path)
+    _write_records(path, records, packed)
+
+
+class ObservationStore:
+    def __init__(self, path: Path, compact_bytes: int = WAL_COMPACT_BYTES) -> None:
+        self.path = Path(path)
+        self.compact_bytes = compact_bytes
+        self._offsets: Optional[Dict[str, int]] = None
+
+    def _scan_offsets(self) -> Dict[str, int]:
+        offsets: Dict[str, int] = {}
+        if not self.path.exists():
+            return offsets
+        with self.path.open("rb") as handle:
+            offset = 0
+            for raw in handle:
+                if raw.strip():
+                    offsets[json.loads(raw)["line_id"]] = offset
+                offset += len(raw)
+        return offsets
+
+    @property
+    def offsets(self) -> Dict[str, int]:
+        # line_id -> byte offset, persisted next to the ledger and keyed to its fingerprint
+        if self._offsets is None:
+            fingerprint = file_fingerprint(self.path)
+            sidecar = index_path(self.path)
+            if sidecar.exists():
+                try:
+                    cached = json.loads(sidecar.read_text(encoding="utf-8"))
+                except ValueError:
+                    cached = {}
+                if cached.get("fingerprint") == fingerprint:
+                    self._offsets = cached["offsets"]
+            if self._offsets is None:
+                self._offsets = self._scan_offsets()
+                if fingerprint is not None:
+                    sidecar.write_text(
+                        json.dumps({"fingerprint": fingerprint, "offsets": self._offsets}), encoding="utf-8"
+                    )
+        return self._offsets
+
+    def __contains__(self, line_id: str) -> bool:
+        return line_id in self.offsets
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter_observations(self.path)
+
+    def get(self, line_id: str) -> Dict[str, Any]:
+        offset = self.offsets.get(line_id)
+        if offset is None:
+            raise ValueError(f"line_id not found in observations: {line_id}")
+        with self.path.open("rb") as handle:
+            handle.seek(offset)
+            record = _decode_record(json.loads(handle.readline()))
+        return _apply_ops(record, _read_wal(self.path).get(line_id, []))
+
+    def append_sign(
+        self,
+        line_id: str,
+        sign_entry: Dict[str, Any],
+        directionality: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if line_id not in self:
+            raise ValueError(f"line_id not found in observations: {line_id}")
+        op: Dict[str, Any] = {"op": "add_sign", "line_id": line_id, "sign": sign_entry}
+        if directionality:
+            op["directionality"] = directionality
+        self._append_op(op)
+
+    def mark_superseded(self, line_id: str, superseded: Dict[str, str]) -> None:
+        if superseded:
+            self._append_op({"op": "supersede", "line_id": line_id, "superseded": superseded})
+
+    def _append_op(self, op: Dict[str, Any]) -> None:
+        log_path = wal_path(self.path)
+        log_id, seq = _wal_position(log_path)
+        op = dict(op, wal=log_id, seq=seq + 1)
+        with log_path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(op, ensure_ascii=True) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        if log_path.stat().st_size > self.compact_bytes:
+            self.compact()
+
+    def compact(self) -> None:
+        if not wal_path(self.path).exists():
+            return
+        _write_records(self.path, iter_observations(self.path), is_packed(self.path))
+        self._offsets = None
 
 
 def add_sign_observation(
@@ -40,21 +333,31 @@ def add_sign_observation(
     direction: Optional[str] = None,
     direction_basis: Optional[str] = None,
     direction_confidence: Optional[float] = None,
+    store: Optional["SqliteLedger"] = None,
+    evidence_id: Optional[str] = None,
 ) -> None:
-    records = load_observations(path)
-    record = _ensure_line_record(records, line_id)
     sign_entry: Dict[str, Any] = {"sign_id": sign_id, "description": description}
+    if evidence_id:
+        # read from a secondary witness rather than the line's own evidence image
+        sign_entry["evidence_id"] = evidence_id
     if bbox:
         sign_entry["bbox"] = bbox
     if confidence is not None:
         sign_entry["confidence"] = confidence
-    record.setdefault("observed_signs", []).append(sign_entry)
 
+    directionality = None
     if direction:
-        record["directionality"] = {
+        directionality = {
             "value": direction,
             "basis": direction_basis or "manual",
             "confidence": direction_confidence if direction_confidence is not None else 0.5,
         }
 
-    save_observations(path, records)
+    # the JSONL ledger is authoritative; a SQLite store gets a copy of the updated record
+    ledger = ObservationStore(path)
+    ledger.append_sign(line_id, sign_entry, directionality)
+    if bbox and not evidence_id and not sign_id.startswith(AUTO_PREFIX):
+        # auto clusters under the new manual bbox are marked superseded_by it
+        ledger.mark_superseded(line_id, pending_supersessions(ledger.get(line_id)))
+    if store is not None:
+        store.put_observation(ledger.get(line_id))
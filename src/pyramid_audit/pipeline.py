@@ -0,0 +1,231 @@
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyramid_audit.analysis import build_discrepancies, build_reconstructions
+from pyramid_audit.build_state import BUILD_STATE_NAME, BuildState, digest, file_digest, file_fingerprint
+from pyramid_audit.corpus import CorpusView
+from pyramid_audit.download_cache import DownloadCache
+from pyramid_audit.evidence import PageRasterCache, build_evidence
+from pyramid_audit.index import build_corpus_index
+from pyramid_audit.ingest import load_manifest, validation_state_path
+from pyramid_audit.ledger import build_observations, build_prior_readings, merge_observations
+from pyramid_audit.observations import (
+    ObservationStore,
+    ledger_digest,
+    load_observations,
+    records_digest,
+    save_observations,
+    wal_path,
+)
+from pyramid_audit.report import (
+    DEFAULT_JOURNAL_PATH,
+    DEFAULT_OBSERVATIONS_PATH,
+    DEFAULT_PRIOR_READINGS_PATH,
+    build_report,
+)
+from pyramid_audit.variants import DEFAULT_VARIANTS_PATH, build_variants
+from pyramid_audit.vocabulary import DEFAULT_VOCABULARY_PATH, Vocabulary, update_vocabulary
+
+
+# State shared by the stages of one run-all: the manifest is parsed and
+# validated once, and the observations ledger is loaded once and kept in
+# memory. Stages update the records in place and call mark_changed(); the
+# ledger is written once, atomically, by flush() (on leaving the with-block
+# without an error), and not at all if the records still match the file.
+class PipelineContext:
+    def __init__(
+        self,
+        manifest_path: Path,
+        ledger_path: Path = DEFAULT_OBSERVATIONS_PATH,
+        output_root: Path = Path("."),
+        journal_path: Path = DEFAULT_JOURNAL_PATH,
+        prior_readings_path: Path = DEFAULT_PRIOR_READINGS_PATH,
+    ) -> None:
+        self.manifest_path = manifest_path
+        self.ledger_path = ledger_path
+        self.output_root = output_root
+        self.journal_path = journal_path
+        self.prior_readings_path = prior_readings_path
+        self.revision = 0
+        self._flushed = 0
+        self._by_line: Optional[Tuple[int, Dict[str, Dict[str, Any]]]] = None
+        self._key: Optional[Tuple[int, str]] = None
+        self._saved_key: Optional[str] = None
+
+    def __enter__(self) -> "PipelineContext":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+
+    @cached_property
+    def manifest(self) -> Dict[str, Any]:
+        return load_manifest(self.manifest_path, validation_state_path(self.manifest_path))
+
+    @cached_property
+    def corpus(self) -> CorpusView:
+        return CorpusView(
+            self.manifest,
+            journal_path=self.journal_path,
+            observations_path=self.ledger_path,
+            prior_readings_path=self.prior_readings_path,
+            observation_lookup=self.observation,
+        )
+
+    @cached_property
+    def observations(self) -> List[Dict[str, Any]]:
+        records = load_observations(self.ledger_path)
+        self._saved_key = records_digest(records)
+        return records
+
+    def mark_changed(self) -> None:
+        self.revision += 1
+
+    def replace_observations(self, records: List[Dict[str, Any]]) -> None:
+        if records == self.observations:
+            return
+        self.observations[:] = records
+        self.mark_changed()
+
+    def observation(self, line_id: str) -> Optional[Dict[str, Any]]:
+        if self._by_line is None or self._by_line[0] != self.revision:
+            self._by_line = (self.revision, {record["line_id"]: record for record in self.observations})
+        return self._by_line[1].get(line_id)
+
+    def observations_key(self) -> str:
+        # the in-memory ledger's records_digest: the key a standalone build
+        # gets from ledger_digest once these records are on disk
+        if self._key is None or self._key[0] != self.revision:
+            self._key = (self.revision, records_digest(self.observations))
+        return self._key[1]
+
+    def flush(self) -> bool:
+        # a pending observe log is folded into the ledger even when the
+        # records themselves did not change
+        pending_log = wal_path(self.ledger_path).exists()
+        if self.revision == self._flushed and not pending_log:
+            return False
+        key = self.observations_key()
+        self._flushed = self.revision
+        if key == self._saved_key and not pending_log:
+            return False
+        save_observations(self.ledger_path, self.observations)
+        self._saved_key = key
+        return True
+
+
+def run_build(
+    manifest_path: Path,
+    force: bool = False,
+    downloads: Optional[DownloadCache] = None,
+    raster_cache: Optional[PageRasterCache] = None,
+    render_workers: int = 1,
+    context: Optional[PipelineContext] = None,
+) -> None:
+    # The stage list behind both scripts/build.py and `cli.py build`/`run-all`.
+    # Under a pipeline context the observations stay in memory (the context
+    # writes the ledger once at the end) and the report is left to run-all.
+    root = Path.cwd()
+    if context is not None:
+        manifest = context.manifest
+    else:
+        manifest = load_manifest(manifest_path, validation_state_path(manifest_path))
+    state_path = root / BUILD_STATE_NAME
+    state = BuildState(state_path) if force else BuildState.load(state_path)
+    build_evidence(manifest, root, state, downloads, raster_cache, workers=render_workers)
+    state.save()
+    manifest_key = file_digest(Path(manifest_path))
+    index_path = root / "corpus_index.csv"
+    observations_path = context.ledger_path if context is not None else root / "ledger" / "observations.jsonl"
+    prior_readings_path = root / "ledger" / "prior_readings.jsonl"
+    reconstructions_path = root / "analysis" / "reconstructions.jsonl"
+    discrepancies_path = root / "analysis" / "discrepancies.jsonl"
+    variants_path = root / DEFAULT_VARIANTS_PATH
+    vocabulary_path = root / DEFAULT_VOCABULARY_PATH
+    report_path = root / "REPORT.md"
+    # shared by the index, analysis and report stages; ledgers are read lazily
+    # and re-read only after a stage rewrites them
+    if context is not None:
+        corpus = context.corpus
+        records = context.observations
+    else:
+        corpus = CorpusView(
+            manifest,
+            journal_path=root / "journal" / "entries.jsonl",
+            observations_path=observations_path,
+            prior_readings_path=prior_readings_path,
+        )
+        records = None
+
+    def observations_key() -> str:
+        # the same content digest in both modes, so run-all and build share stage keys
+        return context.observations_key() if context is not None else ledger_digest(observations_path)
+
+    def build_observations_stage() -> None:
+        if context is not None:
+            context.replace_observations(merge_observations(manifest, context.observations))
+        else:
+            build_observations(manifest, observations_path)
+
+    state.run_stage(
+        "corpus_index",
+        lambda: digest(manifest_key),
+        lambda: build_corpus_index(corpus, index_path),
+        [index_path],
+    )
+    if context is None:
+        # fold signs logged by observe into the ledger file the build publishes
+        ObservationStore(observations_path).compact()
+    state.run_stage(
+        "observations",
+        lambda: digest(manifest_key, observations_key()),
+        build_observations_stage,
+        [observations_path],
+    )
+    state.run_stage(
+        "vocabulary",
+        lambda: digest(manifest_key, observations_key(), file_fingerprint(vocabulary_path)),
+        lambda: update_vocabulary(vocabulary_path, manifest, observations_path, records=records),
+        [vocabulary_path],
+    )
+    # the stages below encode tokens with the (append-only) vocabulary written above
+    vocabulary_key = file_fingerprint(vocabulary_path)
+    state.run_stage(
+        "prior_readings",
+        lambda: digest(manifest_key, vocabulary_key),
+        lambda: build_prior_readings(manifest, prior_readings_path, Vocabulary.load(vocabulary_path)),
+        [prior_readings_path],
+    )
+    state.run_stage(
+        "reconstructions",
+        lambda: digest(manifest_key, observations_key(), vocabulary_key),
+        lambda: build_reconstructions(corpus, reconstructions_path, vocabulary=Vocabulary.load(vocabulary_path)),
+        [reconstructions_path],
+    )
+    state.run_stage(
+        "discrepancies",
+        lambda: digest(manifest_key, observations_key(), vocabulary_key),
+        lambda: build_discrepancies(corpus, discrepancies_path, vocabulary=Vocabulary.load(vocabulary_path)),
+        [discrepancies_path],
+    )
+    state.run_stage(
+        "variants",
+        lambda: digest(manifest_key, observations_key(), vocabulary_key),
+        lambda: build_variants(corpus, variants_path, None, Vocabulary.load(vocabulary_path)),
+        [variants_path],
+    )
+    if context is not None:
+        return
+    state.run_stage(
+        "report",
+        lambda: digest(
+            manifest_key,
+            file_fingerprint(root / "journal" / "entries.jsonl"),
+            ledger_digest(observations_path),
+            file_fingerprint(prior_readings_path),
+        ),
+        lambda: build_report(corpus, report_path),
+        [report_path],
+    )
@@ -0,0 +1,169 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from pyramid_audit.alignment import align_ids
+from pyramid_audit.vocabulary import Vocabulary, reading_tokens, reading_transliteration
+
+MAX_NGRAM = 3
+CANDIDATES_PER_LINE = 5
+# readings shortlisted from the n-gram index per line before alignment ranks them
+SHORTLIST = 20
+
+
+def _ngram_keys(seq: np.ndarray, n: int, base: int) -> Tuple[np.ndarray, np.ndarray]:
+    # packed keys for every n-token window of seq (ids offset by one, 0 separates
+    # readings), plus a mask of windows that do not cross a separator. When
+    # base**n does not fit an int64 the keys are the n ids themselves, as one
+    # fixed-width bytes value per window; they sort and compare the same way.
+    count = max(len(seq) - n + 1, 0)
+    wide = base**n >= 2**63
+    valid = np.ones(count, dtype=bool)
+    for k in range(n):
+        valid &= seq[k : k + count] != 0
+    if wide:
+        windows = np.stack([seq[k : k + count] for k in range(n)], axis=1).astype(">i8")
+        return np.ascontiguousarray(windows).view(np.dtype((np.void, 8 * n))).reshape(count), valid
+    keys = np.zeros(count, dtype=np.int64)
+    for k in range(n):
+        keys = keys * base + seq[k : k + count]
+    return keys, valid
+
+
+# Sorted n-gram table over every reading's token ids (a suffix array truncated
+# to MAX_NGRAM tokens, deduplicated to one posting per (n-gram, reading)): each
+# query n-gram is a binary search, so lookups cost the postings they hit rather
+# than a scan over the readings.
+class NgramIndex:
+    def __init__(self, sequences: Sequence[np.ndarray], max_n: int = MAX_NGRAM) -> None:
+        self.max_n = max_n
+        self.count = len(sequences)
+        lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+        corpus = np.zeros(int(lengths.sum()) + len(sequences), dtype=np.int64)
+        doc = np.repeat(np.arange(len(sequences)), lengths + 1)
+        offset = 0
+        for seq in sequences:
+            corpus[offset : offset + len(seq)] = np.asarray(seq, dtype=np.int64) + 1
+            offset += len(seq) + 1
+        self.base = int(corpus.max(initial=0)) + 1
+        # per n: distinct n-gram keys, the [start, end) of each one's postings,
+        # and the reading of every posting
+        self.keys: Dict[int, np.ndarray] = {}
+        self.starts: Dict[int, np.ndarray] = {}
+        self.ends: Dict[int, np.ndarray] = {}
+        self.docs: Dict[int, np.ndarray] = {}
+        for n in range(1, max_n + 1):
+            keys, valid = _ngram_keys(corpus, n, self.base)
+            positions = np.flatnonzero(valid)
+            keys, docs = keys[positions], doc[positions]
+            if keys.dtype == np.int64 and self.base**n * max(self.count, 1) < 2**63:
+                # (key, reading) packed into one int64, deduplicated by one sort
+                postings = np.unique(keys * max(self.count, 1) + docs)
+                keys, docs = postings // max(self.count, 1), postings % max(self.count, 1)
+            else:
+                order = np.lexsort((docs, keys))
+                keys, docs = keys[order], docs[order]
+                first = np.ones(len(keys), dtype=bool)
+                first[1:] = (keys[1:] != keys[:-1]) | (docs[1:] != docs[:-1])
+                keys, docs = keys[first], docs[first]
+            self.keys[n], self.starts[n] = np.unique(keys, return_index=True)
+            self.ends[n] = np.append(self.starts[n][1:], len(keys))
+            self.docs[n] = docs
+
+    def query(self, ids: np.ndarray, limit: int = SHORTLIST) -> List[Tuple[int, float]]:
+        # (reading index, score) best first; longer and rarer shared n-grams weigh more
+        seq = np.asarray(ids, dtype=np.int64) + 1
+        # tokens the index has never seen cannot match; 0 also breaks windows across them
+        seq[seq >= self.base] = 0
+        docs: List[np.ndarray] = []
+        weights: List[np.ndarray] = []
+        for n in range(1, min(self.max_n, len(seq)) + 1):
+            if not len(self.keys[n]):
+                continue  # no reading has an n-gram this long
+            keys, valid = _ngram_keys(seq, n, self.base)
+            wanted = np.unique(keys[valid])
+            slot = np.searchsorted(self.keys[n], wanted)
+            slot = slot[(slot < len(self.keys[n])) & (self.keys[n][np.minimum(slot, len(self.keys[n]) - 1)] == wanted)]
+            if not len(slot):
+                continue
+            lo = self.starts[n][slot]
+            hi = self.ends[n][slot]
+            df = hi - lo
+            # gather every posting of the matched n-grams without a Python loop
+            offsets = np.repeat(lo - np.cumsum(df) + df, df) + np.arange(int(df.sum()))
+            docs.append(self.docs[n][offsets])
+            weights.append(np.repeat(n * np.log1p(self.count / df), df))
+        if not docs:
+            return []
+        hit, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        order = np.lexsort((hit, -scores))[:limit]
+        return list(zip(hit[order].tolist(), scores[order].tolist()))
+
+
+def prior_reading_pool(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # every prior reading in the corpus with tokens to index, once per reading_id
+    seen = set()
+    pool: List[Dict[str, Any]] = []
+    for relief in manifest.get("corpus", []):
+        for line in relief.get("lines", []):
+            for reading in line.get("prior_readings", []):
+                key = reading.get("reading_id") or id(reading)
+                if key in seen or not reading_tokens(reading):
+                    continue
+                seen.add(key)
+                pool.append(reading)
+    return pool
+
+
+def generate_candidates(
+    lines: Sequence[Tuple[str, List[str]]],
+    readings: Sequence[Dict[str, Any]],
+    vocabulary: Vocabulary,
+) -> Dict[str, Dict[str, Any]]:
+    # For each (line_id, observed tokens): shortlist readings from the n-gram
+    # index, align the observed signs against the best-matching span of each
+    # (one batched infix alignment for all lines), and rank by distance.
+    sequences = [vocabulary.encode(reading_tokens(reading)) for reading in readings]
+    index = NgramIndex(sequences)
+    observed = {line_id: vocabulary.encode(tokens) for line_id, tokens in lines if tokens}
+    shortlist = {line_id: index.query(ids) for line_id, ids in observed.items()}
+    pairs = [(line_id, doc, score) for line_id, hits in shortlist.items() for doc, score in hits]
+    # distances for the whole shortlist; tracebacks only for the kept candidates
+    distances = align_ids(
+        [observed[line_id] for line_id, _doc, _score in pairs],
+        [sequences[doc] for _line_id, doc, _score in pairs],
+        with_alignment=False,
+        infix=True,
+    )
+    ranked: Dict[str, List[Tuple[float, float, int]]] = {line_id: [] for line_id in observed}
+    for (line_id, doc, score), (distance, _alignment) in zip(pairs, distances):
+        ranked[line_id].append((distance / len(observed[line_id]), -score, doc))
+    top = {line_id: sorted(entries)[:CANDIDATES_PER_LINE] for line_id, entries in ranked.items()}
+    kept = [(line_id, doc) for line_id, entries in top.items() for _cost, _score, doc in entries]
+    aligned = align_ids([observed[line_id] for line_id, _doc in kept], [sequences[doc] for _line_id, doc in kept], infix=True)
+    alignments = {key: alignment or [] for key, (_distance, alignment) in zip(kept, aligned)}
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for line_id, entries in top.items():
+        candidates: List[str] = []
+        transliterations: List[str] = []
+        parses: List[str] = []
+        for _cost, _score, doc in entries:
+            reading = readings[doc]
+            candidates.append(reading.get("reading_id") or f"reading-{doc}")
+            transliteration = reading_transliteration(reading)
+            if transliteration and transliteration not in transliterations:
+                transliterations.append(transliteration)
+            # the span of the reading the observed signs aligned to
+            alignment = alignments[(line_id, doc)]
+            parse = " ".join(vocabulary.tokens[prior] for _op, _obs, prior in alignment if prior is not None)
+            if parse and parse not in parses:
+                parses.append(parse)
+        results[line_id] = {
+            "candidates": candidates,
+            "transliteration_candidates": transliterations,
+            "parse_candidates": parses,
+            "confidence": round(max(0.0, 1.0 - entries[0][0]), 4) if entries else 0.0,
+        }
+    return results
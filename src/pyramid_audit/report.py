@@ -1,129 +1,268 @@
 import json
+import os
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Union
 
-from pyramid_audit.journal import group_entries_by_line, load_entries
-from pyramid_audit.observations import load_observations
+from pyramid_audit.build_state import digest
+from pyramid_audit.corpus import CorpusView, LineView
 
+if TYPE_CHECKING:
+    from pyramid_audit.sqlite_store import SqliteLedger
 
-def load_prior_readings(path: Path) -> Dict[str, List[Dict[str, Any]]]:
-    readings: Dict[str, List[Dict[str, Any]]] = {}
+DEFAULT_JOURNAL_PATH = Path("journal") / "entries.jsonl"
+DEFAULT_OBSERVATIONS_PATH = Path("ledger") / "observations.jsonl"
+DEFAULT_PRIOR_READINGS_PATH = Path("ledger") / "prior_readings.jsonl"
+DEFAULT_REPORT_DIR = Path("report")
+# per-shard input digests, kept next to the shards
+SHARD_STATE_NAME = ".shards.json"
+SHARD_STATE_VERSION = 1
+
+Corpus = Union[Dict[str, Any], CorpusView]
+
+
+def report_corpus(
+    corpus: Corpus,
+    store: Optional["SqliteLedger"] = None,
+    journal_path: Optional[Path] = None,
+    observations_path: Optional[Path] = None,
+    prior_readings_path: Optional[Path] = None,
+) -> CorpusView:
+    # a bare manifest reads the default ledgers unless told otherwise; a view
+    # brings its own, and CorpusView.wrap rejects paths passed alongside it
+    if not isinstance(corpus, CorpusView):
+        journal_path = journal_path or DEFAULT_JOURNAL_PATH
+        observations_path = observations_path or DEFAULT_OBSERVATIONS_PATH
+        prior_readings_path = prior_readings_path or DEFAULT_PRIOR_READINGS_PATH
+    return CorpusView.wrap(
+        corpus,
+        journal_path=journal_path,
+        observations_path=observations_path,
+        prior_readings_path=prior_readings_path,
+        store=store,
+    )
+
+
+def _link(path: str, base: str) -> str:
+    # evidence paths are repo-relative; shards link to them from their own directory
+    return f"{base}/{path}" if base else path
+
+
+def _header_lines(title: str) -> Iterator[str]:
+    yield f"# {title}"
+    yield ""
+    yield "## Scope"
+    yield ""
+    yield "Representative case from local source manifest. Observations and reconstructions are intentionally empty until manual annotation is provided."
+    yield ""
+
+
+def _line_lines(view: LineView, heading: str, base: str) -> Iterator[str]:
+    line = view.line
+    yield f"{heading} Line: {line['label']}"
+    yield ""
+    if line.get("notes"):
+        yield line["notes"]
+        yield ""
+    for image_path in view.image_paths:
+        yield f"![evidence]({_link(image_path, base)})"
+        yield ""
+    if view.secondary_image_paths:
+        yield "**Secondary evidence (uncertain mapping):**"
+        yield ""
+        for image_path in view.secondary_image_paths:
+            yield f"![secondary]({_link(image_path, base)})"
+            yield ""
+    line_entries = view.journal
+    if line_entries:
+        yield "**Journal entries:**"
+        yield ""
+        for entry in line_entries:
+            entry_type = entry.get("type", "entry")
+            text = entry.get("text", "")
+            confidence = entry.get("confidence")
+            tags = entry.get("tags", [])
+            meta = []
+            if confidence is not None:
+                meta.append(f"confidence {confidence}")
+            if tags:
+                meta.append("tags: " + ", ".join(tags))
+            meta_text = f" ({'; '.join(meta)})" if meta else ""
+            yield f"- {entry_type}: {text}{meta_text}"
+        yield ""
+    status = view.observation_status
+    if status["status"] != "none":
+        auto_count = status["auto"]
+        manual_count = status["manual"]
+        crop_paths = status["crop_paths"]
+        superseded = status["superseded"]
+        if manual_count > 0:
+            superseded_text = f" ({superseded} superseded by manual bboxes)" if superseded else ""
+            yield f"**Observation status:** Manual observations {manual_count}; auto clusters {auto_count}{superseded_text}."
+        else:
+            yield f"**Observation status:** Auto-annotated clusters {auto_count} (manual review required)."
+        contact_sheet = status["contact_sheet"]
+        if contact_sheet:
+            yield ""
+            yield "**Cluster contact sheet:**"
+            yield ""
+            yield f"![cluster-sheet]({_link(contact_sheet, base)})"
+            yield ""
+        elif crop_paths:
+            yield ""
+            yield "**Cluster crops (sample):**"
+            yield ""
+            for crop_path in crop_paths[:6]:
+                yield f"![cluster]({_link(crop_path, base)})"
+            yield ""
+    else:
+        yield "**Observation status:** No sign annotations recorded."
+    yield ""
+    line_readings = view.prior_readings
+    if line_readings:
+        yield "**Prior readings:**"
+        yield ""
+        for reading in line_readings:
+            reading_type = reading.get("reading_type", "reading")
+            source_id = reading.get("source_id") or "unknown_source"
+            source_item_id = reading.get("source_item_id") or "unknown_item"
+            page = reading.get("page")
+            text = reading.get("text", "")
+            notes = reading.get("notes", "")
+            provenance = f"{source_id}/{source_item_id}"
+            if page is not None:
+                provenance += f" p.{page}"
+            yield f"- {reading_type}: {provenance}"
+            if text:
+                yield f"  text: {text}"
+            if notes:
+                yield f"  notes: {notes}"
+        yield ""
+    yield "**Reconstruction status:** No candidate readings generated without observations."
+    yield ""
+    yield "**Discrepancies:** None computed (no observed tokens)."
+    yield ""
+
+
+def _relief_lines(relief: Dict[str, Any], views: Iterable[LineView], level: int, base: str = "") -> Iterator[str]:
+    yield f"{'#' * level} {relief['label']}"
+    yield ""
+    if relief.get("notes"):
+        yield relief["notes"]
+        yield ""
+    for view in views:
+        yield from _line_lines(view, "#" * (level + 1), base)
+
+
+def _write_lines(path: Path, lines: Iterable[str]) -> None:
+    # streamed to a temp file (newline-joined, no trailing newline) and swapped in
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        for idx, line in enumerate(lines):
+            handle.write(f"\n{line}" if idx else line)
+    tmp_path.replace(path)
+
+
+def build_report(
+    corpus: Corpus,
+    output_path: Path,
+    store: Optional["SqliteLedger"] = None,
+    journal_path: Optional[Path] = None,
+    observations_path: Optional[Path] = None,
+    prior_readings_path: Optional[Path] = None,
+) -> None:
+    corpus = report_corpus(corpus, store, journal_path, observations_path, prior_readings_path)
+
+    def lines() -> Iterator[str]:
+        yield from _header_lines("Forensic Egyptology Audit Report")
+        for relief in corpus.reliefs():
+            yield from _relief_lines(relief, corpus.lines(relief), 2)
+
+    _write_lines(output_path, lines())
+
+
+def _shard_name(relief: Dict[str, Any], position: int) -> str:
+    return f"{relief.get('relief_id') or f'relief-{position + 1}'}.md"
+
+
+def _shard_key(relief: Dict[str, Any], views: List[LineView], base: str) -> str:
+    # everything a relief's page is rendered from
+    per_line = [
+        [
+            view.image_paths,
+            view.secondary_image_paths,
+            view.journal,
+            None if view.observation is None else [view.observation[0], view.observation[1].encode()],
+            view.prior_readings,
+        ]
+        for view in views
+    ]
+    return digest(SHARD_STATE_VERSION, base, relief, per_line)
+
+
+def _load_shard_state(path: Path) -> Dict[str, str]:
     if not path.exists():
-        return readings
-    with path.open("r", encoding="utf-8") as handle:
-        for line in handle:
-            line = line.strip()
-            if not line:
-                continue
-            record = json.loads(line)
-            readings.setdefault(record.get("line_id", ""), []).append(record)
-    return readings
-
-
-def build_report(manifest: Dict[str, Any], output_path: Path) -> None:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    lines: List[str] = []
-    journal_entries = group_entries_by_line(load_entries(Path("journal/entries.jsonl")))
-    observations = {rec["line_id"]: rec for rec in load_observations(Path("ledger/observations.jsonl"))}
-    prior_readings = load_prior_readings(Path("ledger/prior_readings.jsonl"))
-    lines.append("# Forensic Egyptology Audit Report")
-    lines.append("")
-    lines.append("## Scope")
-    lines.append("")
-    lines.append("Representative case from local source manifest. Observations and reconstructions are intentionally empty until manual annotation is provided.")
-    lines.append("")
-
-    for relief in manifest.get("corpus", []):
-        lines.append(f"## {relief['label']}")
-        lines.append("")
-        if relief.get("notes"):
-            lines.append(relief["notes"])
-            lines.append("")
-        for line in relief.get("lines", []):
-            lines.append(f"### Line: {line['label']}")
-            lines.append("")
-            if line.get("notes"):
-                lines.append(line["notes"])
-                lines.append("")
-            for image_path in line.get("image_paths", []):
-                lines.append(f"![evidence]({image_path})")
-                lines.append("")
-            if line.get("secondary_image_paths"):
-                lines.append("**Secondary evidence (uncertain mapping):**")
-                lines.append("")
-                for image_path in line.get("secondary_image_paths", []):
-                    lines.append(f"![secondary]({image_path})")
-                    lines.append("")
-            if journal_entries.get(line["line_id"]):
-                lines.append("**Journal entries:**")
-                lines.append("")
-                for entry in journal_entries[line["line_id"]]:
-                    entry_type = entry.get("type", "entry")
-                    text = entry.get("text", "")
-                    confidence = entry.get("confidence")
-                    tags = entry.get("tags", [])
-                    meta = []
-                    if confidence is not None:
-                        meta.append(f"confidence {confidence}")
-                    if tags:
-                        meta.append("tags: " + ", ".join(tags))
-                    meta_text = f" ({'; '.join(meta)})" if meta else ""
-                    lines.append(f"- {entry_type}: {text}{meta_text}")
-                lines.append("")
-            obs_record = observations.get(line["line_id"])
-            if obs_record and obs_record.get("observed_signs"):
-                signs = obs_record["observed_signs"]
-                auto_count = sum(1 for s in signs if str(s.get("sign_id", "")).startswith("auto-"))
-                manual_count = len(signs) - auto_count
-                crop_paths = [s.get("crop_path") for s in signs if s.get("crop_path")]
-                if manual_count > 0:
-                    lines.append(
-                        f"**Observation status:** Manual observations {manual_count}; auto clusters {auto_count}."
-                    )
-                else:
-                    lines.append(
-                        f"**Observation status:** Auto-annotated clusters {auto_count} (manual review required)."
-                    )
-                contact_sheet = obs_record.get("cluster_contact_sheet")
-                if contact_sheet:
-                    lines.append("")
-                    lines.append("**Cluster contact sheet:**")
-                    lines.append("")
-                    lines.append(f"![cluster-sheet]({contact_sheet})")
-                    lines.append("")
-                elif crop_paths:
-                    lines.append("")
-                    lines.append("**Cluster crops (sample):**")
-                    lines.append("")
-                    for crop_path in crop_paths[:6]:
-                        lines.append(f"![cluster]({crop_path})")
-                    lines.append("")
-            else:
-                lines.append("**Observation status:** No sign annotations recorded.")
-            lines.append("")
-            line_readings = prior_readings.get(line["line_id"], [])
-            if line_readings:
-                lines.append("**Prior readings:**")
-                lines.append("")
-                for reading in line_readings:
-                    reading_type = reading.get("reading_type", "reading")
-                    source_id = reading.get("source_id") or "unknown_source"
-                    source_item_id = reading.get("source_item_id") or "unknown_item"
-                    page = reading.get("page")
-                    text = reading.get("text", "")
-                    notes = reading.get("notes", "")
-                    provenance = f"{source_id}/{source_item_id}"
-                    if page is not None:
-                        provenance += f" p.{page}"
-                    lines.append(f"- {reading_type}: {provenance}")
-                    if text:
-                        lines.append(f"  text: {text}")
-                    if notes:
-                        lines.append(f"  notes: {notes}")
-                lines.append("")
-            lines.append("**Reconstruction status:** No candidate readings generated without observations.")
-            lines.append("")
-            lines.append("**Discrepancies:** None computed (no observed tokens).")
-            lines.append("")
-
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    return dict(data.get("shards", {})) if data.get("version") == SHARD_STATE_VERSION else {}
+
+
+def build_report_shards(
+    corpus: Corpus,
+    output_dir: Path = DEFAULT_REPORT_DIR,
+    store: Optional["SqliteLedger"] = None,
+    journal_path: Optional[Path] = None,
+    observations_path: Optional[Path] = None,
+    prior_readings_path: Optional[Path] = None,
+) -> List[str]:
+    # One page per relief plus index.md. A page is re-rendered only when the
+    # digest of its relief's inputs changed (or the file is gone); pages of
+    # reliefs no longer in the manifest are removed. Returns the pages written.
+    corpus = report_corpus(corpus, store, journal_path, observations_path, prior_readings_path)
+    state_path = output_dir / SHARD_STATE_NAME
+    previous = _load_shard_state(state_path)
+    base = Path(os.path.relpath(Path.cwd(), output_dir.resolve())).as_posix()
+    base = "" if base == "." else base
+    shards: Dict[str, str] = {}
+    written: List[str] = []
+    reliefs = corpus.reliefs()
+    for position, relief in enumerate(reliefs):
+        name = _shard_name(relief, position)
+        if name in shards or name == "index.md":
+            raise ValueError(f"relief_id {name[:-3]} is repeated or reserved for the index page")
+        views = list(corpus.lines(relief))
+        shards[name] = _shard_key(relief, views, base)
+        if previous.get(name) == shards[name] and (output_dir / name).exists():
+            continue
+        _write_lines(output_dir / name, chain(["[Index](index.md)", ""], _relief_lines(relief, views, 1, base)))
+        written.append(name)
+
+    index_key = digest([(name, relief["label"], len(relief.get("lines", []))) for name, relief in zip(shards, reliefs)])
+    if previous.get("index.md") != index_key or not (output_dir / "index.md").exists():
+
+        def index_lines() -> Iterator[str]:
+            yield from _header_lines("Forensic Egyptology Audit Report")
+            yield "## Reliefs"
+            yield ""
+            for name, relief in zip(shards, reliefs):
+                yield f"- [{relief['label']}]({name}) ({len(relief.get('lines', []))} lines)"
+            yield ""
+
+        _write_lines(output_dir / "index.md", index_lines())
+        written.append("index.md")
+    shards["index.md"] = index_key
+
+    for name in previous:
+        if name not in shards:
+            (output_dir / name).unlink(missing_ok=True)
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(
+        json.dumps({"version": SHARD_STATE_VERSION, "shards": shards}, indent=2, sort_keys=True) + "\n",
+        encoding="utf-8",
+    )
+    tmp_path.replace(state_path)
+    return written
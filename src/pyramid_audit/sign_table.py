@@ -0,0 +1,243 @@
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+AUTO_PREFIX = "auto-"
+AUTO_DESCRIPTION = "auto-segmented glyph cluster (uninterpreted)"
+AUTO_CONFIDENCE = 0.2
+
+# observed_signs keys held in columns; anything else rides along per row in `extras`
+_COLUMNS = ("sign_id", "description", "bbox", "confidence", "crop_path")
+
+
+def _number(value: float, is_float: bool = False) -> Any:
+    return int(value) if not is_float and value.is_integer() else value
+
+
+def _exact(value: Any) -> bool:
+    # numbers a float64 column holds without changing them
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and float(value) == value
+
+
+# Column-oriented view of a line's observed_signs: bboxes/confidences are float
+# arrays (NaN where absent) and descriptions are interned, so thousands of auto
+# clusters cost a few arrays instead of one dict per sign. The *_is_float masks
+# remember which values were floats, so 20.0 is written back as 20.0, not 20.
+# A bbox or confidence the columns cannot hold (a bbox without four numbers,
+# a non-numeric value) is masked as absent and kept verbatim in extras.
+class SignTable:
+    __slots__ = (
+        "sign_ids",
+        "descriptions",
+        "description_index",
+        "bboxes",
+        "confidences",
+        "crop_paths",
+        "extras",
+        "bbox_is_float",
+        "confidence_is_float",
+    )
+
+    def __init__(
+        self,
+        sign_ids: List[str],
+        descriptions: List[str],
+        description_index: np.ndarray,
+        bboxes: np.ndarray,
+        confidences: np.ndarray,
+        crop_paths: Optional[List[Optional[str]]] = None,
+        extras: Optional[List[Optional[Dict[str, Any]]]] = None,
+        bbox_is_float: Optional[np.ndarray] = None,
+        confidence_is_float: Optional[np.ndarray] = None,
+    ) -> None:
+        count = len(sign_ids)
+        self.sign_ids = sign_ids
+        self.descriptions = descriptions
+        self.description_index = np.asarray(description_index, dtype=np.int32).reshape(count)
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(count, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float64).reshape(count)
+        self.crop_paths = crop_paths if crop_paths is not None else [None] * count
+        self.extras = extras if extras is not None else [None] * count
+        self.bbox_is_float = (
+            np.zeros((count, 4), dtype=bool)
+            if bbox_is_float is None
+            else np.asarray(bbox_is_float, dtype=bool).reshape(count, 4)
+        )
+        self.confidence_is_float = (
+            np.zeros(count, dtype=bool)
+            if confidence_is_float is None
+            else np.asarray(confidence_is_float, dtype=bool).reshape(count)
+        )
+
+    def __len__(self) -> int:
+        return len(self.sign_ids)
+
+    @classmethod
+    def empty(cls) -> "SignTable":
+        return cls([], [], np.zeros(0), np.zeros((0, 4)), np.zeros(0))
+
+    @classmethod
+    def from_boxes(
+        cls,
+        line_id: str,
+        boxes: List[Any],
+        description: str = AUTO_DESCRIPTION,
+        confidence: float = AUTO_CONFIDENCE,
+    ) -> "SignTable":
+        count = len(boxes)
+        return cls(
+            [f"{AUTO_PREFIX}{line_id}-{idx}" for idx in range(1, count + 1)],
+            [description],
+            np.zeros(count),
+            np.asarray(boxes, dtype=np.float64).reshape(count, 4),
+            np.full(count, confidence),
+        )
+
+    @classmethod
+    def from_signs(cls, signs: List[Dict[str, Any]]) -> "SignTable":
+        count = len(signs)
+        interned: Dict[str, int] = {}
+        description_index = np.zeros(count, dtype=np.int32)
+        bboxes = np.full((count, 4), np.nan)
+        confidences = np.full(count, np.nan)
+        bbox_is_float = np.zeros((count, 4), dtype=bool)
+        confidence_is_float = np.zeros(count, dtype=bool)
+        sign_ids: List[str] = []
+        crop_paths: List[Optional[str]] = []
+        extras: List[Optional[Dict[str, Any]]] = []
+        for row, sign in enumerate(signs):
+            sign_ids.append(sign["sign_id"])
+            description_index[row] = interned.setdefault(sign["description"], len(interned))
+            extra = {key: value for key, value in sign.items() if key not in _COLUMNS}
+            bbox = sign.get("bbox")
+            if isinstance(bbox, list) and len(bbox) == 4 and all(_exact(v) for v in bbox):
+                bboxes[row] = bbox
+                bbox_is_float[row] = [isinstance(v, float) for v in bbox]
+            elif bbox is not None:
+                extra["bbox"] = bbox
+            confidence = sign.get("confidence")
+            if _exact(confidence):
+                confidences[row] = confidence
+                confidence_is_float[row] = isinstance(confidence, float)
+            elif confidence is not None:
+                extra["confidence"] = confidence
+            crop_paths.append(sign.get("crop_path"))
+            extras.append(extra or None)
+        return cls(
+            sign_ids,
+            list(interned),
+            description_index,
+            bboxes,
+            confidences,
+            crop_paths,
+            extras,
+            bbox_is_float,
+            confidence_is_float,
+        )
+
+    def has_bbox(self) -> np.ndarray:
+        return ~np.isnan(self.bboxes).any(axis=1)
+
+    def on_primary(self) -> np.ndarray:
+        # signs read from the line's first evidence image; observations of a
+        # secondary witness carry that witness's evidence_id
+        return np.fromiter(
+            (not (extra and extra.get("evidence_id")) for extra in self.extras), dtype=bool, count=len(self)
+        )
+
+    def is_auto(self) -> np.ndarray:
+        return np.fromiter((sid.startswith(AUTO_PREFIX) for sid in self.sign_ids), dtype=bool, count=len(self))
+
+    def auto_count(self) -> int:
+        return int(self.is_auto().sum())
+
+    def sign(self, row: int) -> Dict[str, Any]:
+        return self.to_signs(rows=[row])[0]
+
+    def to_signs(self, rows: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        # column-wise conversion to Python scalars; far cheaper than per-element numpy access
+        rows = range(len(self)) if rows is None else rows
+        bboxes = self.bboxes.tolist()
+        has_bbox = self.has_bbox().tolist()
+        confidences = self.confidences.tolist()
+        bbox_is_float = self.bbox_is_float.tolist()
+        confidence_is_float = self.confidence_is_float.tolist()
+        description_index = self.description_index.tolist()
+        signs: List[Dict[str, Any]] = []
+        for row in rows:
+            entry: Dict[str, Any] = {
+                "sign_id": self.sign_ids[row],
+                "description": self.descriptions[description_index[row]],
+            }
+            if has_bbox[row]:
+                entry["bbox"] = [_number(v, f) for v, f in zip(bboxes[row], bbox_is_float[row])]
+            confidence = confidences[row]
+            if confidence == confidence:  # NaN marks an absent confidence
+                entry["confidence"] = _number(confidence, confidence_is_float[row])
+            if self.crop_paths[row] is not None:
+                entry["crop_path"] = self.crop_paths[row]
+            if self.extras[row]:
+                entry.update(self.extras[row])
+            signs.append(entry)
+        return signs
+
+    def encode(self) -> Dict[str, Any]:
+        # Compact on-disk form: sign ids share a stored prefix, bboxes are one
+        # flat list, and crop paths collapse to a directory when they follow
+        # the <dir>/<sign_id>.png layout written by cluster_crops.
+        count = len(self)
+        prefix = os.path.commonprefix(self.sign_ids) if count > 1 else ""
+        packed: Dict[str, Any] = {
+            "count": count,
+            "id_prefix": prefix,
+            "ids": [sid[len(prefix):] for sid in self.sign_ids],
+            "descriptions": self.descriptions,
+            "description_index": self.description_index.tolist(),
+            # floats are written as floats (20.0), which is how decode tells them apart
+            "bbox": [
+                None if v != v else _number(v, f)
+                for v, f in zip(self.bboxes.ravel().tolist(), self.bbox_is_float.ravel().tolist())
+            ],
+            "confidence": [
+                None if v != v else _number(v, f)
+                for v, f in zip(self.confidences.tolist(), self.confidence_is_float.tolist())
+            ],
+        }
+        if any(path is not None for path in self.crop_paths):
+            crop_dir = os.path.dirname(self.crop_paths[0] or "")
+            if crop_dir and all(
+                path == f"{crop_dir}/{sid}.png" for path, sid in zip(self.crop_paths, self.sign_ids)
+            ):
+                packed["crop_dir"] = crop_dir
+            else:
+                packed["crop_path"] = self.crop_paths
+        if any(self.extras):
+            packed["extras"] = self.extras
+        return packed
+
+    @classmethod
+    def decode(cls, packed: Dict[str, Any]) -> "SignTable":
+        count = packed["count"]
+        prefix = packed.get("id_prefix", "")
+        sign_ids = [prefix + suffix for suffix in packed["ids"]]
+        # None entries become NaN
+        bboxes = np.array(packed["bbox"], dtype=np.float64)
+        confidences = np.array(packed["confidence"], dtype=np.float64)
+        if "crop_dir" in packed:
+            crop_paths: Optional[List[Optional[str]]] = [f"{packed['crop_dir']}/{sid}.png" for sid in sign_ids]
+        else:
+            crop_paths = packed.get("crop_path")
+        if len(sign_ids) != count:
+            raise ValueError(f"packed sign table is truncated: expected {count} signs, found {len(sign_ids)}")
+        return cls(
+            sign_ids,
+            packed["descriptions"],
+            np.asarray(packed["description_index"]),
+            bboxes,
+            confidences,
+            crop_paths,
+            packed.get("extras"),
+            [isinstance(v, float) for v in packed["bbox"]],
+            [isinstance(v, float) for v in packed["confidence"]],
+        )
@@ -0,0 +1,185 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pyramid_audit.sign_table import SignTable
+
+# an auto cluster is superseded when a manual bbox covers this share of its area
+SUPERSEDE_COVERAGE = 0.5
+# boxes spanning more grid cells than this are kept in a side list checked on every query
+_MAX_CELLS_PER_BOX = 64
+
+Key = Tuple[str, str]
+
+
+def _ring_cells(cx: int, cy: int, ring: int) -> Iterable[Tuple[int, int]]:
+    # cells at Chebyshev distance exactly `ring` from (cx, cy)
+    if ring == 0:
+        yield cx, cy
+        return
+    for gx in range(cx - ring, cx + ring + 1):
+        yield gx, cy - ring
+        yield gx, cy + ring
+    for gy in range(cy - ring + 1, cy + ring):
+        yield cx - ring, gy
+        yield cx + ring, gy
+
+
+# Uniform grid buckets over the bboxes drawn on one evidence image. Queries
+# touch only the cells under the query region, so cost follows the local
+# density rather than the number of clusters on the line.
+class SignIndex:
+    def __init__(self, boxes: np.ndarray, keys: List[Key], cell_size: Optional[float] = None) -> None:
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.keys = keys
+        if cell_size is None:
+            extents = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+            cell_size = max(16.0, float(np.median(extents)) * 2) if len(extents) else 64.0
+        self.cell_size = cell_size
+        self.buckets: Dict[Tuple[int, int], np.ndarray] = {}
+        self.oversize = np.zeros(0, dtype=np.int64)
+        self._cell_bounds: Optional[Tuple[int, int, int, int]] = None
+        self._build()
+
+    def _cells(self, box: Sequence[float]) -> Tuple[int, int, int, int]:
+        return (
+            int(box[0] // self.cell_size),
+            int(box[1] // self.cell_size),
+            int(box[2] // self.cell_size),
+            int(box[3] // self.cell_size),
+        )
+
+    def _build(self) -> None:
+        if not len(self.boxes):
+            return
+        cells = np.floor_divide(self.boxes, self.cell_size).astype(np.int64)
+        spans = (cells[:, 2] - cells[:, 0] + 1) * (cells[:, 3] - cells[:, 1] + 1)
+        self.oversize = np.flatnonzero(spans > _MAX_CELLS_PER_BOX)
+        members: Dict[Tuple[int, int], List[int]] = {}
+        for row in np.flatnonzero(spans <= _MAX_CELLS_PER_BOX).tolist():
+            cx1, cy1, cx2, cy2 = cells[row].tolist()
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    members.setdefault((cx, cy), []).append(row)
+        self.buckets = {cell: np.array(rows, dtype=np.int64) for cell, rows in members.items()}
+        if members:
+            occupied = np.array(list(members))
+            self._cell_bounds = (*occupied.min(axis=0).tolist(), *occupied.max(axis=0).tolist())
+
+    @classmethod
+    def from_table(cls, line_id: str, table: SignTable, cell_size: Optional[float] = None) -> "SignIndex":
+        rows = np.flatnonzero(table.has_bbox())
+        return cls(table.bboxes[rows], [(line_id, table.sign_ids[row]) for row in rows.tolist()], cell_size)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _candidates(self, box: Sequence[float]) -> np.ndarray:
+        cx1, cy1, cx2, cy2 = self._cells(box)
+        found = [self.oversize]
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self.buckets):
+            found.extend(self.buckets.values())
+        else:
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    bucket = self.buckets.get((cx, cy))
+                    if bucket is not None:
+                        found.append(bucket)
+        return np.unique(np.concatenate(found)) if len(found) > 1 else self.oversize
+
+    def overlapping(self, box: Sequence[float]) -> List[int]:
+        rows = self._candidates(box)
+        b = self.boxes[rows]
+        hit = (b[:, 0] <= box[2]) & (b[:, 2] >= box[0]) & (b[:, 1] <= box[3]) & (b[:, 3] >= box[1])
+        return rows[hit].tolist()
+
+    def contained_in(self, box: Sequence[float]) -> List[int]:
+        rows = self._candidates(box)
+        b = self.boxes[rows]
+        hit = (b[:, 0] >= box[0]) & (b[:, 2] <= box[2]) & (b[:, 1] >= box[1]) & (b[:, 3] <= box[3])
+        return rows[hit].tolist()
+
+    def covered_by(self, box: Sequence[float], coverage: float = SUPERSEDE_COVERAGE) -> List[int]:
+        # rows whose own area lies at least `coverage` inside box
+        rows = np.array(self.overlapping(box), dtype=np.int64)
+        if not len(rows):
+            return []
+        b = self.boxes[rows]
+        ix = np.minimum(b[:, 2], box[2]) - np.maximum(b[:, 0], box[0])
+        iy = np.minimum(b[:, 3], box[3]) - np.maximum(b[:, 1], box[1])
+        inter = np.clip(ix, 0, None) * np.clip(iy, 0, None)
+        area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        # degenerate (zero-area) boxes count as covered once they touch
+        keep = np.where(area > 0, inter >= coverage * area, True)
+        return rows[keep].tolist()
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[int]:
+        # Rings of cells grow outwards until the k-th best distance is closer
+        # than anything an unvisited ring could hold.
+        if not len(self.keys):
+            return []
+        k = min(k, len(self.keys))
+        cx, cy = int(x // self.cell_size), int(y // self.cell_size)
+        max_ring = 0
+        if self._cell_bounds is not None:
+            x1, y1, x2, y2 = self._cell_bounds
+            max_ring = max(cx - x1, x2 - cx, cy - y1, y2 - cy, 0)
+        seen: List[np.ndarray] = [self.oversize]
+        ring = 0
+        while True:
+            for gx, gy in _ring_cells(cx, cy, ring):
+                bucket = self.buckets.get((gx, gy))
+                if bucket is not None:
+                    seen.append(bucket)
+            rows = np.unique(np.concatenate(seen))
+            if len(rows) >= k or ring >= max_ring:
+                b = self.boxes[rows]
+                dx = np.maximum(np.maximum(b[:, 0] - x, x - b[:, 2]), 0)
+                dy = np.maximum(np.maximum(b[:, 1] - y, y - b[:, 3]), 0)
+                dist = np.hypot(dx, dy)
+                order = np.lexsort((rows, dist))[:k]
+                # anything outside the visited rings is at least `ring * cell_size` away
+                if ring >= max_ring or (len(order) == k and dist[order[-1]] <= ring * self.cell_size):
+                    return rows[order].tolist()
+            ring += 1
+
+
+def superseded_clusters(signs: List[Dict[str, Any]], coverage: float = SUPERSEDE_COVERAGE) -> Dict[str, str]:
+    # auto sign_id -> manual sign_id whose bbox covers it; the first manual sign wins
+    table = SignTable.from_signs(signs)
+    auto = table.is_auto() & table.has_bbox()
+    # a bbox on a secondary witness is in another image's coordinates
+    manual = ~table.is_auto() & table.has_bbox() & table.on_primary()
+    if not auto.any() or not manual.any():
+        return {}
+    auto_rows = np.flatnonzero(auto)
+    index = SignIndex(table.bboxes[auto_rows], [("", table.sign_ids[row]) for row in auto_rows.tolist()])
+    superseded: Dict[str, str] = {}
+    for row in np.flatnonzero(manual).tolist():
+        for hit in index.covered_by(table.bboxes[row], coverage):
+            superseded.setdefault(index.keys[hit][1], table.sign_ids[row])
+    return superseded
+
+
+def pending_supersessions(record: Dict[str, Any], coverage: float = SUPERSEDE_COVERAGE) -> Dict[str, str]:
+    # the superseded_by marks the record is still missing
+    current = {sign["sign_id"]: sign.get("superseded_by") for sign in record.get("observed_signs", [])}
+    return {
+        auto_id: manual_id
+        for auto_id, manual_id in superseded_clusters(record.get("observed_signs", []), coverage).items()
+        if current.get(auto_id) != manual_id
+    }
+
+
+def apply_supersessions(record: Dict[str, Any], superseded: Dict[str, str]) -> Dict[str, Any]:
+    for sign in record.get("observed_signs", []):
+        if sign["sign_id"] in superseded:
+            sign["superseded_by"] = superseded[sign["sign_id"]]
+    return record
+
+
+def reconcile_record(record: Dict[str, Any], coverage: float = SUPERSEDE_COVERAGE) -> int:
+    # Marks auto clusters covered by manual bboxes with superseded_by; returns how many changed.
+    pending = pending_supersessions(record, coverage)
+    apply_supersessions(record, pending)
+    return len(pending)
@@ -0,0 +1,275 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from pyramid_audit.journal import load_entries
+from pyramid_audit.observations import iter_observations, save_observations
+from pyramid_audit.spatial_index import reconcile_record
+
+DEFAULT_DB_PATH = Path("ledger") / "audit.sqlite"
+
+# JSONL files remain the contract (validated by schemas/); the database mirrors
+# them with indexed columns and round-trips through import_jsonl/export_jsonl.
+LEDGER_FILES = {
+    "observations": Path("ledger") / "observations.jsonl",
+    "prior_readings": Path("ledger") / "prior_readings.jsonl",
+    "journal": Path("journal") / "entries.jsonl",
+    "reconstructions": Path("analysis") / "reconstructions.jsonl",
+    "discrepancies": Path("analysis") / "discrepancies.jsonl",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    line_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observed_signs (
+    line_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sign_id TEXT,
+    is_auto INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS observed_signs_line ON observed_signs(line_id);
+CREATE INDEX IF NOT EXISTS observed_signs_sign ON observed_signs(sign_id);
+CREATE TABLE IF NOT EXISTS prior_readings (
+    position INTEGER PRIMARY KEY,
+    line_id TEXT,
+    reading_id TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS prior_readings_line ON prior_readings(line_id);
+CREATE INDEX IF NOT EXISTS prior_readings_reading ON prior_readings(reading_id);
+CREATE TABLE IF NOT EXISTS journal (
+    position INTEGER PRIMARY KEY,
+    type TEXT,
+    line_id TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_type ON journal(type);
+CREATE INDEX IF NOT EXISTS journal_line ON journal(line_id);
+CREATE TABLE IF NOT EXISTS journal_tags (
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_tags_tag ON journal_tags(tag);
+CREATE TABLE IF NOT EXISTS analysis (
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    line_id TEXT,
+    reading_id TEXT,
+    record TEXT NOT NULL,
+    PRIMARY KEY (kind, position)
+);
+CREATE INDEX IF NOT EXISTS analysis_line ON analysis(kind, line_id);
+CREATE INDEX IF NOT EXISTS analysis_reading ON analysis(reading_id);
+"""
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _write_jsonl(path: Path, records) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as handle:
+        for record in records:
+            handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+
+
+def _dump(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=True)
+
+
+class SqliteLedger:
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "SqliteLedger":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is None:
+            self.conn.commit()
+        self.close()
+
+    def import_jsonl(self, root: Path) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self.conn:
+            self.conn.execute("DELETE FROM observations")
+            self.conn.execute("DELETE FROM observed_signs")
+            for position, record in enumerate(iter_observations(root / LEDGER_FILES["observations"])):
+                self._insert_observation(record, position)
+            counts["observations"] = self.conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+
+            self.conn.execute("DELETE FROM prior_readings")
+            self.conn.executemany(
+                "INSERT INTO prior_readings (position, line_id, reading_id, record) VALUES (?, ?, ?, ?)",
+                (
+                    (position, record.get("line_id"), record.get("reading_id"), _dump(record))
+                    for position, record in enumerate(_read_jsonl(root / LEDGER_FILES["prior_readings"]))
+                ),
+            )
+            counts["prior_readings"] = self.conn.execute("SELECT COUNT(*) FROM prior_readings").fetchone()[0]
+
+            self.conn.execute("DELETE FROM journal")
+            self.conn.execute("DELETE FROM journal_tags")
+            entries = load_entries(root / LEDGER_FILES["journal"])
+            for entry in entries:
+                self._insert_journal(entry)
+            counts["journal"] = len(entries)
+
+            self.conn.execute("DELETE FROM analysis")
+            for kind in ("reconstructions", "discrepancies"):
+                self.conn.executemany(
+                    "INSERT INTO analysis (kind, position, line_id, reading_id, record) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (kind, position, record.get("line_id"), record.get("reading_id"), _dump(record))
+                        for position, record in enumerate(_read_jsonl(root / LEDGER_FILES[kind]))
+                    ),
+                )
+                counts[kind] = self.conn.execute("SELECT COUNT(*) FROM analysis WHERE kind = ?", (kind,)).fetchone()[0]
+        return counts
+
+    def export_jsonl(self, root: Path) -> None:
+        save_observations(root / LEDGER_FILES["observations"], list(self.iter_observations()))
+        _write_jsonl(
+            root / LEDGER_FILES["prior_readings"],
+            (json.loads(row[0]) for row in self.conn.execute("SELECT record FROM prior_readings ORDER BY position")),
+        )
+        _write_jsonl(root / LEDGER_FILES["journal"], self.journal_entries())
+        for kind in ("reconstructions", "discrepancies"):
+            _write_jsonl(
+                root / LEDGER_FILES[kind],
+                (
+                    json.loads(row[0])
+                    for row in self.conn.execute("SELECT record FROM analysis WHERE kind = ? ORDER BY position", (kind,))
+                ),
+            )
+
+    def _insert_observation(self, record: Dict[str, Any], position: int) -> None:
+        line_id = record["line_id"]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO observations (line_id, position, record) VALUES (?, ?, ?)",
+            (line_id, position, _dump(record)),
+        )
+        self.conn.execute("DELETE FROM observed_signs WHERE line_id = ?", (line_id,))
+        self.conn.executemany(
+            "INSERT INTO observed_signs (line_id, position, sign_id, is_auto) VALUES (?, ?, ?, ?)",
+            (
+                (line_id, idx, sign.get("sign_id"), int(str(sign.get("sign_id", "")).startswith("auto-")))
+                for idx, sign in enumerate(record.get("observed_signs", []))
+            ),
+        )
+
+    def observation(self, line_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT record FROM observations WHERE line_id = ?", (line_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_observations(self) -> Iterator[Dict[str, Any]]:
+        for row in self.conn.execute("SELECT record FROM observations ORDER BY position"):
+            yield json.loads(row[0])
+
+    def put_observation(self, record: Dict[str, Any]) -> None:
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT position FROM observations WHERE line_id = ?", (record["line_id"],)
+            ).fetchone()
+            if row is None:
+                row = self.conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM observations").fetchone()
+            self._insert_observation(record, row[0])
+
+    def add_sign(
+        self,
+        line_id: str,
+        sign_entry: Dict[str, Any],
+        directionality: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        record = self.observation(line_id)
+        if record is None:
+            raise ValueError(f"line_id not found in observations: {line_id}")
+        record.setdefault("observed_signs", []).append(sign_entry)
+        if directionality:
+            record["directionality"] = directionality
+        reconcile_record(record)
+        self.put_observation(record)
+
+    def lines_pending_review(self) -> List[str]:
+        # lines carrying auto clusters but no manual sign yet
+        rows = self.conn.execute(
+            """
+            SELECT o.line_id FROM observations o
+            WHERE EXISTS (SELECT 1 FROM observed_signs s WHERE s.line_id = o.line_id AND s.is_auto = 1)
+              AND NOT EXISTS (SELECT 1 FROM observed_signs s WHERE s.line_id = o.line_id AND s.is_auto = 0)
+            ORDER BY o.position
+            """
+        )
+        return [row[0] for row in rows]
+
+    def lines_with_sign(self, sign_id: str) -> List[str]:
+        rows = self.conn.execute("SELECT DISTINCT line_id FROM observed_signs WHERE sign_id = ?", (sign_id,))
+        return [row[0] for row in rows]
+
+    def prior_readings(self, line_id: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT record FROM prior_readings WHERE line_id = ? ORDER BY position", (line_id,))
+        return [json.loads(row[0]) for row in rows]
+
+    def prior_reading(self, reading_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT record FROM prior_readings WHERE reading_id = ? ORDER BY position", (reading_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def analysis_records(self, kind: str, line_id: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT record FROM analysis WHERE kind = ? AND line_id = ? ORDER BY position", (kind, line_id)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def _insert_journal(self, entry: Dict[str, Any]) -> None:
+        cursor = self.conn.execute(
+            "INSERT INTO journal (type, line_id, record) VALUES (?, ?, ?)",
+            (entry.get("type"), entry.get("line_id"), _dump(entry)),
+        )
+        self.conn.executemany(
+            "INSERT INTO journal_tags (position, tag) VALUES (?, ?)",
+            ((cursor.lastrowid, tag) for tag in entry.get("tags") or []),
+        )
+
+    def append_journal(self, entry: Dict[str, Any]) -> None:
+        with self.conn:
+            self._insert_journal(entry)
+
+    def journal_entries(
+        self,
+        line_id: Optional[str] = None,
+        entry_type: Optional[str] = None,
+        tag: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if line_id is not None:
+            clauses.append("line_id = ?")
+            params.append(line_id)
+        if entry_type is not None:
+            clauses.append("type = ?")
+            params.append(entry_type)
+        if tag is not None:
+            clauses.append("position IN (SELECT position FROM journal_tags WHERE tag = ?)")
+            params.append(tag)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.conn.execute(f"SELECT record FROM journal{where} ORDER BY position", params)
+        return [json.loads(row[0]) for row in rows]
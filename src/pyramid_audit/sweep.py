@@ -0,0 +1,170 @@
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from pyramid_audit.auto_annotate import (
+    AutoAnnotateConfig,
+    components_to_boxes,
+    dilate_gray,
+    label_components,
+    postprocess_boxes,
+    scale_gray,
+    threshold_mask,
+)
+from pyramid_audit.sign_table import AUTO_PREFIX
+
+DEFAULT_SWEEP_PATH = Path("analysis") / "sweep.csv"
+SWEEP_PARAMS = ("scale", "dilation", "threshold", "min_area", "margin")
+SWEEP_COLUMNS = list(SWEEP_PARAMS) + [
+    "lines",
+    "clusters",
+    "clusters_per_line",
+    "area_median",
+    "area_p90",
+    "manual_boxes",
+    "manual_matched",
+    "mean_best_iou",
+]
+MATCH_IOU = 0.5
+
+Box = Tuple[int, int, int, int]
+
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    # ordered so combinations sharing a scale/dilation/threshold are adjacent
+    return [dict(zip(SWEEP_PARAMS, values)) for values in itertools.product(*(grid[name] for name in SWEEP_PARAMS))]
+
+
+def _sweep_line(image_path: Path, base: AutoAnnotateConfig, combos: List[Dict[str, Any]]) -> List[List[Box]]:
+    # Each stage is cached on the parameters it depends on: the decoded image
+    # once, the scaled gray per scale, the dilated gray per (scale, dilation) and
+    # the labelled components per (scale, dilation, threshold). min_area and
+    # margin only touch the final box list.
+    img = Image.open(image_path)
+    img.load()
+    grays: Dict[float, np.ndarray] = {}
+    dilated: Dict[Tuple[float, int], np.ndarray] = {}
+    comps: Dict[Tuple[float, int, int], List[Tuple[int, int, int, int, int]]] = {}
+    results: List[List[Box]] = []
+    for combo in combos:
+        cfg = replace(base, **combo)
+        key = (cfg.scale, cfg.dilation, cfg.threshold)
+        if key not in comps:
+            if cfg.scale not in grays:
+                # combos arrive grouped by scale; earlier scales are no longer needed
+                grays.clear()
+                dilated.clear()
+                grays[cfg.scale] = scale_gray(img, cfg)
+            if key[:2] not in dilated:
+                dilated[key[:2]] = dilate_gray(grays[cfg.scale], cfg)
+            mask = threshold_mask(dilated[key[:2]], cfg)
+            comps[key] = label_components(mask, replace(cfg, min_area=0))
+        # merge_gap comes from the base config; reading order does not affect the metrics
+        results.append(postprocess_boxes(components_to_boxes(comps[key], img.width, img.height, cfg), cfg))
+    return results
+
+
+def _sweep_job(
+    job: Tuple[str, str, AutoAnnotateConfig, List[Dict[str, Any]]]
+) -> Tuple[str, Optional[List[List[Box]]], Optional[str]]:
+    line_id, image_path, base, combos = job
+    try:
+        return line_id, _sweep_line(Path(image_path), base, combos), None
+    except Exception as exc:  # reported per line, as in auto_annotate_lines
+        return line_id, None, f"{type(exc).__name__}: {exc}"
+
+
+def _iou(a: Sequence[float], b: Sequence[float]) -> float:
+    ix = min(a[2], b[2]) - max(a[0], b[0])
+    iy = min(a[3], b[3]) - max(a[1], b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def manual_boxes(observations: List[Dict[str, Any]]) -> Dict[str, List[List[float]]]:
+    # bboxes recorded through `observe` (anything that is not an auto cluster)
+    boxes: Dict[str, List[List[float]]] = {}
+    for record in observations:
+        for sign in record.get("observed_signs", []):
+            if (
+                sign.get("bbox")
+                and not sign.get("evidence_id")
+                and not str(sign.get("sign_id", "")).startswith(AUTO_PREFIX)
+            ):
+                boxes.setdefault(record["line_id"], []).append(sign["bbox"])
+    return boxes
+
+
+def _summarise(
+    combo: Dict[str, Any],
+    per_line: Dict[str, List[Box]],
+    manual: Dict[str, List[List[float]]],
+) -> Dict[str, Any]:
+    areas = np.array(
+        [(b[2] - b[0] + 1) * (b[3] - b[1] + 1) for boxes in per_line.values() for b in boxes], dtype=np.float64
+    )
+    best: List[float] = []
+    for line_id, references in manual.items():
+        if line_id not in per_line:
+            continue
+        for ref in references:
+            best.append(max((_iou(ref, box) for box in per_line[line_id]), default=0.0))
+    row = dict(combo)
+    row.update(
+        {
+            "lines": len(per_line),
+            "clusters": int(len(areas)),
+            "clusters_per_line": round(len(areas) / len(per_line), 2) if per_line else 0.0,
+            "area_median": float(np.median(areas)) if len(areas) else 0.0,
+            "area_p90": float(np.percentile(areas, 90)) if len(areas) else 0.0,
+            "manual_boxes": len(best),
+            "manual_matched": sum(1 for value in best if value >= MATCH_IOU),
+            "mean_best_iou": round(float(np.mean(best)), 4) if best else "",
+        }
+    )
+    return row
+
+
+def sweep_lines(
+    jobs: List[Tuple[str, Path]],
+    base: AutoAnnotateConfig,
+    grid: Dict[str, Sequence[Any]],
+    manual: Optional[Dict[str, List[List[float]]]] = None,
+    workers: int = 1,
+) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    # Lines are the unit of parallelism so every worker keeps its per-image
+    # stage caches; each returns boxes for the full grid.
+    combos = expand_grid(grid)
+    payload = [(line_id, str(image_path), base, combos) for line_id, image_path in jobs]
+    if workers > 1 and len(payload) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_sweep_job, payload))
+    else:
+        outcomes = [_sweep_job(job) for job in payload]
+    per_combo: List[Dict[str, List[Box]]] = [{} for _ in combos]
+    errors: Dict[str, str] = {}
+    for line_id, results, error in outcomes:
+        if error is not None:
+            errors[line_id] = error
+            continue
+        for idx, boxes in enumerate(results or []):
+            per_combo[idx][line_id] = boxes
+    rows = [_summarise(combo, per_combo[idx], manual or {}) for idx, combo in enumerate(combos)]
+    return rows, errors
+
+
+def write_sweep_csv(path: Path, rows: List[Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=SWEEP_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,205 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from pyramid_audit.alignment import align_ids, banded_distances
+from pyramid_audit.corpus import CorpusView, LineView
+from pyramid_audit.vocabulary import Vocabulary
+
+DEFAULT_VARIANTS_PATH = Path("analysis") / "variants.jsonl"
+# memoized pairwise distances kept before the cache is dropped
+PAIR_CACHE_LIMIT = 1 << 18
+# sequence pairs scored per banded batch while choosing the center
+PAIR_BATCH = 4096
+
+Witness = Tuple[str, Optional[str]]
+
+
+# Banded edit distances between sign sequences, memoized on the sequences
+# themselves: formulaic utterances repeat the same witness readings, so most
+# pairs after the first are lookups.
+class PairScores:
+    def __init__(self, limit: int = PAIR_CACHE_LIMIT) -> None:
+        self.limit = limit
+        self.cache: Dict[Tuple[bytes, bytes], int] = {}
+
+    def distances(self, left: Sequence[np.ndarray], right: Sequence[np.ndarray]) -> np.ndarray:
+        pairs = [(a.tobytes(), b.tobytes()) for a, b in zip(left, right)]
+        pairs = [pair if pair[0] <= pair[1] else (pair[1], pair[0]) for pair in pairs]
+        distances = np.array([self.cache.get(pair, -1) for pair in pairs], dtype=np.int64)
+        missing = np.flatnonzero(distances < 0).tolist()
+        if missing:
+            distances[missing] = banded_distances([left[idx] for idx in missing], [right[idx] for idx in missing])
+            if len(self.cache) + len(missing) > self.limit:
+                self.cache.clear()
+            for idx in missing:
+                self.cache[pairs[idx]] = int(distances[idx])
+        return distances
+
+
+def align_witnesses(
+    sequences: Sequence[np.ndarray],
+    scores: Optional[PairScores] = None,
+) -> Tuple[int, np.ndarray, np.ndarray, List[Optional[int]]]:
+    # Center-star multiple alignment. Identical readings collapse to one
+    # distinct sequence; the center is the distinct sequence with the least
+    # total distance to every witness, accumulated one row at a time so no
+    # witness-by-witness matrix is held. Every distinct sequence is then
+    # aligned to the center and insertions before each center sign are padded
+    # to the widest one. Returns the center witness, the (distinct, columns)
+    # token-id rows with -1 for gaps, each witness's distinct row, and the
+    # center sign under each column (None for insertion columns).
+    scores = scores if scores is not None else PairScores()
+    distinct: Dict[bytes, int] = {}
+    uniques: List[np.ndarray] = []
+    inverse = np.zeros(len(sequences), dtype=np.int64)
+    for witness, seq in enumerate(sequences):
+        key = seq.tobytes()
+        if key not in distinct:
+            distinct[key] = len(uniques)
+            uniques.append(seq)
+        inverse[witness] = distinct[key]
+    counts = np.bincount(inverse, minlength=len(uniques))
+    totals = np.zeros(len(uniques), dtype=np.int64)
+    row = 0
+    while row < len(uniques) - 1:
+        # the upper triangle in blocks of rows holding about PAIR_BATCH pairs
+        stop, size = row + 1, len(uniques) - row - 1
+        while stop < len(uniques) - 1 and size + len(uniques) - stop - 1 <= PAIR_BATCH:
+            size += len(uniques) - stop - 1
+            stop += 1
+        left = np.repeat(np.arange(row, stop), len(uniques) - 1 - np.arange(row, stop))
+        right = np.concatenate([np.arange(r + 1, len(uniques)) for r in range(row, stop)])
+        found = scores.distances([uniques[idx] for idx in left.tolist()], [uniques[idx] for idx in right.tolist()])
+        np.add.at(totals, left, counts[right] * found)
+        np.add.at(totals, right, counts[left] * found)
+        row = stop
+    center = int(totals.argmin())
+    width = len(uniques[center])
+
+    placed = np.full((len(uniques), width), -1, dtype=np.int32)
+    inserts: List[List[List[int]]] = []
+    for row, (_distance, ops) in enumerate(align_ids(uniques, [uniques[center]] * len(uniques))):
+        slots: List[List[int]] = [[] for _ in range(width + 1)]
+        position = 0
+        for op, obs, _center in ops or []:
+            if op == "addition":
+                slots[position].append(obs)
+                continue
+            if op != "omission":
+                placed[row, position] = obs
+            position += 1
+        inserts.append(slots)
+    slot_width = [max(len(slots[position]) for slots in inserts) for position in range(width + 1)]
+    center_positions: List[Optional[int]] = []
+    starts: List[int] = []
+    for position in range(width + 1):
+        starts.append(len(center_positions))
+        center_positions.extend([None] * slot_width[position])
+        if position < width:
+            center_positions.append(position)
+    rows = np.full((len(uniques), len(center_positions)), -1, dtype=np.int32)
+    center_columns = [col for col, position in enumerate(center_positions) if position is not None]
+    rows[:, center_columns] = placed
+    for row, slots in enumerate(inserts):
+        for position, tokens in enumerate(slots):
+            rows[row, starts[position] : starts[position] + len(tokens)] = tokens
+    return int(np.flatnonzero(inverse == center)[0]), rows, inverse, center_positions
+
+
+def variant_table(
+    rows: np.ndarray,
+    inverse: np.ndarray,
+    center_positions: List[Optional[int]],
+    tokens: List[str],
+) -> List[Dict[str, Any]]:
+    # one entry per alignment column: each reading (None for a gap) with the
+    # witnesses attesting it, most attested first and a sign ahead of a gap
+    columns: List[Dict[str, Any]] = []
+    for col, position in enumerate(center_positions):
+        values = rows[inverse, col]
+        found, counts = np.unique(values, return_counts=True)
+        readings = []
+        for idx in np.lexsort((found, found < 0, -counts)).tolist():
+            value = int(found[idx])
+            readings.append(
+                {
+                    "token": tokens[value] if value >= 0 else None,
+                    "witnesses": np.flatnonzero(values == value).tolist(),
+                }
+            )
+        columns.append(
+            {
+                "column": col,
+                "center_position": position,
+                "consensus": readings[0]["token"],
+                "variant": len(readings) > 1,
+                "readings": readings,
+            }
+        )
+    return columns
+
+
+def _utterances(corpus: CorpusView) -> Dict[str, List[LineView]]:
+    # utterance -> its lines in manifest order; a line without utterance_id is
+    # its own utterance
+    groups: Dict[str, List[LineView]] = {}
+    for view in corpus.lines():
+        groups.setdefault(view.line.get("utterance_id") or view.line_id, []).append(view)
+    return groups
+
+
+def build_variants(
+    corpus: Union[Dict[str, Any], CorpusView],
+    output_path: Path,
+    observations_path: Optional[Path],
+    vocabulary: Vocabulary,
+) -> int:
+    # Writes one variant table per utterance with at least two observed
+    # witnesses (a line's own evidence plus each secondary evidence id, across
+    # every line sharing the utterance); returns how many were written.
+    corpus = CorpusView.wrap(corpus, observations_path=observations_path)
+    scores = PairScores()
+    written = 0
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as handle:
+        for utterance_id, lines in _utterances(corpus).items():
+            witnesses: List[Witness] = []
+            sequences: List[np.ndarray] = []
+            unobserved: List[Witness] = []
+            for view in lines:
+                observed = view.witness_tokens
+                # None keys signs read from the line's own evidence; witnesses
+                # observed on evidence the manifest does not list still count
+                evidence_ids: List[Optional[str]] = [None]
+                evidence_ids.extend(eid for eid in view.line.get("secondary_evidence_ids", []) if eid)
+                evidence_ids.extend(eid for eid in observed if eid not in evidence_ids)
+                primary = (view.line.get("evidence_ids") or [None])[0]
+                for eid in evidence_ids:
+                    witness = (view.line_id, primary if eid is None else eid)
+                    if observed.get(eid):
+                        witnesses.append(witness)
+                        sequences.append(vocabulary.encode(observed[eid]))
+                    else:
+                        unobserved.append(witness)
+            if len(witnesses) < 2:
+                continue
+            center, rows, inverse, center_positions = align_witnesses(sequences, scores)
+            columns = variant_table(rows, inverse, center_positions, vocabulary.tokens)
+            record = {
+                "utterance_id": utterance_id,
+                "line_ids": [view.line_id for view in lines],
+                "witnesses": [
+                    {"line_id": line_id, "evidence_id": eid, "sign_count": len(seq)}
+                    for (line_id, eid), seq in zip(witnesses, sequences)
+                ],
+                "unobserved_witnesses": [{"line_id": line_id, "evidence_id": eid} for line_id, eid in unobserved],
+                "center_witness": center,
+                "variant_columns": sum(1 for column in columns if column["variant"]),
+                "columns": columns,
+            }
+            handle.write(json.dumps(record, ensure_ascii=True) + "\n")
+            written += 1
+    return written
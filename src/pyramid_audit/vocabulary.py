@@ -0,0 +1,123 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from pyramid_audit.observations import iter_observations
+from pyramid_audit.sign_table import AUTO_PREFIX, SignTable
+
+DEFAULT_VOCABULARY_PATH = Path("ledger") / "vocabulary.json"
+VOCABULARY_VERSION = 1
+
+
+# Corpus-wide token table (Gardiner-style sign codes and reading tokens). Ids
+# are append-only: a token keeps its id for the life of the file, so id arrays
+# stored in ledgers stay valid as the vocabulary grows.
+class Vocabulary:
+    def __init__(self, tokens: Optional[List[str]] = None) -> None:
+        self.tokens: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.dirty = False
+        for token in tokens or []:
+            self.intern(token)
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.ids
+
+    @classmethod
+    def load(cls, path: Path) -> "Vocabulary":
+        if not path.exists():
+            return cls()
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != VOCABULARY_VERSION:
+            raise ValueError(f"vocabulary {path} has version {data.get('version')}, expected {VOCABULARY_VERSION}")
+        tokens = data.get("tokens", [])
+        if len(set(tokens)) != len(tokens):
+            raise ValueError(f"vocabulary {path} lists a token more than once")
+        return cls(tokens)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        payload = {"version": VOCABULARY_VERSION, "tokens": self.tokens}
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=True, indent=0) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
+        self.dirty = False
+
+    def intern(self, token: str) -> int:
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+            self.dirty = True
+        return token_id
+
+    def encode(self, tokens: Sequence[str]) -> np.ndarray:
+        return np.array([self.intern(token) for token in tokens], dtype=np.int32)
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        return [self.tokens[token_id] for token_id in ids]
+
+
+def table_witness_tokens(table: SignTable) -> Dict[Optional[str], List[str]]:
+    # Manual sign ids in ledger order per witness: None keys the line's own
+    # evidence, an evidence id keys a secondary witness. Auto clusters are
+    # uninterpreted and skipped.
+    tokens: Dict[Optional[str], List[str]] = {}
+    for sign_id, extra in zip(table.sign_ids, table.extras):
+        if not sign_id.startswith(AUTO_PREFIX):
+            tokens.setdefault((extra or {}).get("evidence_id") or None, []).append(sign_id)
+    return tokens
+
+
+def witness_tokens(record: Dict[str, Any]) -> Dict[Optional[str], List[str]]:
+    return table_witness_tokens(SignTable.from_signs(record.get("observed_signs", [])))
+
+
+def observed_tokens(record: Dict[str, Any]) -> List[str]:
+    return witness_tokens(record).get(None, [])
+
+
+def reading_transliteration(reading: Dict[str, Any]) -> Optional[str]:
+    if reading.get("transliteration"):
+        return reading["transliteration"]
+    if reading.get("reading_type") == "transliteration" and reading.get("text"):
+        return reading["text"]
+    return None
+
+
+def reading_tokens(reading: Dict[str, Any]) -> List[str]:
+    # explicit sign tokens when the reading has them, else transliteration words
+    if reading.get("tokens"):
+        return list(reading["tokens"])
+    transliteration = reading_transliteration(reading)
+    return transliteration.split() if transliteration else []
+
+
+def update_vocabulary(
+    path: Path,
+    manifest: Dict[str, Any],
+    observations_path: Path,
+    records: Optional[Iterable[Dict[str, Any]]] = None,
+) -> Vocabulary:
+    # Interns every observed manual sign and prior reading token; the file is
+    # only rewritten when something new was added. records, when given, stand
+    # in for the ledger.
+    vocabulary = Vocabulary.load(path)
+    for record in records if records is not None else iter_observations(observations_path):
+        for tokens in witness_tokens(record).values():
+            for token in tokens:
+                vocabulary.intern(token)
+    for relief in manifest.get("corpus", []):
+        for line in relief.get("lines", []):
+            for reading in line.get("prior_readings", []):
+                for token in reading_tokens(reading):
+                    vocabulary.intern(token)
+    if vocabulary.dirty or not path.exists():
+        vocabulary.save(path)
+    return vocabulary
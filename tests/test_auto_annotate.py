@@ -1,8 +1,22 @@
+import dataclasses
 from pathlib import Path
 
+import numpy as np
 from PIL import Image, ImageDraw
 
-from pyramid_audit.auto_annotate import AutoAnnotateConfig, auto_annotate_line
+from pyramid_audit.auto_annotate import (
+    AutoAnnotateConfig,
+    _adaptive_mask,
+    _components_reference,
+    _components_rle,
+    auto_annotate_line,
+    auto_annotate_lines,
+    merge_fragments,
+    order_boxes,
+    preprocess_gray,
+    recorded_direction,
+    segment_glyph_clusters,
+)
 
 
 def test_auto_annotate_simple(tmp_path: Path):
@@ -17,3 +31,158 @@ def test_auto_annotate_simple(tmp_path: Path):
     signs = auto_annotate_line(img_path, "line-1", cfg)
     assert len(signs) >= 2
     assert signs[0]["bbox"][0] <= signs[1]["bbox"][0]
+
+
+def test_rle_labeling_matches_reference():
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        height, width = rng.integers(1, 60, size=2)
+        mask = rng.random((height, width)) < rng.random()
+        cfg = AutoAnnotateConfig(min_area=int(rng.integers(0, 6)))
+        assert _components_rle(mask, cfg) == _components_reference(mask, cfg)
+
+
+def test_auto_annotate_lines_parallel_reports_failures(tmp_path: Path):
+    img_path = tmp_path / "line.png"
+    img = Image.new("L", (120, 60), color=255)
+    ImageDraw.Draw(img).rectangle([10, 10, 40, 40], fill=0)
+    img.save(img_path)
+
+    cfg = AutoAnnotateConfig(threshold=200, scale=1.0, min_area=20, dilation=1, margin=0)
+    jobs = [("line-1", img_path), ("missing", tmp_path / "missing.png"), ("line-2", img_path)]
+    results, errors = auto_annotate_lines(jobs, cfg, workers=2)
+    serial, _serial_errors = auto_annotate_lines(jobs, cfg, workers=1)
+
+    assert set(errors) == {"missing"}
+    assert results["line-1"][0]["sign_id"] == "auto-line-1-1"
+    assert results == serial
+
+
+def test_null_directionality_falls_back_to_default_order(tmp_path: Path):
+    img_path = tmp_path / "line.png"
+    img = Image.new("L", (120, 60), color=255)
+    ImageDraw.Draw(img).rectangle([10, 10, 40, 40], fill=0)
+    img.save(img_path)
+    records = {
+        "null": {"line_id": "null", "directionality": None},
+        "missing": {"line_id": "missing"},
+        "rtl": {"line_id": "rtl", "directionality": {"value": "right_to_left"}},
+    }
+    directions = {line_id: recorded_direction(record) for line_id, record in records.items()}
+    assert directions == {"null": None, "missing": None, "rtl": "right_to_left"}
+
+    cfg = AutoAnnotateConfig(threshold=200, scale=1.0, min_area=20, dilation=1, margin=0)
+    results, errors = auto_annotate_lines([(line_id, img_path) for line_id in records], cfg, directions=directions)
+    assert not errors and len(results["null"]) == 1
+
+
+def test_tiled_segmentation_matches_whole_image():
+    rng = np.random.default_rng(3)
+    for _ in range(20):
+        height, width = rng.integers(5, 200, size=2)
+        blocks = (rng.random((height // 4 + 1, width // 4 + 1)) < 0.3).astype(np.uint8) * 200
+        arr = np.kron(blocks, np.ones((4, 4), dtype=np.uint8))[:height, :width]
+        arr = (arr + rng.integers(0, 50, (height, width))).astype(np.uint8)
+        img = Image.fromarray(np.stack([arr] * 3, axis=-1))
+        cfg = AutoAnnotateConfig(
+            threshold=int(rng.integers(60, 200)),
+            scale=float(rng.choice([1.0, 0.5, 0.37, 1.3])),
+            dilation=int(rng.choice([1, 3, 5])),
+            min_area=int(rng.integers(0, 30)),
+            margin=2,
+        )
+        tiled = dataclasses.replace(cfg, tile_rows=int(rng.integers(1, 40)))
+        expected = segment_glyph_clusters(img, cfg)
+        assert segment_glyph_clusters(img, tiled) == expected
+        assert segment_glyph_clusters(img, dataclasses.replace(tiled, labeling="reference")) == expected
+
+
+def test_numpy_preprocessing_matches_pillow():
+    rng = np.random.default_rng(11)
+    for _ in range(10):
+        height, width = rng.integers(4, 80, size=2)
+        img = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+        for dilation in (1, 3, 7):
+            cfg = AutoAnnotateConfig(scale=1.0, dilation=dilation)
+            expected = preprocess_gray(img, cfg)
+            assert np.array_equal(preprocess_gray(img, dataclasses.replace(cfg, preprocess="numpy")), expected)
+
+    gray = rng.integers(0, 256, (9, 12), dtype=np.uint8)
+    cfg = AutoAnnotateConfig(scale=0.5, dilation=1, preprocess="numpy")
+    blocks = gray[:8, :12].reshape(4, 2, 6, 2).astype(np.int64)
+    expected = (blocks.sum(axis=(1, 3)) + 2) // 4
+    assert np.array_equal(preprocess_gray(Image.fromarray(gray), cfg), expected)
+
+
+def test_otsu_and_adaptive_thresholds():
+    img = Image.new("L", (120, 60), color=230)
+    ImageDraw.Draw(img).rectangle([10, 10, 40, 40], fill=20)
+    ImageDraw.Draw(img).rectangle([70, 10, 100, 40], fill=90)
+    for mode in ("otsu", "adaptive"):
+        cfg = AutoAnnotateConfig(scale=1.0, dilation=1, min_area=20, margin=0, threshold_mode=mode, preprocess="numpy")
+        boxes = segment_glyph_clusters(img, cfg)
+        assert boxes[0][:2] == (10, 10)
+        assert len(boxes) == 2
+
+    # adaptive thresholding against a direct window mean
+    gray = np.random.default_rng(2).integers(0, 256, (20, 25)).astype(np.uint8)
+    padded = np.pad(gray, 2, mode="edge").astype(float)
+    expected = np.array(
+        [[gray[y, x] < padded[y : y + 5, x : x + 5].mean() - 3 for x in range(25)] for y in range(20)]
+    )
+    assert np.array_equal(_adaptive_mask(gray, 5, 3), expected)
+
+
+def _brute_merge(boxes, gap):
+    # naive O(n^2) fixed point for comparison
+    groups = [list(b) for b in boxes]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                a, b = groups[i], groups[j]
+                if a[0] <= b[2] + gap and b[0] <= a[2] + gap and a[1] <= b[3] + gap and b[1] <= a[3] + gap:
+                    groups[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del groups[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return sorted(tuple(g) for g in groups)
+
+
+def test_merge_fragments_matches_pairwise_merge():
+    rng = np.random.default_rng(5)
+    for _ in range(30):
+        boxes = []
+        for _ in range(int(rng.integers(0, 40))):
+            x, y = rng.integers(0, 300, size=2)
+            w, h = rng.integers(1, 25, size=2)
+            boxes.append((int(x), int(y), int(x + w), int(y + h)))
+        gap = int(rng.integers(0, 8))
+        assert sorted(merge_fragments(boxes, gap)) == _brute_merge(boxes, gap)
+    # the first box leaves the sweep before the third grows the second group
+    # down to it
+    boxes = [(0, 100, 10, 110), (5, 0, 50, 10), (21, 10, 30, 105)]
+    assert merge_fragments(boxes, 2) == [(0, 0, 50, 110)]
+
+
+def test_reading_order_follows_directionality():
+    # two rows of two glyphs, the second row slightly offset
+    boxes = [(60, 0, 80, 20), (0, 2, 20, 22), (5, 40, 25, 60), (55, 42, 75, 62)]
+    assert order_boxes(boxes, "left_to_right") == [boxes[1], boxes[0], boxes[2], boxes[3]]
+    assert order_boxes(boxes, "right_to_left") == [boxes[0], boxes[1], boxes[3], boxes[2]]
+    assert order_boxes(boxes, "top_to_bottom") == [boxes[1], boxes[2], boxes[0], boxes[3]]
+    assert order_boxes(boxes, "bottom_to_top") == [boxes[2], boxes[1], boxes[3], boxes[0]]
+    assert order_boxes(boxes, "unknown") == sorted(boxes)
+
+    img = Image.new("L", (120, 40), color=230)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([10, 10, 20, 30], fill=10)
+    draw.rectangle([24, 10, 34, 30], fill=10)
+    draw.rectangle([80, 10, 100, 30], fill=10)
+    cfg = AutoAnnotateConfig(scale=1.0, dilation=1, min_area=10, margin=0)
+    assert len(segment_glyph_clusters(img, cfg)) == 3
+    merged = segment_glyph_clusters(img, dataclasses.replace(cfg, merge_gap=4), "right_to_left")
+    assert merged == [(80, 10, 100, 30), (10, 10, 34, 30)]
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import fitz
+
+from pyramid_audit.build_state import BuildState
+from pyramid_audit.evidence import build_evidence
+
+
+def _make_pdf(path: Path) -> None:
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=100)
+    page.draw_rect(fitz.Rect(20, 20, 60, 60), color=(0, 0, 0), fill=(0, 0, 0))
+    doc.save(path)
+    doc.close()
+
+
+def _manifest(bbox):
+    return {
+        "sources": [
+            {
+                "source_id": "local",
+                "type": "pdf",
+                "local_path": "source.pdf",
+                "items": [
+                    {
+                        "item_id": "p1",
+                        "page": 1,
+                        "evidence": [
+                            {"evidence_id": "full", "kind": "page_image", "output_path": "evidence/full.png", "render": {"scale": 1.0}},
+                            {"evidence_id": "crop", "kind": "crop", "output_path": "evidence/crop.png", "render": {"scale": 1.0}, "bbox": bbox},
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def test_incremental_evidence_build(tmp_path: Path):
+    _make_pdf(tmp_path / "source.pdf")
+    state = BuildState.load(tmp_path / ".build_state.json")
+    build_evidence(_manifest([10, 10, 70, 70]), tmp_path, state)
+    state.save()
+    full_mtime = (tmp_path / "evidence" / "full.png").stat().st_mtime_ns
+    crop_mtime = (tmp_path / "evidence" / "crop.png").stat().st_mtime_ns
+
+    state = BuildState.load(tmp_path / ".build_state.json")
+    build_evidence(_manifest([10, 10, 70, 70]), tmp_path, state)
+    assert (tmp_path / "evidence" / "full.png").stat().st_mtime_ns == full_mtime
+    assert (tmp_path / "evidence" / "crop.png").stat().st_mtime_ns == crop_mtime
+
+    build_evidence(_manifest([10, 10, 50, 50]), tmp_path, state)
+    assert (tmp_path / "evidence" / "full.png").stat().st_mtime_ns == full_mtime
+    assert (tmp_path / "evidence" / "crop.png").stat().st_mtime_ns != crop_mtime
+
+
+def test_run_stage_skips_unchanged_inputs(tmp_path: Path):
+    output = tmp_path / "out.txt"
+    calls = []
+
+    def build():
+        calls.append(1)
+        output.write_text("x", encoding="utf-8")
+
+    state = BuildState(tmp_path / ".build_state.json")
+    assert state.run_stage("stage", lambda: "a", build, [output])
+    assert not state.run_stage("stage", lambda: "a", build, [output])
+    assert state.run_stage("stage", lambda: "b", build, [output])
+    output.unlink()
+    assert BuildState.load(tmp_path / ".build_state.json").run_stage("stage", lambda: "b", build, [output])
+    assert len(calls) == 3
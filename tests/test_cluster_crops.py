@@ -71,3 +71,66 @@ def test_generate_cluster_crops(tmp_path: Path):
     assert updated["observed_signs"][0].get("crop_path")
     crop_path = tmp_path / updated["observed_signs"][0]["crop_path"]
     assert crop_path.exists()
+
+
+def test_cluster_export_skips_unchanged_crops(tmp_path: Path):
+    img = Image.new("RGB", (100, 50), color="white")
+    ImageDraw.Draw(img).rectangle([10, 10, 30, 30], fill="black")
+    evidence_path = tmp_path / "evidence" / "line.png"
+    evidence_path.parent.mkdir(parents=True)
+    img.save(evidence_path)
+    manifest = {
+        "sources": [
+            {"items": [{"evidence": [{"evidence_id": "ev1", "output_path": "evidence/line.png"}]}]}
+        ]
+    }
+    manifest_path = tmp_path / "source_manifest.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    def write_ledger(second_bbox):
+        record = {
+            "line_id": "line-1",
+            "evidence_ids": ["ev1"],
+            "observed_signs": [
+                {"sign_id": "auto-1", "description": "cluster", "bbox": [10, 10, 30, 30]},
+                {"sign_id": "auto-2", "description": "cluster", "bbox": second_bbox},
+            ],
+        }
+        obs_path.write_text(json.dumps(record) + "\n", encoding="utf-8")
+
+    obs_path = tmp_path / "ledger" / "observations.jsonl"
+    obs_path.parent.mkdir(parents=True)
+    write_ledger([40, 10, 60, 30])
+    generate_cluster_crops(manifest_path, obs_path, tmp_path, workers=2)
+    out_dir = tmp_path / "evidence" / "clusters" / "line-1"
+    first, second, sheet = (out_dir / "auto-1.png", out_dir / "auto-2.png", out_dir / "contact_sheet.png")
+    stamps = {path: path.stat().st_mtime_ns for path in (first, second, sheet)}
+
+    generate_cluster_crops(manifest_path, obs_path, tmp_path, workers=2)
+    assert {path: path.stat().st_mtime_ns for path in stamps} == stamps
+    assert json.loads(obs_path.read_text(encoding="utf-8"))["cluster_contact_sheet"]
+
+    write_ledger([40, 10, 70, 40])
+    generate_cluster_crops(manifest_path, obs_path, tmp_path, workers=2)
+    assert first.stat().st_mtime_ns == stamps[first]
+    assert second.stat().st_mtime_ns != stamps[second]
+    assert Image.open(second).size == (30, 30)
+    assert sheet.stat().st_mtime_ns != stamps[sheet]
+
+
+def test_cluster_export_skips_malformed_bboxes(tmp_path: Path):
+    Image.new("RGB", (100, 50), color="white").save(tmp_path / "line.png")
+    manifest = {"sources": [{"items": [{"evidence": [{"evidence_id": "ev1", "output_path": "line.png"}]}]}]}
+    manifest_path = tmp_path / "source_manifest.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    signs = [
+        {"sign_id": "auto-1", "description": "cluster", "bbox": [10, 10, 30, 30]},
+        {"sign_id": "S1", "description": "short box", "bbox": [10, 10, 30]},
+    ]
+    obs_path = tmp_path / "observations.jsonl"
+    obs_path.write_text(json.dumps({"line_id": "line-1", "evidence_ids": ["ev1"], "observed_signs": signs}) + "\n", encoding="utf-8")
+
+    generate_cluster_crops(manifest_path, obs_path, tmp_path)
+    updated = json.loads(obs_path.read_text(encoding="utf-8"))["observed_signs"]
+    assert updated[0]["crop_path"] == "evidence/clusters/line-1/auto-1.png"
+    assert updated[1] == signs[1]
@@ -0,0 +1,101 @@
+import copy
+from pathlib import Path
+
+import pytest
+
+import pyramid_audit.corpus as corpus_module
+from pyramid_audit.analysis import build_reconstructions
+from pyramid_audit.corpus import CorpusView
+from pyramid_audit.index import build_corpus_index
+from pyramid_audit.observations import save_observations
+from pyramid_audit.report import build_report
+
+
+def _manifest():
+    return {
+        "sources": [
+            {
+                "items": [
+                    {
+                        "item_id": "item",
+                        "page": 3,
+                        "evidence": [
+                            {"evidence_id": "e1", "output_path": "evidence/e1.png"},
+                            {"evidence_id": "e2", "output_path": "evidence/e2.png"},
+                        ],
+                    }
+                ]
+            }
+        ],
+        "corpus": [
+            {
+                "relief_id": "r1",
+                "label": "Relief",
+                "source_item_id": "item",
+                "lines": [
+                    {
+                        "line_id": "l1",
+                        "label": "Line 1",
+                        "evidence_ids": ["e1", "missing"],
+                        "secondary_evidence_ids": ["e2"],
+                        "prior_readings": [],
+                    },
+                    {"line_id": "l2", "label": "Line 2", "evidence_ids": [], "prior_readings": []},
+                ],
+            }
+        ],
+    }
+
+
+def test_corpus_view_joins_without_copying(tmp_path: Path, monkeypatch):
+    manifest = _manifest()
+    pristine = copy.deepcopy(manifest)
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(
+        ledger_path,
+        [
+            {
+                "line_id": "l1",
+                "observed_signs": [
+                    {"sign_id": "G17", "description": "owl"},
+                    {"sign_id": "auto-l1-1", "description": "cluster"},
+                    {"sign_id": "D21", "description": "mouth", "evidence_id": "e2"},
+                ],
+            }
+        ],
+    )
+    loads = []
+    original = corpus_module._observations_by_line
+    monkeypatch.setattr(corpus_module, "_observations_by_line", lambda path: loads.append(path) or original(path))
+
+    corpus = CorpusView(manifest, observations_path=ledger_path)
+    assert not loads
+    views = list(corpus.lines())
+    assert views[0].image_paths == ["evidence/e1.png"]
+    assert views[0].secondary_image_paths == ["evidence/e2.png"]
+    assert views[0].observed_tokens == ["G17"]
+    assert views[0].witness_tokens == {None: ["G17"], "e2": ["D21"]}
+    assert views[1].observation is None and views[1].journal == []
+    assert len(loads) == 1
+
+    # a rewritten ledger is picked up by the next lookup
+    save_observations(ledger_path, [{"line_id": "l2", "observed_signs": [{"sign_id": "A1", "description": "man"}]}])
+    assert corpus.observation("l1") is None
+    assert list(corpus.lines())[1].observed_tokens == ["A1"]
+    assert len(loads) == 2
+
+    output = tmp_path / "corpus_index.csv"
+    build_corpus_index(corpus, output)
+    rows = output.read_text(encoding="utf-8").splitlines()
+    assert rows[1].startswith("r1,l1,Line 1,item,3,e1;missing,evidence/e1.png,e2,evidence/e2.png,")
+    assert manifest == pristine
+
+
+def test_shared_view_rejects_ledger_paths_passed_alongside(tmp_path: Path):
+    view = CorpusView(_manifest(), observations_path=tmp_path / "observations.jsonl")
+    with pytest.raises(ValueError, match="observations_path"):
+        build_reconstructions(view, tmp_path / "reconstructions.jsonl", tmp_path / "other.jsonl")
+    with pytest.raises(ValueError, match="store"):
+        build_report(view, tmp_path / "REPORT.md", store=object())
+    build_report(view, tmp_path / "REPORT.md")
+    assert (tmp_path / "REPORT.md").exists()
@@ -1,4 +1,10 @@
-from pyramid_audit.analysis import score_discrepancy
+import json
+import random
+from pathlib import Path
+
+from pyramid_audit.alignment import align_tokens
+from pyramid_audit.analysis import build_discrepancies, score_discrepancy
+from pyramid_audit.observations import save_observations
 
 
 def test_no_data_discrepancy():
@@ -21,3 +27,102 @@ def test_minor_discrepancy():
 def test_critical_discrepancy():
     score = score_discrepancy(["A", "B", "C", "D"], ["X"]) 
     assert score["severity"] == "critical"
+
+
+def test_alignment_reports_omission_instead_of_positional_mismatch():
+    # positional comparison would count three mismatches; one sign is simply missing
+    score = score_discrepancy(["A", "C", "D"], ["A", "B", "C", "D"])
+    assert score["edit_distance"] == 1
+    assert score["likely_cause"] == "omission_or_addition"
+    assert score["alignment"] == [
+        ["match", "A", "A"],
+        ["omission", None, "B"],
+        ["match", "C", "C"],
+        ["match", "D", "D"],
+    ]
+
+
+def _levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        diag, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            diag, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, diag + (x != y))
+    return row[-1]
+
+
+def test_batched_alignment_matches_reference(monkeypatch):
+    import pyramid_audit.alignment as alignment
+
+    # small batches so pairs of different lengths land in several DP tables
+    monkeypatch.setattr(alignment, "ALIGN_BATCH_CELLS", 300)
+    rng = random.Random(4)
+    pairs = [
+        ([rng.choice("ABCD") for _ in range(rng.randint(0, 12))], [rng.choice("ABCD") for _ in range(rng.randint(0, 12))])
+        for _ in range(200)
+    ]
+    for (observed, prior), (distance, alignment) in zip(pairs, align_tokens(pairs)):
+        assert distance == _levenshtein(observed, prior)
+        assert [op[1] for op in alignment if op[1] is not None] == observed
+        assert [op[2] for op in alignment if op[2] is not None] == prior
+        assert sum(op[0] != "match" for op in alignment) == distance
+
+
+def test_build_discrepancies_aligns_manual_signs(tmp_path: Path):
+    manifest = {
+        "corpus": [
+            {
+                "lines": [
+                    {
+                        "line_id": "l1",
+                        "prior_readings": [
+                            {"reading_id": "r1", "tokens": ["G17", "D21", "N35"]},
+                            {"reading_id": "r2"},
+                        ],
+                    }
+                ]
+            }
+        ]
+    }
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(
+        ledger_path,
+        [
+            {
+                "line_id": "l1",
+                "observed_signs": [
+                    {"sign_id": "G17", "description": "owl"},
+                    {"sign_id": "auto-l1-1", "description": "cluster"},
+                    {"sign_id": "N35", "description": "water"},
+                ],
+            }
+        ],
+    )
+    output_path = tmp_path / "discrepancies.jsonl"
+    build_discrepancies(manifest, output_path, ledger_path)
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert records[0]["edit_distance"] == 1
+    assert records[0]["severity"] == "minor"
+    assert records[0]["alignment"][1] == ["omission", None, "D21"]
+    assert records[1]["likely_cause"] == "no_data"
+    assert "alignment" not in records[1]
+
+
+def test_unobserved_lines_keep_deferred_classification(tmp_path: Path):
+    manifest = {
+        "corpus": [
+            {
+                "lines": [
+                    {"line_id": "l1", "prior_readings": [{"reading_id": "r1", "tokens": ["G17", "D21"]}, {"reading_id": "r2"}]},
+                ]
+            }
+        ]
+    }
+    output_path = tmp_path / "discrepancies.jsonl"
+    build_discrepancies(manifest, output_path, tmp_path / "observations.jsonl")
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["severity"], r["likely_cause"], r["diff_ratio"]) for r in records] == [
+        ("critical", "substantial_divergence", 1.0),
+        ("none", "no_data", 0.0),
+    ]
+    assert all("alignment" not in r and r["notes"].endswith("scoring deferred.") for r in records)
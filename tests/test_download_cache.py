@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import pytest
+
+from pyramid_audit.download_cache import DownloadCache
+
+
+def test_fetch_reuses_cached_bytes(tmp_path: Path):
+    source = tmp_path / "plate.bin"
+    source.write_bytes(b"plate-v1")
+    url = source.as_uri()
+    cache = DownloadCache(tmp_path / "cache")
+
+    assert cache.fetch(url) == b"plate-v1"
+    source.write_bytes(b"plate-v2")
+    assert cache.fetch(url) == b"plate-v1"
+    assert DownloadCache(tmp_path / "cache", revalidate=True).fetch(url) == b"plate-v2"
+
+
+def test_offline_mode_fails_fast_on_miss(tmp_path: Path):
+    source = tmp_path / "plate.bin"
+    source.write_bytes(b"plate")
+    cache = DownloadCache(tmp_path / "cache", offline=True)
+    with pytest.raises(RuntimeError, match="offline mode"):
+        cache.fetch(source.as_uri())
+
+    DownloadCache(tmp_path / "cache").fetch(source.as_uri())
+    source.unlink()
+    assert cache.fetch(source.as_uri()) == b"plate"
+
+
+def test_lru_eviction_respects_size_bound(tmp_path: Path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=10)
+    cache.store("https://example.org/a", b"aaaa")
+    cache.store("https://example.org/b", b"bbbb")
+    cache.fetch("https://example.org/a")
+    cache.store("https://example.org/c", b"cccc")
+
+    assert cache.contains("https://example.org/a")
+    assert not cache.contains("https://example.org/b")
+    assert cache.contains("https://example.org/c")
+
+
+def test_revalidate_uses_conditional_requests(tmp_path: Path):
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "5")
+            self.end_headers()
+            self.wfile.write(b"plate")
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/plate.png"
+        assert DownloadCache(tmp_path / "cache").fetch(url) == b"plate"
+        # without --revalidate a cached plate is not requested again
+        assert DownloadCache(tmp_path / "cache").fetch(url) == b"plate"
+        assert requests == [None]
+        # with it the cached ETag is sent, and a 304 keeps the cached bytes
+        assert DownloadCache(tmp_path / "cache", revalidate=True).fetch(url) == b"plate"
+        assert requests == [None, '"v1"']
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,111 @@
+from pathlib import Path
+
+import fitz
+import numpy as np
+from PIL import Image
+
+from pyramid_audit import evidence
+from pyramid_audit.evidence import PageRasterCache, build_evidence, render_pdf_clip, render_pdf_page
+
+
+def _make_pdf(path: Path, rotation: int = 0) -> None:
+    doc = fitz.open()
+    page = doc.new_page(width=300, height=200)
+    for i in range(12):
+        page.draw_rect(fitz.Rect(10 + i * 20, 15 + i * 12, 25 + i * 20, 40 + i * 12), color=None, fill=(0.2, 0.2, 0.2))
+    page.set_rotation(rotation)
+    doc.save(path)
+    doc.close()
+
+
+def test_clip_render_matches_full_page_crop(tmp_path: Path):
+    for rotation in (0, 90):
+        pdf_path = tmp_path / f"page{rotation}.pdf"
+        _make_pdf(pdf_path, rotation)
+        doc = fitz.open(pdf_path)
+        full = render_pdf_page(doc, 1, 2.0)
+        for bbox in ([20, 30, 200, 150], [0, 0, full.width, full.height], [full.width - 40, 10, full.width + 25, 90]):
+            clipped = render_pdf_clip(doc, 1, 2.0, bbox)
+            assert np.array_equal(np.array(clipped), np.array(full.crop(tuple(bbox))))
+        doc.close()
+
+
+def test_page_raster_cache_evicts_least_recent():
+    tile = Image.new("RGB", (10, 10))
+    cache = PageRasterCache(max_bytes=2 * 10 * 10 * 3)
+    cache.put(("a.pdf", 1, 1.0), tile)
+    cache.put(("a.pdf", 2, 1.0), tile)
+    cache.get(("a.pdf", 1, 1.0))
+    cache.put(("a.pdf", 3, 1.0), tile)
+    assert ("a.pdf", 1, 1.0) in cache
+    assert ("a.pdf", 2, 1.0) not in cache
+    assert ("a.pdf", 3, 1.0) in cache
+
+
+def test_shared_page_rendered_once(tmp_path: Path, monkeypatch):
+    _make_pdf(tmp_path / "source.pdf")
+    calls = []
+    original = evidence.render_pdf_page
+
+    def counting(doc, page_number, scale):
+        calls.append((page_number, scale))
+        return original(doc, page_number, scale)
+
+    monkeypatch.setattr(evidence, "render_pdf_page", counting)
+
+    def item(item_id, kind, bbox=None):
+        entry = {"evidence_id": item_id, "kind": kind, "output_path": f"evidence/{item_id}.png", "render": {"scale": 1.0}}
+        if bbox:
+            entry["bbox"] = bbox
+        return {"item_id": item_id, "page": 1, "evidence": [entry]}
+
+    manifest = {
+        "sources": [
+            {
+                "source_id": "local",
+                "type": "pdf",
+                "local_path": "source.pdf",
+                "items": [item("full_a", "page_image"), item("full_b", "page_image"), item("crop", "crop", [5, 5, 80, 60])],
+            }
+        ]
+    }
+    build_evidence(manifest, tmp_path)
+    assert calls == [(1, 1.0)]
+    assert (tmp_path / "evidence" / "crop.png").exists()
+
+
+def test_parallel_rendering_matches_serial(tmp_path: Path):
+    doc = fitz.open()
+    for i in range(4):
+        page = doc.new_page(width=200, height=120)
+        page.draw_rect(fitz.Rect(10 + i * 30, 10, 40 + i * 30, 60), color=None, fill=(0, 0, 0))
+    doc.save(tmp_path / "source.pdf")
+    doc.close()
+
+    items = []
+    for page in range(1, 5):
+        items.append(
+            {
+                "item_id": f"p{page}",
+                "page": page,
+                "evidence": [
+                    {"evidence_id": f"p{page}_full", "kind": "page_image", "output_path": f"evidence/p{page}.png", "render": {"scale": 1.5}},
+                    {"evidence_id": f"p{page}_crop", "kind": "crop", "output_path": f"evidence/p{page}_crop.png", "render": {"scale": 1.5}, "bbox": [5, 5, 90, 80]},
+                ],
+            }
+        )
+    manifest = {"sources": [{"source_id": "local", "type": "pdf", "local_path": "source.pdf", "items": items}]}
+
+    serial_root = tmp_path
+    parallel_root = tmp_path / "parallel"
+    parallel_root.mkdir()
+    (parallel_root / "source.pdf").write_bytes((tmp_path / "source.pdf").read_bytes())
+    serial = build_evidence(manifest, serial_root)
+    parallel = build_evidence(manifest, parallel_root, workers=2)
+
+    assert serial == parallel
+    assert len(parallel) == 8
+    for output_path in parallel:
+        a = np.array(Image.open(serial_root / output_path))
+        b = np.array(Image.open(parallel_root / output_path))
+        assert np.array_equal(a, b)
@@ -0,0 +1,90 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from pyramid_audit.features import FEATURE_DIM, FeatureIndex, build_feature_index, cluster_features
+from pyramid_audit.observations import save_observations
+
+
+def _write_line(tmp_path: Path, name: str, shapes) -> Path:
+    img = Image.new("L", (200, 60), color=240)
+    draw = ImageDraw.Draw(img)
+    for kind, box in shapes:
+        if kind == "disc":
+            draw.ellipse(box, fill=20)
+        else:
+            draw.rectangle(box, fill=20)
+    path = tmp_path / "evidence" / f"{name}.png"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    img.save(path)
+    return path
+
+
+def test_similar_clusters_across_lines(tmp_path: Path):
+    _write_line(tmp_path, "a", [("disc", [10, 10, 40, 40]), ("bar", [60, 5, 66, 55])])
+    _write_line(tmp_path, "b", [("bar", [20, 8, 25, 52]), ("disc", [100, 15, 128, 43])])
+    evidence = [
+        {"evidence_id": name, "kind": "page_image", "output_path": f"evidence/{name}.png"} for name in ("a", "b")
+    ]
+    manifest_path = tmp_path / "source_manifest.json"
+    manifest_path.write_text(json.dumps({"sources": [{"items": [{"evidence": evidence}]}]}), encoding="utf-8")
+    boxes = {
+        "a": [[8, 8, 43, 43], [58, 3, 69, 58]],
+        "b": [[18, 6, 28, 55], [98, 13, 131, 46]],
+    }
+    records = [
+        {
+            "line_id": f"line-{name}",
+            "evidence_ids": [name],
+            "observed_signs": [
+                {"sign_id": f"auto-line-{name}-{idx}", "description": "cluster", "bbox": bbox}
+                for idx, bbox in enumerate(boxes[name], start=1)
+            ],
+        }
+        for name in ("a", "b")
+    ]
+    ledger_path = tmp_path / "ledger" / "observations.jsonl"
+    save_observations(ledger_path, records)
+    index_path = tmp_path / "analysis" / "cluster_features.npz"
+
+    index, errors = build_feature_index(manifest_path, ledger_path, tmp_path, index_path)
+    assert not errors
+    assert len(index) == 4
+    assert np.allclose(np.linalg.norm(index.vectors, axis=1), 1.0, atol=1e-5)
+    assert index.rows_for("auto-line-b-2") == [3] and index.rows_for("S1") == []
+
+    # the disc on line a finds the disc on line b first, and likewise for the bars
+    matches = index.similar("line-a", "auto-line-a-1", k=1, other_lines=True)
+    assert matches[0][0] == ("line-b", "auto-line-b-2")
+    matches = FeatureIndex.load(index_path).similar("line-b", "auto-line-b-1", k=3)
+    assert matches[0][0] == ("line-a", "auto-line-a-2")
+    assert ("line-b", "auto-line-b-1") not in [key for key, _score in matches]
+
+    # unchanged lines keep their stored vectors; an edited bbox is re-extracted
+    records[1]["observed_signs"][1]["bbox"] = [98, 13, 120, 46]
+    save_observations(ledger_path, records)
+    rebuilt, _errors = build_feature_index(manifest_path, ledger_path, tmp_path, index_path)
+    assert rebuilt.line_keys["line-a"] == index.line_keys["line-a"]
+    assert rebuilt.line_keys["line-b"] != index.line_keys["line-b"]
+    assert np.array_equal(rebuilt.vectors[:3], index.vectors[:3])
+    assert not np.array_equal(rebuilt.vectors[3], index.vectors[3])
+
+
+def test_chunked_search_matches_full_sort(monkeypatch):
+    import pyramid_audit.features as features
+
+    monkeypatch.setattr(features, "_SEARCH_CHUNK", 37)
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(500, FEATURE_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = FeatureIndex(vectors, [("line", str(row)) for row in range(500)], np.zeros((500, 4)))
+    rows, scores = index.search(vectors[:5], k=8, exclude=[0, 1, 2, 3, 4])
+    full = vectors[:5] @ vectors.T
+    full[np.arange(5), np.arange(5)] = -np.inf
+    assert np.array_equal(rows, np.argsort(-full, axis=1, kind="stable")[:, :8])
+    assert np.allclose(scores, np.take_along_axis(full, rows, axis=1))
+
+    blank = cluster_features(np.full((10, 10), 200, dtype=np.uint8))
+    assert blank.shape == (FEATURE_DIM,)
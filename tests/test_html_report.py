@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+from PIL import Image
+
+from pyramid_audit.html_report import build_html_report, image_key
+from pyramid_audit.observations import save_observations
+
+
+def _manifest():
+    return {
+        "sources": [
+            {
+                "items": [
+                    {
+                        "evidence": [
+                            {"evidence_id": "e1", "output_path": "evidence/e1.png"},
+                            {"evidence_id": "e2", "output_path": "evidence/e2.png"},
+                        ]
+                    }
+                ]
+            }
+        ],
+        "corpus": [
+            {
+                "relief_id": "r1",
+                "label": "Relief <1>",
+                "lines": [
+                    {"line_id": "l1", "label": "Line 1", "evidence_ids": ["e1"], "secondary_evidence_ids": ["e2"]},
+                    {"line_id": "l2", "label": "Line 2", "evidence_ids": ["e2"]},
+                ],
+            }
+        ],
+    }
+
+
+def test_html_report_tiles_and_indexes(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "evidence").mkdir()
+    Image.new("RGB", (600, 300), "white").save(tmp_path / "evidence" / "e1.png")
+    Image.new("RGB", (40, 20), "black").save(tmp_path / "evidence" / "e2.png")
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(ledger_path, [{"line_id": "l1", "observed_signs": [{"sign_id": "G17", "description": "owl"}]}])
+    output_dir = tmp_path / "site"
+
+    tiled, errors = build_html_report(_manifest(), output_dir, observations_path=ledger_path, tile_size=256, thumb_size=64)
+    assert sorted(tiled) == ["evidence/e1.png", "evidence/e2.png"] and errors == {}
+
+    # deep-zoom pyramid: level 10 is full size (600x300 -> 3x2 tiles), level 0 is 1x1
+    key = image_key("evidence/e1.png")
+    image_dir = output_dir / "images" / key
+    assert {p.name for p in (image_dir / "image_files" / "10").iterdir()} == {f"{c}_{r}.jpg" for c in range(3) for r in range(2)}
+    assert Image.open(image_dir / "image_files" / "9" / "1_0.jpg").size == (44, 150)
+    assert Image.open(image_dir / "image_files" / "0" / "0_0.jpg").size == (1, 1)
+    assert max(Image.open(image_dir / "thumb.jpg").size) == 64
+    assert 'Width="600" Height="300"' in (image_dir / "image.dzi").read_text(encoding="utf-8")
+
+    index = json.loads((output_dir / "index.json").read_text(encoding="utf-8"))
+    assert [(line["line_id"], line["status"]) for line in index["lines"]] == [("l1", "manual"), ("l2", "none")]
+    assert index["images"][key]["levels"] == 10
+    html = (output_dir / "index.html").read_text(encoding="utf-8")
+    assert f'src="images/{key}/thumb.jpg" loading="lazy"' in html
+    assert "Relief &lt;1&gt;" in html
+    assert (output_dir / "viewer.html").exists() and (output_dir / "index.js").exists()
+
+    # unchanged sources are not re-tiled; an image no longer referenced is removed
+    assert build_html_report(_manifest(), output_dir, observations_path=ledger_path, tile_size=256, thumb_size=64)[0] == []
+    manifest = _manifest()
+    manifest["corpus"][0]["lines"] = manifest["corpus"][0]["lines"][1:]
+    assert build_html_report(manifest, output_dir, observations_path=ledger_path, tile_size=256, thumb_size=64)[0] == []
+    assert not image_dir.exists()
@@ -1,6 +1,9 @@
+import json
 from pathlib import Path
 
-from pyramid_audit.ingest import load_manifest
+import pytest
+
+from pyramid_audit.ingest import load_manifest, schema_validators, validation_state_path
 
 
 def test_manifest_validates():
@@ -22,3 +25,36 @@ def test_evidence_linking():
                 assert eid in evidence_ids
             for eid in line.get("secondary_evidence_ids", []):
                 assert eid in evidence_ids
+
+
+def test_manifest_validation_is_cached_per_section(tmp_path: Path, monkeypatch):
+    manifest = json.loads(Path("source_manifest.json").read_text(encoding="utf-8"))
+    manifest_path = tmp_path / "source_manifest.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    state_path = validation_state_path(manifest_path)
+    _digest, validators = schema_validators()
+    checked = []
+    original = validators.errors
+
+    def counting(value, known):
+        checked.append(len([s for s in validators.sections(value) if s[0] not in known]))
+        return original(value, known)
+
+    monkeypatch.setattr(validators, "errors", counting)
+    # without a state path nothing is cached or written
+    load_manifest(manifest_path)
+    assert not state_path.exists()
+    checked.clear()
+
+    load_manifest(manifest_path, state_path)
+    load_manifest(manifest_path, state_path)
+    # editing one relief revalidates only that relief
+    manifest["corpus"][0]["notes"] = "edited"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    load_manifest(manifest_path, state_path)
+    assert checked == [len(manifest["sources"]) + len(manifest["corpus"]), 1]
+
+    manifest["corpus"][1]["lines"][0]["line_id"] = 3
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    with pytest.raises(ValueError, match="corpus/1/lines/0/line_id"):
+        load_manifest(manifest_path, state_path)
@@ -1,6 +1,8 @@
+import json
 from pathlib import Path
 
-from pyramid_audit.report import build_report
+from pyramid_audit.journal import append_entry
+from pyramid_audit.report import build_report, build_report_shards
 
 
 def test_report_includes_journal(tmp_path: Path):
@@ -46,3 +48,43 @@ def test_report_includes_journal(tmp_path: Path):
     content = output.read_text(encoding="utf-8")
     assert "Journal entries" in content
     assert "Test note" in content
+
+
+def test_sharded_report_rewrites_changed_reliefs(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = {
+        "corpus": [
+            {
+                "relief_id": relief_id,
+                "label": f"Relief {relief_id}",
+                "lines": [
+                    {
+                        "line_id": f"{relief_id}-l1",
+                        "label": "Line 1",
+                        "evidence_ids": [],
+                        "image_paths": [f"evidence/{relief_id}.png"],
+                        "prior_readings": [],
+                    }
+                ],
+            }
+            for relief_id in ("a", "b")
+        ]
+    }
+    output_dir = tmp_path / "report"
+    assert build_report_shards(manifest, output_dir) == ["a.md", "b.md", "index.md"]
+    page = (output_dir / "a.md").read_text(encoding="utf-8")
+    assert page.startswith("[Index](index.md)\n\n# Relief a\n")
+    assert "![evidence](../evidence/a.png)" in page
+    assert "- [Relief b](b.md) (1 lines)" in (output_dir / "index.md").read_text(encoding="utf-8")
+    assert build_report_shards(manifest, output_dir) == []
+
+    # only the relief whose line gained a journal entry is re-rendered
+    append_entry("hypothesis", "Test note", line_id="b-l1")
+    assert build_report_shards(manifest, output_dir) == ["b.md"]
+    assert "Test note" in (output_dir / "b.md").read_text(encoding="utf-8")
+
+    manifest["corpus"].pop(0)
+    assert build_report_shards(manifest, output_dir) == ["index.md"]
+    assert not (output_dir / "a.md").exists()
+    state = json.loads((output_dir / ".shards.json").read_text(encoding="utf-8"))
+    assert sorted(state["shards"]) == ["b.md", "index.md"]
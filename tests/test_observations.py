@@ -1,6 +1,14 @@
 from pathlib import Path
 
-from pyramid_audit.observations import add_sign_observation, load_observations, save_observations
+import pytest
+
+from pyramid_audit.observations import (
+    ObservationStore,
+    add_sign_observation,
+    load_observations,
+    save_observations,
+    wal_path,
+)
 
 
 def test_add_sign_observation(tmp_path: Path):
@@ -34,3 +42,68 @@ def test_add_sign_observation(tmp_path: Path):
     assert updated[0]["observed_signs"]
     assert updated[0]["observed_signs"][0]["sign_id"] == "S1"
     assert updated[0]["directionality"]["value"] == "right_to_left"
+
+
+def test_sign_additions_are_logged_then_compacted(tmp_path: Path):
+    ledger_path = tmp_path / "observations.jsonl"
+    records = [
+        {"line_id": line_id, "evidence_ids": [], "observed_signs": [], "observed_only": True}
+        for line_id in ("line-a", "line-b")
+    ]
+    save_observations(ledger_path, records)
+    original = ledger_path.read_text(encoding="utf-8")
+
+    add_sign_observation(ledger_path, line_id="line-b", sign_id="S1", description="first")
+    assert ledger_path.read_text(encoding="utf-8") == original
+    assert wal_path(ledger_path).exists()
+    assert ObservationStore(ledger_path).get("line-b")["observed_signs"][0]["sign_id"] == "S1"
+    assert [len(r["observed_signs"]) for r in load_observations(ledger_path)] == [0, 1]
+
+    store = ObservationStore(ledger_path, compact_bytes=0)
+    store.append_sign("line-a", {"sign_id": "S2", "description": "second"})
+    assert not wal_path(ledger_path).exists()
+    assert [len(r["observed_signs"]) for r in load_observations(ledger_path)] == [1, 1]
+
+    with pytest.raises(ValueError):
+        add_sign_observation(ledger_path, line_id="missing", sign_id="S3", description="x")
+
+
+def test_log_skips_torn_lines_and_repairs_tail(tmp_path: Path):
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(ledger_path, [{"line_id": "line-a", "evidence_ids": [], "observed_signs": [], "observed_only": True}])
+    store = ObservationStore(ledger_path)
+    store.append_sign("line-a", {"sign_id": "S1", "description": "first"})
+    log_path = wal_path(ledger_path)
+    with log_path.open("a", encoding="utf-8") as handle:
+        handle.write('{"op": "add_sign", "line_')
+    # the next append cuts the torn tail back before writing
+    store.append_sign("line-a", {"sign_id": "S2", "description": "second"})
+    assert [s["sign_id"] for s in store.get("line-a")["observed_signs"]] == ["S1", "S2"]
+
+    # a bad line in the middle is reported, and the ops after it still apply
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    log_path.write_text("\n".join([lines[0], "{not json", lines[1]]) + "\n", encoding="utf-8")
+    with pytest.warns(UserWarning, match="unreadable"):
+        records = load_observations(ledger_path)
+    assert [s["sign_id"] for s in records[0]["observed_signs"]] == ["S1", "S2"]
+
+
+def test_log_left_behind_by_compaction_is_not_reapplied(tmp_path: Path):
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(ledger_path, [{"line_id": "line-a", "evidence_ids": [], "observed_signs": [], "observed_only": True}])
+    store = ObservationStore(ledger_path)
+    store.append_sign("line-a", {"sign_id": "S1", "description": "first"})
+    store.mark_superseded("line-a", {"by": "line-b"})
+    log_path = wal_path(ledger_path)
+    pending = log_path.read_bytes()
+
+    # crash window: the ledger was rewritten but the log was not removed
+    store.compact()
+    log_path.write_bytes(pending)
+    assert [s["sign_id"] for s in load_observations(ledger_path)[0]["observed_signs"]] == ["S1"]
+
+    # appends after the crash continue the same log and still apply
+    store.append_sign("line-a", {"sign_id": "S2", "description": "second"})
+    assert [s["sign_id"] for s in load_observations(ledger_path)[0]["observed_signs"]] == ["S1", "S2"]
+    store.compact()
+    assert [s["sign_id"] for s in load_observations(ledger_path)[0]["observed_signs"]] == ["S1", "S2"]
@@ -0,0 +1,114 @@
+import json
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+import pyramid_audit.observations as observations_module
+from pyramid_audit.cluster_crops import generate_cluster_crops
+from pyramid_audit.features import build_feature_index
+from pyramid_audit.ledger import merge_observations
+from pyramid_audit.observations import ObservationStore, ledger_digest, wal_path
+from pyramid_audit.pipeline import PipelineContext
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _setup(tmp_path: Path) -> Path:
+    # the repo manifest cut down to one line with its primary evidence image
+    manifest = json.loads((ROOT / "source_manifest.json").read_text(encoding="utf-8"))
+    relief = manifest["corpus"][0]
+    relief["lines"] = [dict(relief["lines"][0], secondary_evidence_ids=[])]
+    manifest["corpus"] = [relief]
+    evidence_path = tmp_path / "evidence" / "faulkner1969_p10_nt304_utt59a.png"
+    evidence_path.parent.mkdir(parents=True)
+    img = Image.new("RGB", (100, 50), color="white")
+    ImageDraw.Draw(img).rectangle([10, 10, 30, 30], fill="black")
+    img.save(evidence_path)
+    manifest_path = tmp_path / "source_manifest.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    return manifest_path
+
+
+def test_pipeline_context_writes_ledger_once(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest_path = _setup(tmp_path)
+    ledger_path = tmp_path / "ledger" / "observations.jsonl"
+    writes = []
+    write_records = observations_module._write_records
+    monkeypatch.setattr(observations_module, "_write_records", lambda *a, **k: (writes.append(a[0]), write_records(*a, **k)))
+
+    with PipelineContext(manifest_path, ledger_path, tmp_path) as context:
+        context.replace_observations(merge_observations(context.manifest, context.observations))
+        context.observations[0]["observed_signs"] = [
+            {"sign_id": "auto-1", "description": "cluster", "bbox": [10, 10, 30, 30], "confidence": 0.2}
+        ]
+        context.mark_changed()
+        generate_cluster_crops(
+            manifest_path, ledger_path, tmp_path, workers=1, manifest=context.manifest, records=context.observations
+        )
+        context.mark_changed()
+        # later stages see the in-memory ledger before anything is written
+        view = next(context.corpus.lines())
+        assert view.observation_status["contact_sheet"] == "evidence/clusters/nt304_utt59a_l1/contact_sheet.png"
+        index, errors = build_feature_index(
+            manifest_path,
+            ledger_path,
+            tmp_path,
+            tmp_path / "features.npz",
+            manifest=context.manifest,
+            records=context.observations,
+        )
+        assert len(index) == 1 and not errors
+        assert writes == [] and not ledger_path.exists()
+
+    assert writes == [ledger_path]
+    record = json.loads(ledger_path.read_text(encoding="utf-8"))
+    assert record["observed_signs"][0]["crop_path"] == "evidence/clusters/nt304_utt59a_l1/auto-1.png"
+    # nothing changed since the flush: nothing to write
+    assert not context.flush()
+
+    # a failing run leaves the ledger as it was
+    with pytest.raises(RuntimeError):
+        with PipelineContext(manifest_path, ledger_path, tmp_path) as context:
+            context.replace_observations([])
+            raise RuntimeError("stage failed")
+    assert writes == [ledger_path]
+    assert json.loads(ledger_path.read_text(encoding="utf-8")) == record
+
+
+def test_pipeline_context_skips_unchanged_ledger(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest_path = _setup(tmp_path)
+    ledger_path = tmp_path / "ledger" / "observations.jsonl"
+    with PipelineContext(manifest_path, ledger_path, tmp_path) as context:
+        context.replace_observations(merge_observations(context.manifest, context.observations))
+    # run-all and the standalone build key stages on the same content digest
+    assert context.observations_key() == ledger_digest(ledger_path)
+    stamp = ledger_path.stat().st_mtime_ns
+
+    with PipelineContext(manifest_path, ledger_path, tmp_path) as context:
+        context.replace_observations(merge_observations(context.manifest, context.observations))
+        assert context.revision == 0
+        # a stage that reports a change but leaves the records as they were
+        context.mark_changed()
+        assert not context.flush()
+    assert ledger_path.stat().st_mtime_ns == stamp
+
+
+def test_pipeline_context_folds_pending_observe_log(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest_path = _setup(tmp_path)
+    ledger_path = tmp_path / "ledger" / "observations.jsonl"
+    with PipelineContext(manifest_path, ledger_path, tmp_path) as context:
+        context.replace_observations(merge_observations(context.manifest, context.observations))
+    line_id = context.observations[0]["line_id"]
+    ObservationStore(ledger_path).append_sign(line_id, {"sign_id": "S1", "description": "manual"})
+    assert wal_path(ledger_path).exists()
+
+    # nothing changes in memory, but the logged sign still lands in the ledger file
+    with PipelineContext(manifest_path, ledger_path, tmp_path) as context:
+        assert context.observations[0]["observed_signs"][-1]["sign_id"] == "S1"
+    assert not wal_path(ledger_path).exists()
+    record = json.loads(ledger_path.read_text(encoding="utf-8"))
+    assert record["observed_signs"][-1]["sign_id"] == "S1"
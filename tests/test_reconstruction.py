@@ -0,0 +1,116 @@
+import json
+import math
+import random
+from pathlib import Path
+
+import numpy as np
+from jsonschema import Draft202012Validator
+
+from pyramid_audit.analysis import build_reconstructions
+from pyramid_audit.observations import save_observations
+from pyramid_audit.reconstruction import NgramIndex
+from pyramid_audit.vocabulary import Vocabulary
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _brute_scores(sequences, query, max_n=3):
+    # every reading rescanned for every distinct query n-gram
+    scores = {}
+    for n in range(1, min(max_n, len(query)) + 1):
+        grams = {tuple(query[i : i + n]) for i in range(len(query) - n + 1)}
+        for gram in grams:
+            docs = [d for d, seq in enumerate(sequences) if any(tuple(seq[i : i + n]) == gram for i in range(len(seq) - n + 1))]
+            for doc in docs:
+                scores[doc] = scores.get(doc, 0.0) + n * math.log1p(len(sequences) / len(docs))
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def test_ngram_index_matches_rescanning():
+    rng = random.Random(9)
+    sequences = [[rng.randint(0, 6) for _ in range(rng.randint(0, 15))] for _ in range(40)]
+    index = NgramIndex([np.array(seq) for seq in sequences])
+    for _ in range(30):
+        # id 9 never occurs in the index and must not bridge n-grams
+        query = [rng.choice([0, 1, 2, 3, 4, 5, 6, 9]) for _ in range(rng.randint(1, 6))]
+        expected = _brute_scores(sequences, [t if t != 9 else None for t in query])
+        got = index.query(np.array(query), limit=100)
+        assert [doc for doc, _score in got] == [doc for doc, _score in expected]
+        assert np.allclose([score for _doc, score in got], [score for _doc, score in expected])
+
+
+def test_build_reconstructions_ranks_candidates(tmp_path: Path):
+    manifest = {
+        "corpus": [
+            {
+                "lines": [
+                    {
+                        "line_id": "l1",
+                        "prior_readings": [
+                            {"reading_id": "far", "tokens": ["A1", "B1", "C1", "D1"]},
+                        ],
+                    },
+                    {
+                        "line_id": "l2",
+                        "prior_readings": [
+                            {
+                                "reading_id": "near",
+                                "reading_type": "transliteration",
+                                "text": "x1 G17 D21 N35 z9",
+                                "tokens": ["X1", "G17", "D21", "N35", "Z9"],
+                            },
+                            {"reading_id": "text-only", "reading_type": "translation", "text": "O Nephthys"},
+                        ],
+                    },
+                ]
+            }
+        ]
+    }
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(
+        ledger_path,
+        [
+            {
+                "line_id": "l1",
+                "observed_signs": [
+                    {"sign_id": "G17", "description": "owl"},
+                    {"sign_id": "D21", "description": "mouth"},
+                    {"sign_id": "N36", "description": "canal"},
+                ],
+            },
+            {"line_id": "l2", "observed_signs": []},
+        ],
+    )
+    output_path = tmp_path / "reconstructions.jsonl"
+    build_reconstructions(manifest, output_path, ledger_path, Vocabulary())
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+
+    # the line's signs are found in another line's reading, at the aligned span
+    assert records[0]["candidates"] == ["near"]
+    assert records[0]["parse_candidates"] == ["G17 D21 N35"]
+    assert records[0]["transliteration_candidates"] == ["x1 G17 D21 N35 z9"]
+    assert math.isclose(records[0]["confidence"], 1 - 1 / 3, abs_tol=1e-4)
+    assert records[1]["candidates"] == []
+    assert records[1]["confidence"] == 0.0
+
+    schema = json.loads((ROOT / "schemas" / "reconstructions.schema.json").read_text(encoding="utf-8"))
+    for record in records:
+        assert not list(Draft202012Validator(schema).iter_errors(record))
+
+
+def test_ngram_index_handles_ids_past_packed_key_limit():
+    # with ids near 2**20, 3-gram keys still fit an int64 but not once the
+    # reading number is folded in; near 2**21 the keys themselves overflow.
+    # Both fall back rather than fail, and rank exactly as before.
+    rng = random.Random(4)
+    for top in (2**20, 2**21):
+        alphabet = [0, 5, top - 2, top, top + 7]
+        sequences = [[rng.choice(alphabet) for _ in range(rng.randint(0, 10))] for _ in range(30)]
+        index = NgramIndex([np.array(seq) for seq in sequences])
+        assert index.base**3 * index.count >= 2**63
+        for _ in range(20):
+            query = [rng.choice(alphabet) for _ in range(rng.randint(1, 5))]
+            expected = _brute_scores(sequences, query)
+            got = index.query(np.array(query), limit=100)
+            assert [doc for doc, _score in got] == [doc for doc, _score in expected]
+            assert np.allclose([score for _doc, score in got], [score for _doc, score in expected])
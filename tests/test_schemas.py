@@ -1,8 +1,11 @@
 import json
 from pathlib import Path
 
+import pytest
 from jsonschema import Draft202012Validator
 
+from pyramid_audit.observations import ObservationStore, load_observations, save_observations
+
 
 ROOT = Path(__file__).resolve().parents[1]
 
@@ -31,6 +34,52 @@ def test_observation_schema():
     validate("observations.schema.json", instance)
 
 
+@pytest.mark.parametrize("path", sorted((ROOT / "schemas").glob("*.schema.json")), ids=lambda path: path.name)
+def test_schemas_are_valid_2020_12(path: Path):
+    Draft202012Validator.check_schema(json.loads(path.read_text(encoding="utf-8")))
+
+
+def test_replayed_observation_validates(tmp_path: Path):
+    ledger_path = tmp_path / "observations.jsonl"
+    record = {
+        "line_id": "nt305_utt60_l1",
+        "evidence_ids": [],
+        "observed_signs": [],
+        "directionality": {"value": "unknown", "basis": "not evaluated", "confidence": 0.0},
+        "uncertainty": 1.0,
+        "observed_only": True,
+    }
+    save_observations(ledger_path, [record])
+    ObservationStore(ledger_path).append_sign("nt305_utt60_l1", {"sign_id": "S1", "description": "bird"})
+    replayed = load_observations(ledger_path)[0]
+    assert "wal_applied" in replayed
+    validate("observations.schema.json", replayed)
+    replayed["wal_applied"] = ["log", "1"]
+    assert list(Draft202012Validator(load_schema("observations.schema.json")).iter_errors(replayed))
+
+
+def test_packed_observation_validates(tmp_path: Path):
+    ledger_path = tmp_path / "observations.jsonl"
+    record = {
+        "line_id": "nt305_utt60_l1",
+        "evidence_ids": ["faulkner1969_p10_nt305"],
+        "observed_signs": [
+            {"sign_id": "auto-l1-1", "description": "auto", "bbox": [1, 2, 3, 4], "confidence": 0.2},
+            {"sign_id": "S1", "description": "bird", "crop_path": "crops/S1.png"},
+        ],
+        "directionality": {"value": "unknown", "basis": "not evaluated", "confidence": 0.0},
+        "uncertainty": 1.0,
+        "observed_only": True,
+    }
+    save_observations(ledger_path, [record], packed=True)
+    packed = json.loads(ledger_path.read_text(encoding="utf-8").splitlines()[0])
+    assert "observed_signs" not in packed
+    validate("observations.schema.json", packed)
+    # exactly one of the two encodings
+    both = dict(packed, observed_signs=record["observed_signs"])
+    assert list(Draft202012Validator(load_schema("observations.schema.json")).iter_errors(both))
+
+
 def test_prior_reading_schema():
     instance = {
         "line_id": "nt305_utt60_l1",
@@ -68,3 +117,13 @@ def test_discrepancy_schema():
         "notes": "none",
     }
     validate("discrepancies.schema.json", instance)
+    instance.update(
+        {
+            "severity": "minor",
+            "diff_ratio": 0.25,
+            "likely_cause": "omission_or_addition",
+            "edit_distance": 1,
+            "alignment": [["match", "G17", "G17"], ["omission", None, "D21"]],
+        }
+    )
+    validate("discrepancies.schema.json", instance)
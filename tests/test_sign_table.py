@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+
+from pyramid_audit.observations import (
+    PACKED_SIGNS_KEY,
+    add_sign_observation,
+    is_packed,
+    iter_observation_tables,
+    load_observations,
+    save_observations,
+)
+from pyramid_audit.sign_table import SignTable
+
+
+SIGNS = [
+    {
+        "sign_id": "auto-line-1-1",
+        "description": "auto-segmented glyph cluster (uninterpreted)",
+        "bbox": [12, 380, 62, 440],
+        "confidence": 0.2,
+        "crop_path": "evidence/clusters/line-1/auto-line-1-1.png",
+    },
+    {
+        "sign_id": "auto-line-1-2",
+        "description": "auto-segmented glyph cluster (uninterpreted)",
+        "bbox": [106, 384, 146, 434],
+        "confidence": 0.2,
+        "crop_path": "evidence/clusters/line-1/auto-line-1-2.png",
+    },
+    {"sign_id": "S1", "description": "Bird-like sign", "bbox": [10.5, 20.0, 30.0, 40.0], "note": "kept"},
+    {"sign_id": "S2", "description": "no box"},
+]
+
+
+def test_sign_table_round_trips():
+    table = SignTable.from_signs(SIGNS)
+    assert len(table) == 4
+    assert table.auto_count() == 2
+    assert table.has_bbox().tolist() == [True, True, True, False]
+    assert table.descriptions == ["auto-segmented glyph cluster (uninterpreted)", "Bird-like sign", "no box"]
+    assert table.to_signs() == SIGNS
+    assert SignTable.decode(table.encode()).to_signs() == SIGNS
+
+
+def test_packed_ledger_round_trips(tmp_path: Path):
+    ledger_path = tmp_path / "observations.jsonl"
+    auto = SIGNS[:2]
+    records = [
+        {"line_id": "line-1", "evidence_ids": [], "observed_signs": auto, "notes": ""},
+        {"line_id": "line-2", "evidence_ids": [], "observed_signs": [], "notes": ""},
+    ]
+    save_observations(ledger_path, records, packed=True)
+    assert is_packed(ledger_path)
+    text = ledger_path.read_text(encoding="utf-8")
+    assert PACKED_SIGNS_KEY in text and '"observed_signs"' not in text
+    assert '"crop_dir": "evidence/clusters/line-1"' in text
+    assert load_observations(ledger_path) == records
+
+    # edits go through the log, and rewrites keep the packed encoding
+    add_sign_observation(ledger_path, line_id="line-2", sign_id="S1", description="Bird-like sign")
+    tables = {record["line_id"]: table for record, table in iter_observation_tables(ledger_path)}
+    assert tables["line-1"].auto_count() == 2
+    assert tables["line-2"].sign_ids == ["S1"]
+    save_observations(ledger_path, load_observations(ledger_path))
+    assert is_packed(ledger_path)
+    assert load_observations(ledger_path)[1]["observed_signs"] == [{"sign_id": "S1", "description": "Bird-like sign"}]
+
+    save_observations(ledger_path, load_observations(ledger_path), packed=False)
+    assert not is_packed(ledger_path)
+    assert load_observations(ledger_path)[0]["observed_signs"] == auto
+
+
+def test_sign_table_keeps_value_types_and_masks_bad_bboxes():
+    signs = [
+        {"sign_id": "S1", "description": "float box", "bbox": [10.5, 20.0, 30, 40.0], "confidence": 1.0},
+        {"sign_id": "S2", "description": "int confidence", "bbox": [1, 2, 3, 4], "confidence": 1},
+        {"sign_id": "S3", "description": "short box", "bbox": [1, 2, 3], "confidence": "high"},
+        {"sign_id": "S4", "description": "non-numeric box", "bbox": ["a", 2, 3, 4]},
+    ]
+    table = SignTable.from_signs(signs)
+    assert table.has_bbox().tolist() == [True, True, False, False]
+
+    def typed(value):
+        return [typed(v) for v in value] if isinstance(value, list) else (type(value), value)
+
+    for round_trip in (table.to_signs(), SignTable.decode(json.loads(json.dumps(table.encode()))).to_signs()):
+        assert round_trip == signs
+        assert [typed(sign.get("bbox")) for sign in round_trip] == [typed(sign["bbox"]) for sign in signs]
+        assert [typed(sign.get("confidence")) for sign in round_trip] == [typed(sign.get("confidence")) for sign in signs]
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import numpy as np
+
+from pyramid_audit.observations import add_sign_observation, load_observations, save_observations, wal_path
+from pyramid_audit.sign_table import SignTable
+from pyramid_audit.spatial_index import SignIndex, reconcile_record
+
+
+def _random_boxes(rng, count):
+    xy = rng.uniform(0, 1000, size=(count, 2))
+    wh = rng.uniform(0, 60, size=(count, 2))
+    wh[:3] = 900  # a few plate-spanning boxes land in the oversize list
+    return np.hstack([xy, xy + wh])
+
+
+def test_sign_index_matches_linear_scan():
+    rng = np.random.default_rng(4)
+    boxes = _random_boxes(rng, 800)
+    index = SignIndex(boxes, [("line", f"s{i}") for i in range(len(boxes))])
+    assert len(index.oversize) >= 3
+    for _ in range(50):
+        x, y = rng.uniform(-50, 1050, size=2)
+        w, h = rng.uniform(0, 200, size=2)
+        query = [x, y, x + w, y + h]
+        overlap = (boxes[:, 0] <= query[2]) & (boxes[:, 2] >= query[0]) & (boxes[:, 1] <= query[3]) & (boxes[:, 3] >= query[1])
+        inside = (boxes[:, 0] >= query[0]) & (boxes[:, 2] <= query[2]) & (boxes[:, 1] >= query[1]) & (boxes[:, 3] <= query[3])
+        assert index.overlapping(query) == np.flatnonzero(overlap).tolist()
+        assert index.contained_in(query) == np.flatnonzero(inside).tolist()
+
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0)
+        expected = np.lexsort((np.arange(len(boxes)), np.hypot(dx, dy)))[:5].tolist()
+        assert index.nearest(x, y, k=5) == expected
+
+
+def test_reconcile_marks_auto_clusters_superseded(tmp_path: Path):
+    signs = [
+        {"sign_id": "auto-line-1-1", "description": "auto", "bbox": [10, 10, 30, 30]},
+        {"sign_id": "auto-line-1-2", "description": "auto", "bbox": [28, 10, 60, 30]},
+        {"sign_id": "auto-line-1-3", "description": "auto", "bbox": [200, 10, 230, 30]},
+    ]
+    record = {"line_id": "line-1", "evidence_ids": ["ev1"], "observed_signs": signs}
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(ledger_path, [record])
+
+    add_sign_observation(ledger_path, line_id="line-1", sign_id="S1", description="Bird", bbox=[5, 5, 40, 35])
+    assert wal_path(ledger_path).exists()
+    updated = load_observations(ledger_path)[0]
+    marks = {s["sign_id"]: s.get("superseded_by") for s in updated["observed_signs"]}
+    assert marks == {"auto-line-1-1": "S1", "auto-line-1-2": None, "auto-line-1-3": None, "S1": None}
+    assert reconcile_record(updated) == 0
+
+    index = SignIndex.from_table("line-1", SignTable.from_signs(updated["observed_signs"]))
+    assert [index.keys[row][1] for row in index.contained_in([0, 0, 100, 100])] == ["auto-line-1-1", "auto-line-1-2", "S1"]
+    assert index.keys[index.nearest(220, 50)[0]] == ("line-1", "auto-line-1-3")
@@ -0,0 +1,104 @@
+import json
+from pathlib import Path
+
+from pyramid_audit.journal import append_entry
+from pyramid_audit.observations import add_sign_observation, load_observations, save_observations
+from pyramid_audit.report import build_report
+from pyramid_audit.sqlite_store import SqliteLedger
+
+
+def _observation(line_id: str, signs):
+    return {
+        "line_id": line_id,
+        "evidence_ids": [],
+        "observed_signs": signs,
+        "directionality": {"value": "unknown", "basis": "not evaluated", "confidence": 0.0},
+        "uncertainty": 1.0,
+        "observed_only": True,
+        "notes": "",
+    }
+
+
+def _write_jsonl(path: Path, records) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+
+
+def test_sqlite_round_trip_and_queries(tmp_path: Path):
+    observations = [
+        _observation("line-1", [{"sign_id": "auto-1", "description": "auto cluster"}]),
+        _observation("line-2", [{"sign_id": "S1", "description": "bird"}]),
+        _observation("line-3", []),
+    ]
+    save_observations(tmp_path / "ledger" / "observations.jsonl", observations)
+    readings = [{"reading_id": "r1", "line_id": "line-1", "source_id": "faulkner1969", "text": "a"}]
+    _write_jsonl(tmp_path / "ledger" / "prior_readings.jsonl", readings)
+    journal_path = tmp_path / "journal" / "entries.jsonl"
+    append_entry("hypothesis", "first", line_id="line-1", tags=["bird"], journal_path=journal_path)
+    append_entry("decision", "second", line_id="line-2", journal_path=journal_path)
+
+    with SqliteLedger(tmp_path / "audit.sqlite") as store:
+        counts = store.import_jsonl(tmp_path)
+        assert counts["observations"] == 3
+        assert counts["journal"] == 2
+        assert store.lines_pending_review() == ["line-1"]
+        assert store.lines_with_sign("S1") == ["line-2"]
+        assert store.prior_reading("r1")["text"] == "a"
+        assert [e["text"] for e in store.journal_entries(tag="bird")] == ["first"]
+        assert [e["text"] for e in store.journal_entries(entry_type="decision")] == ["second"]
+
+        store.add_sign("line-1", {"sign_id": "S2", "description": "manual"})
+        assert store.lines_pending_review() == []
+
+        out = tmp_path / "export"
+        store.export_jsonl(out)
+
+    exported = load_observations(out / "ledger" / "observations.jsonl")
+    assert [r["line_id"] for r in exported] == ["line-1", "line-2", "line-3"]
+    assert [s["sign_id"] for s in exported[0]["observed_signs"]] == ["auto-1", "S2"]
+    assert (out / "journal" / "entries.jsonl").read_text(encoding="utf-8") == (
+        tmp_path / "journal" / "entries.jsonl"
+    ).read_text(encoding="utf-8")
+
+
+def test_report_from_sqlite_matches_jsonl(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_observations(Path("ledger/observations.jsonl"), [_observation("line-1", [{"sign_id": "S1", "description": "bird"}])])
+    append_entry("hypothesis", "Test note", line_id="line-1")
+    manifest = {
+        "corpus": [
+            {
+                "label": "Relief",
+                "lines": [
+                    {"line_id": "line-1", "label": "Line 1", "evidence_ids": [], "image_paths": [], "prior_readings": []}
+                ],
+            }
+        ]
+    }
+
+    build_report(manifest, tmp_path / "jsonl.md")
+    with SqliteLedger(tmp_path / "audit.sqlite") as store:
+        store.import_jsonl(tmp_path)
+        build_report(manifest, tmp_path / "sqlite.md", store=store)
+
+    assert (tmp_path / "jsonl.md").read_text(encoding="utf-8") == (tmp_path / "sqlite.md").read_text(encoding="utf-8")
+
+
+def test_sqlite_backend_writes_through_to_jsonl(tmp_path: Path):
+    ledger_path = tmp_path / "ledger" / "observations.jsonl"
+    journal_path = tmp_path / "journal" / "entries.jsonl"
+    save_observations(ledger_path, [_observation("line-1", [{"sign_id": "auto-1", "description": "auto cluster", "bbox": [0, 0, 10, 10]}])])
+    with SqliteLedger(tmp_path / "audit.sqlite") as store:
+        store.import_jsonl(tmp_path)
+        add_sign_observation(
+            ledger_path, line_id="line-1", sign_id="S1", description="bird", bbox=[0, 0, 20, 20], store=store
+        )
+        append_entry("hypothesis", "note", line_id="line-1", journal_path=journal_path, store=store)
+
+        # the JSONL ledger has the edit, and the store holds the same record
+        record = load_observations(ledger_path)[0]
+        assert [s["sign_id"] for s in record["observed_signs"]] == ["auto-1", "S1"]
+        assert record["observed_signs"][0]["superseded_by"] == "S1"
+        assert store.observation("line-1") == record
+        assert [json.loads(line)["text"] for line in journal_path.read_text(encoding="utf-8").splitlines()] == ["note"]
+        assert [e["text"] for e in store.journal_entries(line_id="line-1")] == ["note"]
@@ -0,0 +1,56 @@
+from dataclasses import replace
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from pyramid_audit.auto_annotate import AutoAnnotateConfig, segment_glyph_clusters
+from pyramid_audit.sweep import SWEEP_COLUMNS, expand_grid, manual_boxes, sweep_lines, write_sweep_csv
+
+
+def test_sweep_matches_individual_runs(tmp_path: Path):
+    img_path = tmp_path / "line.png"
+    img = Image.new("L", (240, 100), color=255)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([10, 10, 40, 60], fill=0)
+    draw.rectangle([44, 10, 70, 60], fill=120)
+    draw.rectangle([120, 20, 126, 26], fill=0)
+    img.save(img_path)
+
+    grid = {
+        "scale": [0.5, 1.0],
+        "dilation": [1, 3],
+        "threshold": [100, 200],
+        "min_area": [10, 80],
+        "margin": [0, 4],
+    }
+    observations = [
+        {
+            "line_id": "line-1",
+            "observed_signs": [
+                {"sign_id": "auto-line-1-1", "description": "auto", "bbox": [0, 0, 5, 5]},
+                {"sign_id": "S1", "description": "manual", "bbox": [10, 10, 40, 60]},
+            ],
+        }
+    ]
+    manual = manual_boxes(observations)
+    assert manual == {"line-1": [[10, 10, 40, 60]]}
+
+    base = AutoAnnotateConfig()
+    jobs = [("line-1", img_path), ("missing", tmp_path / "missing.png")]
+    rows, errors = sweep_lines(jobs, base, grid, manual, workers=2)
+    assert set(errors) == {"missing"}
+    assert len(rows) == len(expand_grid(grid)) == 32
+    for row in rows:
+        cfg = replace(base, **{name: row[name] for name in grid})
+        assert row["clusters"] == len(segment_glyph_clusters(Image.open(img_path), cfg))
+        assert row["lines"] == 1
+        assert row["manual_boxes"] == 1
+
+    exact = [r for r in rows if (r["scale"], r["dilation"], r["threshold"], r["margin"]) == (1.0, 1, 100, 0)]
+    assert all(r["manual_matched"] == 1 and r["mean_best_iou"] == 1.0 for r in exact)
+
+    out = tmp_path / "analysis" / "sweep.csv"
+    write_sweep_csv(out, rows)
+    lines = out.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == ",".join(SWEEP_COLUMNS)
+    assert len(lines) == 33
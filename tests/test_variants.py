@@ -0,0 +1,111 @@
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+from jsonschema import Draft202012Validator
+
+from pyramid_audit.alignment import align_ids, banded_distances
+from pyramid_audit.observations import save_observations
+from pyramid_audit.spatial_index import superseded_clusters
+from pyramid_audit.variants import PairScores, align_witnesses, build_variants
+from pyramid_audit.vocabulary import Vocabulary, observed_tokens
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_banded_distances_are_exact():
+    rng = random.Random(4)
+    observed, prior = [], []
+    for _ in range(300):
+        seq = [rng.randint(0, 4) for _ in range(rng.randint(0, 25))]
+        edited = [t for t in seq if rng.random() > 0.2] + [rng.randint(0, 4) for _ in range(rng.randint(0, 12))]
+        observed.append(np.array(seq, dtype=np.int32))
+        prior.append(np.array(edited, dtype=np.int32))
+    expected = [distance for distance, _alignment in align_ids(observed, prior, with_alignment=False)]
+    # a one-diagonal band forces most pairs through the widening retries
+    assert banded_distances(observed, prior, slack=1).tolist() == expected
+
+
+def test_align_witnesses_pads_insertions():
+    a, b, c = (np.array(seq, dtype=np.int32) for seq in ([1, 2, 3, 4], [1, 2, 9, 3, 4], [1, 3, 4]))
+    scores = PairScores()
+    center, rows, inverse, center_positions = align_witnesses([a, b, a, c], scores)
+    assert center == 0
+    assert center_positions == [0, 1, None, 2, 3]
+    assert rows[inverse].tolist() == [
+        [1, 2, -1, 3, 4],
+        [1, 2, 9, 3, 4],
+        [1, 2, -1, 3, 4],
+        [1, -1, -1, 3, 4],
+    ]
+    # the repeated witness is aligned once and its distances come from the cache
+    assert len(scores.cache) == 3
+
+
+def test_build_variants_across_witnesses(tmp_path: Path):
+    manifest = {
+        "corpus": [
+            {
+                "lines": [
+                    {
+                        "line_id": "w_l1",
+                        "evidence_ids": ["faulkner_p1"],
+                        "secondary_evidence_ids": ["jequier_pl2", "sethe_p3"],
+                        "utterance_id": "utt60",
+                    },
+                    {"line_id": "n_l1", "evidence_ids": ["jequier_pl9"], "utterance_id": "utt60"},
+                    {"line_id": "solo", "evidence_ids": ["faulkner_p2"], "secondary_evidence_ids": ["sethe_p4"]},
+                ]
+            }
+        ]
+    }
+
+    def signs(ids, evidence_id=None):
+        extra = {"evidence_id": evidence_id} if evidence_id else {}
+        return [{"sign_id": sid, "description": "sign", **extra} for sid in ids]
+
+    records = [
+        {
+            "line_id": "w_l1",
+            "evidence_ids": ["faulkner_p1"],
+            "observed_signs": signs(["G17", "D21", "N35"])
+            + signs(["G17", "D21", "N35"], "jequier_pl2")
+            + [{"sign_id": "auto-w_l1-1", "description": "cluster", "bbox": [0, 0, 4, 4]}],
+        },
+        {"line_id": "n_l1", "evidence_ids": ["jequier_pl9"], "observed_signs": signs(["G17", "N36"])},
+        {"line_id": "solo", "evidence_ids": ["faulkner_p2"], "observed_signs": signs(["A1"])},
+    ]
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(ledger_path, records)
+    output_path = tmp_path / "analysis" / "variants.jsonl"
+    assert build_variants(manifest, output_path, ledger_path, Vocabulary()) == 1
+
+    record = json.loads(output_path.read_text(encoding="utf-8"))
+    assert record["utterance_id"] == "utt60"
+    assert [(w["line_id"], w["evidence_id"]) for w in record["witnesses"]] == [
+        ("w_l1", "faulkner_p1"),
+        ("w_l1", "jequier_pl2"),
+        ("n_l1", "jequier_pl9"),
+    ]
+    assert record["unobserved_witnesses"] == [{"line_id": "w_l1", "evidence_id": "sethe_p3"}]
+    columns = record["columns"]
+    assert [column["consensus"] for column in columns] == ["G17", "D21", "N35"]
+    assert [column["variant"] for column in columns] == [False, True, True]
+    assert columns[2]["readings"] == [{"token": "N35", "witnesses": [0, 1]}, {"token": "N36", "witnesses": [2]}]
+    assert record["variant_columns"] == 2
+    schema = json.loads((ROOT / "schemas" / "variants.schema.json").read_text(encoding="utf-8"))
+    assert not list(Draft202012Validator(schema).iter_errors(record))
+
+    # signs read from a secondary witness stay out of the line's own reading
+    assert observed_tokens(records[0]) == ["G17", "D21", "N35"]
+
+
+def test_secondary_witness_bbox_does_not_supersede():
+    signs = [
+        {"sign_id": "auto-l1-1", "description": "cluster", "bbox": [0, 0, 10, 10]},
+        {"sign_id": "G17", "description": "owl", "bbox": [0, 0, 20, 20], "evidence_id": "plate"},
+    ]
+    assert superseded_clusters(signs) == {}
+    signs[1].pop("evidence_id")
+    assert superseded_clusters(signs) == {"auto-l1-1": "G17"}
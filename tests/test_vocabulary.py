@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from pyramid_audit.analysis import build_reconstructions, score_discrepancies
+from pyramid_audit.ledger import build_prior_readings
+from pyramid_audit.observations import save_observations
+from pyramid_audit.vocabulary import Vocabulary, update_vocabulary
+
+
+def _manifest(tokens):
+    return {
+        "corpus": [
+            {
+                "source_item_id": "item",
+                "lines": [{"line_id": "l1", "prior_readings": [{"reading_id": "r1", "text": "", "tokens": tokens}]}],
+            }
+        ]
+    }
+
+
+def test_vocabulary_ids_are_append_only(tmp_path: Path):
+    path = tmp_path / "ledger" / "vocabulary.json"
+    ledger_path = tmp_path / "ledger" / "observations.jsonl"
+    save_observations(
+        ledger_path,
+        [
+            {
+                "line_id": "l1",
+                "observed_signs": [
+                    {"sign_id": "G17", "description": "owl"},
+                    {"sign_id": "auto-l1-1", "description": "cluster"},
+                ],
+            }
+        ],
+    )
+    vocabulary = update_vocabulary(path, _manifest(["D21", "G17"]), ledger_path)
+    assert vocabulary.tokens == ["G17", "D21"]
+    assert "auto-l1-1" not in vocabulary
+
+    # new tokens are appended; existing ids never move
+    vocabulary = update_vocabulary(path, _manifest(["A1", "D21"]), ledger_path)
+    assert vocabulary.tokens == ["G17", "D21", "A1"]
+    assert Vocabulary.load(path).encode(["A1", "G17"]).tolist() == [2, 0]
+    mtime = path.stat().st_mtime_ns
+    update_vocabulary(path, _manifest(["A1"]), ledger_path)
+    assert path.stat().st_mtime_ns == mtime
+
+    path.write_text(json.dumps({"version": 1, "tokens": ["A1", "A1"]}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        Vocabulary.load(path)
+
+
+def test_ledgers_store_vocabulary_ids(tmp_path: Path):
+    vocabulary = Vocabulary(["G17", "D21", "N35"])
+    prior_path = tmp_path / "prior_readings.jsonl"
+    build_prior_readings(_manifest(["N35", "G17"]), prior_path, vocabulary)
+    record = json.loads(prior_path.read_text(encoding="utf-8"))
+    assert record["tokens"] == ["N35", "G17"]
+    assert record["token_ids"] == [2, 0]
+
+    ledger_path = tmp_path / "observations.jsonl"
+    save_observations(ledger_path, [{"line_id": "l1", "observed_signs": [{"sign_id": "D21", "description": "mouth"}]}])
+    reconstructions_path = tmp_path / "reconstructions.jsonl"
+    build_reconstructions(_manifest([]), reconstructions_path, ledger_path, vocabulary)
+    assert json.loads(reconstructions_path.read_text(encoding="utf-8"))["observed_token_ids"] == [1]
+
+    score = score_discrepancies([(["G17", "X1"], ["G17", "N35"])], vocabulary=vocabulary)[0]
+    assert score["alignment"] == [["match", "G17", "G17"], ["substitution", "X1", "N35"]]
+    assert vocabulary.tokens[-1] == "X1"